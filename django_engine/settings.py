@@ -15,6 +15,8 @@ from pathlib import Path
 
 import dj_database_url
 
+from gameplay.cache_backends import parse_cache_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -177,4 +179,107 @@ LOGOUT_REDIRECT_URL = 'story_list'
 FLASK_BASE_URL = os.getenv('FLASK_BASE_URL', 'https://interactive-story-api-dylv.onrender.com').rstrip('/')
 FLASK_API_KEY = os.getenv('FLASK_API_KEY', 'my-super-secret-api-key')
 FLASK_REQUEST_TIMEOUT = float(os.getenv('FLASK_REQUEST_TIMEOUT', '10'))
+# Flask calls time out after 3x the endpoint's recent p99 latency, kept between this floor and FLASK_REQUEST_TIMEOUT.
+UPSTREAM_TIMEOUT_FLOOR = float(os.getenv('UPSTREAM_TIMEOUT_FLOOR', '1'))
+# Failed reads are retried from a budget that earns this many tokens per read, holding at most UPSTREAM_RETRY_BURST.
+UPSTREAM_RETRY_RATIO = float(os.getenv('UPSTREAM_RETRY_RATIO', '0.1'))
+UPSTREAM_RETRY_BURST = int(os.getenv('UPSTREAM_RETRY_BURST', '10'))
+UPSTREAM_HEDGING_ENABLED = env_bool('UPSTREAM_HEDGING_ENABLED', False)
+# Flask calls in flight at once per endpoint class (shared through CACHE_URL); 0 means unlimited.
+# Requests wait up to ADMISSION_QUEUE_TIMEOUT seconds for a slot, then get a 503 or a cached copy.
+ADMISSION_LIMITS = {
+    'play': int(os.getenv('ADMISSION_LIMIT_PLAY', '8')),
+    'authoring': int(os.getenv('ADMISSION_LIMIT_AUTHORING', '4')),
+    'stats': int(os.getenv('ADMISSION_LIMIT_STATS', '2')),
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '1'))
+# Per-client token buckets (user or session, plus IP): `burst` requests at once, refilled at `rate`
+# per second. Every client of one IP address also shares an `ip_burst`/`ip_rate` bucket, so new
+# sessions don't get new bursts. A rate of 0 turns the limit (or the IP bucket) off.
+RATE_LIMITS = {
+    'choose_choice': {
+        'rate': float(os.getenv('RATE_LIMIT_CHOOSE_CHOICE_RATE', '1')),
+        'burst': int(os.getenv('RATE_LIMIT_CHOOSE_CHOICE_BURST', '10')),
+        'ip_rate': float(os.getenv('RATE_LIMIT_CHOOSE_CHOICE_IP_RATE', '5')),
+        'ip_burst': int(os.getenv('RATE_LIMIT_CHOOSE_CHOICE_IP_BURST', '50')),
+    },
+    'story_list': {
+        'rate': float(os.getenv('RATE_LIMIT_STORY_LIST_RATE', '2')),
+        'burst': int(os.getenv('RATE_LIMIT_STORY_LIST_BURST', '30')),
+        'ip_rate': float(os.getenv('RATE_LIMIT_STORY_LIST_IP_RATE', '10')),
+        'ip_burst': int(os.getenv('RATE_LIMIT_STORY_LIST_IP_BURST', '150')),
+    },
+}
+# Take the client address from the last X-Forwarded-For entry (only behind a proxy that sets it).
+# On by default on Render, whose proxy is REMOTE_ADDR for every visitor.
+RATE_LIMIT_BEHIND_PROXY = env_bool('RATE_LIMIT_BEHIND_PROXY', bool(render_host) or env_bool('RENDER', False))
 WAKE_UP_FLASK_ON_STARTUP = env_bool('WAKE_UP_FLASK_ON_STARTUP', True)
+# After the startup wake-up, one worker (per shared cache) pings Flask about this often; 0 pings only at startup.
+KEEP_WARM_INTERVAL = int(os.getenv('KEEP_WARM_INTERVAL', '600'))
+KEEP_WARM_JITTER = int(os.getenv('KEEP_WARM_JITTER', '60'))
+# Serve story reads from the local mirror (filled by `manage.py sync_story_mirror`); Flask stays the write master.
+STORY_MIRROR_ENABLED = env_bool('STORY_MIRROR_ENABLED', False)
+
+# Caching. Without CACHE_URL each process keeps its own in-memory cache. With it, that cache becomes
+# the shared L2 behind a small per-process L1 (see gameplay.cache_backends.TieredCache).
+CACHE_URL = os.getenv('CACHE_URL', '').strip()
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', '1000'))
+# Seconds a key may be served from the per-process L1, by namespace (first match wins). Keys other
+# processes change in place must stay at 0; versioned entries are checked against their version anyway.
+CACHE_L1_TTLS = {
+    'content:*:version': 0,
+    'content:*:bumped': 0,
+    'invalidation:*': 0,
+    'upstream:*': 0,
+    'admission:*': 0,
+    'ratelimit:*': 0,
+    'prefetch:*': 0,
+    'bundle:playthrough:*': 0,
+    'content:catalog:list:*': 5,
+    'content:story:*:details': 5,
+    'content:*': 300,
+    'graph:*': 300,
+    'bundle:*': 60,
+    'template.cache.*': 60,
+}
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'gameplay.cache_backends.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': CACHE_L1_MAX_ENTRIES,
+                'L1_TTL': int(os.getenv('CACHE_L1_TTL', '5')),
+                'NEGATIVE_TTL': int(os.getenv('CACHE_NEGATIVE_TTL', '2')),
+                'L1_TTLS': CACHE_L1_TTLS,
+            },
+        },
+        'shared': parse_cache_url(CACHE_URL),
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+
+# Content caching
+CONTENT_VERSION_TTL = int(os.getenv('CONTENT_VERSION_TTL', '300'))
+# Max clock skew accepted on signed change notifications from Flask.
+INVALIDATION_REPLAY_WINDOW = int(os.getenv('INVALIDATION_REPLAY_WINDOW', '300'))
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '3600'))
+GRAPH_CACHE_TIMEOUT = int(os.getenv('GRAPH_CACHE_TIMEOUT', '86400'))
+GRAPH_INLINE_NODE_LIMIT = int(os.getenv('GRAPH_INLINE_NODE_LIMIT', '300'))
+GRAPH_PAGE_NODE_LIMIT = int(os.getenv('GRAPH_PAGE_NODE_LIMIT', '400'))
+BUNDLE_CACHE_TIMEOUT = int(os.getenv('BUNDLE_CACHE_TIMEOUT', '86400'))
+# Stale-while-revalidate for upstream reads: refresh in the background after the soft TTL,
+# keep serving the last good value for up to the hard TTL.
+STALE_SOFT_TTL = int(os.getenv('STALE_SOFT_TTL', '60'))
+STALE_HARD_TTL = int(os.getenv('STALE_HARD_TTL', str(7 * 86400)))
+# Keep story snapshots in memory-mapped files under this directory, shared by all workers of a host.
+STORY_SNAPSHOT_DIR = os.getenv('STORY_SNAPSHOT_DIR', '')
+
+# Background prefetch of the nodes a reader can go to next.
+NODE_PREFETCH_ENABLED = env_bool('NODE_PREFETCH_ENABLED', True)
+NODE_PREFETCH_DEPTH = int(os.getenv('NODE_PREFETCH_DEPTH', '1'))
+NODE_PREFETCH_WORKERS = int(os.getenv('NODE_PREFETCH_WORKERS', '4'))
+NODE_PREFETCH_MAX_PENDING = int(os.getenv('NODE_PREFETCH_MAX_PENDING', '64'))
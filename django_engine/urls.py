@@ -21,8 +21,10 @@ from gameplay.views import (
     create_story_view, edit_story_view, delete_story_view,
     add_page_view, add_choice_view, author_dashboard, signup,
     choose_choice,
-    submit_rating_comment, submit_story_report, report_moderation_list, report_moderation_update,
-    story_graph_view,
+    offline_play, story_bundle, story_bundle_ending, story_bundle_progress,
+    submit_rating_comment, story_comments, submit_story_report, report_moderation_list, report_moderation_update,
+    story_graph_view, story_graph_data,
+    content_changed_webhook, upstream_status_view,
     edit_page_view, delete_page_view,
     edit_choice_view, delete_choice_view
 )
@@ -37,6 +39,11 @@ urlpatterns = [
     # Logic to find the start node
     path('story/<int:story_id>/start/', start_story, name='start_story'),
     path('story/<int:story_id>/rate/', submit_rating_comment, name='submit_rating_comment'),
+    path('story/<int:story_id>/comments/', story_comments, name='story_comments'),
+    path('story/<int:story_id>/bundle/', story_bundle, name='story_bundle'),
+    path('story/<int:story_id>/bundle/ending/', story_bundle_ending, name='story_bundle_ending'),
+    path('story/<int:story_id>/bundle/progress/', story_bundle_progress, name='story_bundle_progress'),
+    path('story/<int:story_id>/offline/', offline_play, name='offline_play'),
     path('story/<int:story_id>/report/', submit_story_report, name='report_story'),
     path('moderation/reports/', report_moderation_list, name='moderation_reports'),
     path('moderation/reports/<int:report_id>/update/', report_moderation_update, name='moderation_report_update'),
@@ -45,6 +52,11 @@ urlpatterns = [
     path('play/<int:story_id>/<str:node_id>/', play_node, name='play_node'),
     path('play/<int:story_id>/<str:node_id>/choose/', choose_choice, name='choose_choice'),
     
+    path('status/upstream/', upstream_status_view, name='upstream_status'),
+
+    # Upstream change notifications (signed by Flask)
+    path('hooks/content-changed/', content_changed_webhook, name='content_changed_webhook'),
+
     # Stats
     path('stats/', global_stats, name='global_stats'),
 
@@ -52,6 +64,7 @@ urlpatterns = [
     path('author/story/create/', create_story_view, name='create_story'),
     path('author/story/<int:story_id>/edit/', edit_story_view, name='edit_story'),
     path('author/story/<int:story_id>/graph/', story_graph_view, name='story_graph'),
+    path('author/story/<int:story_id>/graph/data/', story_graph_data, name='story_graph_data'),
     path('author/story/<int:story_id>/delete/', delete_story_view, name='delete_story'),
     
     # Pages
@@ -0,0 +1,104 @@
+import functools
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers
+
+# Flask calls in flight at once per endpoint class, shared by every worker using the same cache.
+# A class missing from the map (or set to 0) is not limited.
+ADMISSION_LIMITS = getattr(settings, "ADMISSION_LIMITS", {'play': 8, 'authoring': 4, 'stats': 2})
+# Longest a request waits for a free slot before it is turned away.
+ADMISSION_QUEUE_TIMEOUT = getattr(settings, "ADMISSION_QUEUE_TIMEOUT", 1.0)
+REQUEST_TIMEOUT = getattr(settings, "FLASK_REQUEST_TIMEOUT", 10)
+# A slot held by a worker that died mid-call frees itself once its lease runs out.
+SLOT_LEASE = int(REQUEST_TIMEOUT) + 5
+SLOT_POLL_INTERVAL = 0.02
+BUSY_RETRY_AFTER = 5
+
+_endpoint_class = ContextVar('admission_endpoint_class', default=None)
+
+
+class UpstreamBusy(Exception):
+    """Every upstream slot of the request's endpoint class stayed taken for the whole queue deadline."""
+
+    def __init__(self, endpoint_class):
+        super().__init__(f"Upstream is busy for {endpoint_class!r} requests")
+        self.endpoint_class = endpoint_class
+
+
+def _slot_key(endpoint_class, index):
+    return f"admission:{endpoint_class}:slot:{index}"
+
+
+def _try_acquire(endpoint_class, limit, token):
+    for index in random.sample(range(limit), limit):
+        key = _slot_key(endpoint_class, index)
+        if cache.add(key, token, SLOT_LEASE):
+            return key
+    return None
+
+
+@contextmanager
+def upstream_slot():
+    """
+    Holds one of the current endpoint class's slots around a Flask call, waiting up to
+    ADMISSION_QUEUE_TIMEOUT for one to free up; raises UpstreamBusy otherwise. Calls made outside
+    a classified view (background refreshes, prefetches, keep-warm) aren't limited here; their
+    thread pools bound them.
+    """
+    endpoint_class = _endpoint_class.get()
+    limit = ADMISSION_LIMITS.get(endpoint_class) if endpoint_class else None
+    if not limit:
+        yield
+        return
+
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + ADMISSION_QUEUE_TIMEOUT
+    key = _try_acquire(endpoint_class, limit, token)
+    while key is None:
+        if time.monotonic() >= deadline:
+            raise UpstreamBusy(endpoint_class)
+        time.sleep(SLOT_POLL_INTERVAL)
+        key = _try_acquire(endpoint_class, limit, token)
+    try:
+        yield
+    finally:
+        # Don't free a slot that outlived its lease and now belongs to another request.
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def busy_response():
+    response = HttpResponse(
+        "The story server is busy. Please try again in a few seconds.",
+        status=503,
+        content_type='text/plain',
+    )
+    response['Retry-After'] = str(BUSY_RETRY_AFTER)
+    add_never_cache_headers(response)
+    return response
+
+
+def admission_class(name):
+    """
+    View decorator: Flask calls made while handling the request count against the `name` limit
+    ('play', 'authoring' or 'stats'), and a request turned away gets a quick 503 with Retry-After.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            reset = _endpoint_class.set(name)
+            try:
+                return view(request, *args, **kwargs)
+            except UpstreamBusy:
+                return busy_response()
+            finally:
+                _endpoint_class.reset(reset)
+        return wrapped
+    return decorator
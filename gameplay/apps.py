@@ -3,12 +3,8 @@ from django.conf import settings
 import logging
 import os
 import sys
-import threading
-import requests
 
 logger = logging.getLogger(__name__)
-FLASK_URL = getattr(settings, "FLASK_BASE_URL", "https://interactive-story-api-dylv.onrender.com")
-REQUEST_TIMEOUT = getattr(settings, "FLASK_REQUEST_TIMEOUT", 10)
 SKIP_COMMANDS = {
     "check",
     "collectstatic",
@@ -31,19 +27,13 @@ def should_wake_up_flask():
         return False
     return True
 
-def wake_up_flask():
-    """Sends a request to Flask to wake it up from sleep."""
-    try:
-        logger.info("Pinging Flask at %s to wake it up...", FLASK_URL)
-        requests.get(f"{FLASK_URL}/api/stories", timeout=REQUEST_TIMEOUT)
-    except requests.RequestException:
-        logger.info("Wake-up signal sent. Flask should be ready shortly.")
-
 class GameplayConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gameplay'
 
     def ready(self):
         if should_wake_up_flask():
-            # Run wake-up asynchronously so startup isn't blocked by the network call.
-            threading.Thread(target=wake_up_flask, daemon=True).start()
+            from .keepwarm import start_keep_warm
+
+            # Wakes Flask in the background, then keeps pinging it so it doesn't fall asleep again.
+            start_keep_warm()
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_backends import current_entry
+from .graph import choice_target
+
+BUNDLE_CACHE_TIMEOUT = getattr(settings, "BUNDLE_CACHE_TIMEOUT", 86400)
+BUNDLE_FORMAT = 1
+
+
+def _bundle_choice(choice):
+    entry = {
+        'id': choice.get('id'),
+        'label': choice.get('label') or choice.get('text') or '',
+        'target': choice_target(choice),
+    }
+    if choice.get('requires_roll'):
+        entry['roll'] = {
+            'sides': choice.get('roll_sides'),
+            'required': choice.get('roll_required'),
+            'fail_target': choice.get('on_fail_target'),
+        }
+    return entry
+
+
+def is_ending_page(page):
+    return bool(page.get('is_ending') or page.get('type') == 'ending' or page.get('is_game_over'))
+
+
+def _bundle_node(page):
+    node = {
+        'title': page.get('title') or '',
+        'text': page.get('text') or '',
+        'is_ending': is_ending_page(page),
+        'choices': [_bundle_choice(choice) for choice in page.get('choices') or [] if choice_target(choice)],
+    }
+    # Optional fields are left out when empty to keep the bundle small.
+    for key in ('type', 'ending_label', 'outcome', 'illustration_url', 'dialogue', 'content'):
+        if page.get(key):
+            node[key] = page[key]
+    return node
+
+
+def build_story_bundle(story, version, start_node_id, player_name_rules):
+    """Packs a published story into the structure the offline player runs on."""
+    nodes = {}
+    for page in story.get('pages') or []:
+        if page.get('id') is not None:
+            nodes[str(page['id'])] = _bundle_node(page)
+    return {
+        'format': BUNDLE_FORMAT,
+        'version': str(version),
+        'story': {
+            'id': story.get('id'),
+            'title': story.get('title') or '',
+            'start_node_id': str(start_node_id) if start_node_id is not None else None,
+        },
+        'player_name': player_name_rules,
+        'nodes': nodes,
+    }
+
+
+def _bundle_cache_key(story_id):
+    return f"bundle:{story_id}"
+
+
+def cached_bundle(story_id, version, build):
+    """
+    Returns the gzip-compressed JSON bundle for a story content version, calling build() (which
+    returns the bundle dict, or None if the story can't be bundled) only when that version isn't cached.
+    """
+    key = _bundle_cache_key(story_id)
+    entry = current_entry(cache, key, version)
+    if entry is not None and entry['version'] == version:
+        return entry['body']
+
+    bundle = build()
+    if bundle is None:
+        return None
+    body = gzip.compress(json.dumps(bundle, separators=(',', ':')).encode(), mtime=0)
+    cache.set(key, {'version': version, 'body': body}, BUNDLE_CACHE_TIMEOUT)
+    return body
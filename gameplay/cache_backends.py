@@ -0,0 +1,225 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+_NOT_IN_L1 = object()
+
+# Django builds a cache instance per thread; the L1 store is shared by every thread of the process,
+# the way LocMemCache shares its store.
+_l1_stores = {}
+_l1_locks = {}
+
+CACHE_URL_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def current_entry(cache, key, version):
+    """
+    The {'version': ...} entry cached under key, or None. On a TieredCache a local copy of another
+    version is checked against the shared tier, so an entry another worker loaded or re-keyed
+    (patched) for the new version is used instead of downloading the content again.
+    """
+    entry = cache.get(key)
+    get_shared = getattr(cache, 'get_shared', None)
+    if entry is not None and entry['version'] != version and get_shared is not None:
+        entry = get_shared(key)
+    return entry
+
+
+def parse_cache_url(url):
+    """
+    Builds a CACHES entry from a URL, like dj_database_url does for databases:
+    locmem://[name], file:///abs/path, db://table_name, redis://[:password@]host:port/db, dummy://.
+    Query parameters timeout=, max_entries= and key_prefix= are applied to the entry.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in CACHE_URL_BACKENDS:
+        raise ValueError(f"Unsupported cache URL scheme: {parts.scheme!r}")
+    config = {'BACKEND': CACHE_URL_BACKENDS[parts.scheme]}
+    if parts.scheme in ('redis', 'rediss'):
+        config['LOCATION'] = url.split('?', 1)[0]
+    elif parts.scheme == 'file':
+        config['LOCATION'] = parts.path
+    elif parts.scheme in ('locmem', 'db'):
+        config['LOCATION'] = (parts.netloc + parts.path).strip('/')
+
+    query = dict(parse_qsl(parts.query))
+    if 'timeout' in query:
+        config['TIMEOUT'] = int(query['timeout'])
+    if 'key_prefix' in query:
+        config['KEY_PREFIX'] = query['key_prefix']
+    if 'max_entries' in query:
+        config['OPTIONS'] = {'MAX_ENTRIES': int(query['max_entries'])}
+    return config
+
+
+class TieredCache(BaseCache):
+    """
+    A small in-process LRU (L1) in front of a shared cache (L2, the alias given as LOCATION).
+
+    Reads fill L1 and writes go to both tiers. How long a key may be served from L1 without asking
+    L2 is set per namespace by OPTIONS['L1_TTLS'] ({glob pattern: seconds}, first match wins, 0 keeps
+    the key out of L1); keys other workers change in place (content versions, locks) must be 0.
+    L2 misses are remembered for NEGATIVE_TTL seconds. add/incr/decr always go to L2, since they
+    have to be atomic across processes. Versioned entries are read with current_entry(), which goes
+    to L2 when the local copy is for another version. Values are kept pickled, so callers get their own copy as
+    with any other Django cache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._default_l1_ttl = options.get('L1_TTL', 5)
+        self._l1_ttls = list(options.get('L1_TTLS', {}).items())
+        self._negative_ttl = options.get('NEGATIVE_TTL', 2)
+        self._l1 = _l1_stores.setdefault(location, OrderedDict())
+        self._lock = _l1_locks.setdefault(location, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def l1_ttl(self, key):
+        for pattern, ttl in self._l1_ttls:
+            if fnmatchcase(key, pattern):
+                return ttl
+        return self._default_l1_ttl
+
+    def _l1_key(self, key, version):
+        return key, self.version if version is None else version
+
+    def _l1_get(self, key, version):
+        l1_key = self._l1_key(key, version)
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is None:
+                return _NOT_IN_L1
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                del self._l1[l1_key]
+                return _NOT_IN_L1
+            self._l1.move_to_end(l1_key)
+        return _MISSING if payload is _MISSING else pickle.loads(payload)
+
+    def _l1_put(self, key, value, version, timeout=DEFAULT_TIMEOUT, fill=False):
+        ttl = self.l1_ttl(key)
+        if value is _MISSING:
+            ttl = min(ttl, self._negative_ttl)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.l2.default_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        l1_key = self._l1_key(key, version)
+        if ttl <= 0 or self._max_entries <= 0:
+            self._l1_forget(l1_key)
+            return
+        payload = value if value is _MISSING else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            # A read filling L1 must not replace what a concurrent write just put there.
+            if fill and l1_key in self._l1:
+                return
+            self._l1[l1_key] = (time.monotonic() + ttl, payload)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_forget(self, l1_key):
+        with self._lock:
+            self._l1.pop(l1_key, None)
+
+    def get(self, key, default=None, version=None):
+        value = self._l1_get(key, version)
+        if value is _NOT_IN_L1:
+            value = self.l2.get(key, _MISSING, version=version)
+            self._l1_put(key, value, version, fill=True)
+        return default if value is _MISSING else value
+
+    def get_shared(self, key, default=None, version=None):
+        """Reads key from L2, skipping whatever L1 holds, and keeps the result in L1."""
+        value = self.l2.get(key, _MISSING, version=version)
+        self._l1_put(key, value, version)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        misses = []
+        for key in keys:
+            value = self._l1_get(key, version)
+            if value is _NOT_IN_L1:
+                misses.append(key)
+            elif value is not _MISSING:
+                found[key] = value
+        if misses:
+            fetched = self.l2.get_many(misses, version=version)
+            for key in misses:
+                self._l1_put(key, fetched.get(key, _MISSING), version, fill=True)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_put(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._l1_put(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_put(key, value, version, timeout)
+        else:
+            # Someone else holds the key; a remembered miss here would hide it.
+            self._l1_forget(self._l1_key(key, version))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_forget(self._l1_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_forget(self._l1_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_forget(self._l1_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1_forget(self._l1_key(key, version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear_local(self):
+        with self._lock:
+            self._l1.clear()
+
+    def clear(self):
+        self.clear_local()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
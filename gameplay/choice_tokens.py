@@ -0,0 +1,33 @@
+from django.core import signing
+
+from .graph import choice_target
+
+
+def _signer(story_id, node_id):
+    # The salt binds a token to the node it was rendered on.
+    return signing.Signer(salt=f"gameplay.choice:{story_id}:{node_id}")
+
+
+def sign_choice(story_id, node_id, version, choice):
+    """Returns a tamper-proof token carrying everything choose_choice needs to resolve a choice."""
+    payload = [version, choice.get('id'), choice_target(choice)]
+    if choice.get('requires_roll'):
+        payload += [choice.get('roll_sides'), choice.get('roll_required'), choice.get('on_fail_target')]
+    return _signer(story_id, node_id).sign_object(payload, compress=True)
+
+
+def read_choice_token(token, story_id, node_id):
+    """
+    Returns (node version the token was rendered for, choice dict) for a valid token, or None if the
+    token is malformed or was not signed for this node.
+    """
+    try:
+        payload = _signer(story_id, node_id).unsign_object(token)
+        version, choice_id, target, *roll = payload
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+    choice = {'id': choice_id, 'target_node': target, 'requires_roll': bool(roll)}
+    if roll:
+        choice['roll_sides'], choice['roll_required'], choice['on_fail_target'] = roll
+    return version, choice
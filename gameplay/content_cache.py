@@ -0,0 +1,393 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .admission import UpstreamBusy
+from .cache_backends import current_entry
+from .nodes import compact_node
+from .snapshots import open_snapshot, snapshot_dir, write_snapshot
+
+# Versions expire so content changed by other Flask clients is picked up within this window.
+CONTENT_VERSION_TTL = getattr(settings, "CONTENT_VERSION_TTL", 300)
+CATALOG_VERSION_KEY = "content:catalog:version"
+CATALOG_BUMPED_KEY = "content:catalog:bumped"
+# Upstream reads are refreshed in the background once older than the soft TTL, and the last good
+# value is kept for the hard TTL so an unreachable upstream doesn't take pages down with it.
+STALE_SOFT_TTL = getattr(settings, "STALE_SOFT_TTL", 60)
+STALE_HARD_TTL = getattr(settings, "STALE_HARD_TTL", 7 * 86400)
+# After a failed upstream read, stale values are served without trying upstream first for this long.
+UPSTREAM_RETRY_AFTER = 15
+REFRESH_LOCK_TTL = 30
+# Set and cleared in place by any worker, so it lives in the `upstream:` namespace kept out of L1.
+UPSTREAM_DOWN_KEY = "upstream:down"
+# How a story's pages are delivered upstream rarely changes, so it is remembered for a day.
+STORY_SHAPE_TTL = 86400
+
+
+def _story_version_key(story_id):
+    return f"content:story:{story_id}:version"
+
+
+def _story_bumped_key(story_id):
+    return f"content:story:{story_id}:bumped"
+
+
+def _node_version_key(story_id, node_id):
+    return f"content:node:{story_id}:{node_id}:version"
+
+
+def _story_nodes_version_key(story_id):
+    return f"content:story:{story_id}:nodes:version"
+
+
+def _node_data_key(story_id, node_id):
+    return f"content:node:{story_id}:{node_id}:data"
+
+
+def _story_details_key(story_id):
+    return f"content:story:{story_id}:details"
+
+
+def _story_index_key(story_id):
+    return f"content:story:{story_id}:index"
+
+
+def _story_shape_key(story_id):
+    return f"content:story:{story_id}:embeds_pages"
+
+
+logger = logging.getLogger(__name__)
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='stale-refresh')
+
+
+def _new_version():
+    # Time-based so a version evicted from the cache never comes back as an older value.
+    return time.time_ns()
+
+
+def changed_since(bumped_key, version):
+    """
+    True if the content behind bumped_key was bumped after `version` was current. Each bump is
+    recorded for as long as cached values are kept, so a value whose version merely expired (and
+    was re-created) can be told apart from one that changed, however many versions came between.
+    """
+    last_bump = cache.get(bumped_key)
+    return last_bump is not None and last_bump > version
+
+
+def _read_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, CONTENT_VERSION_TTL):
+            version = cache.get(key, version)
+        versions[key] = version
+    return versions
+
+
+def story_version(story_id):
+    """Returns the current content version of a story."""
+    key = _story_version_key(story_id)
+    return _read_versions([key])[key]
+
+
+def catalog_version():
+    """Returns the current version of the story list (titles, descriptions, statuses)."""
+    return _read_versions([CATALOG_VERSION_KEY])[CATALOG_VERSION_KEY]
+
+
+def bump_catalog_version():
+    """Marks the story list as changed. Returns the new catalog version."""
+    version = _new_version()
+    cache.set(CATALOG_VERSION_KEY, version, CONTENT_VERSION_TTL)
+    cache.set(CATALOG_BUMPED_KEY, version, STALE_HARD_TTL)
+    return version
+
+
+def story_versions(story_ids):
+    """Returns {story_id: content version} for several stories in one cache round trip."""
+    keys = {_story_version_key(story_id): story_id for story_id in story_ids}
+    versions = _read_versions(list(keys))
+    return {story_id: versions[key] for key, story_id in keys.items()}
+
+
+def node_version(story_id, node_id):
+    """
+    Returns the current content version of a single node: its own version, or the story-wide node
+    version if that is newer (see bump_story_version's all_nodes).
+    """
+    versions = _read_versions([_node_version_key(story_id, node_id), _story_nodes_version_key(story_id)])
+    return max(versions.values())
+
+
+def story_embeds_pages(story_id):
+    """True/False once known whether the story details response includes its pages, else None."""
+    return cache.get(_story_shape_key(story_id))
+
+
+def remember_story_shape(story_id, embeds_pages):
+    cache.set(_story_shape_key(story_id), bool(embeds_pages), STORY_SHAPE_TTL)
+
+
+def _store_fresh(key, value, version, soft_ttl):
+    cache.set(key, {'version': version, 'value': value, 'fresh_until': time.time() + soft_ttl}, STALE_HARD_TTL)
+
+
+def _refresh(key, load, version, soft_ttl):
+    lock_key = f"{key}:refreshing"
+    try:
+        value = load()
+        if value is None:
+            cache.set(UPSTREAM_DOWN_KEY, 1, UPSTREAM_RETRY_AFTER)
+        else:
+            _store_fresh(key, value, version, soft_ttl)
+            # On failure the lock is left to expire, which spaces out the retries.
+            cache.delete(lock_key)
+    except Exception:
+        logger.exception("Background refresh failed for %s", key)
+    finally:
+        connection.close()
+
+
+def _refresh_in_background(key, load, version, soft_ttl):
+    if not cache.add(f"{key}:refreshing", 1, REFRESH_LOCK_TTL):
+        return None
+    return _REFRESH_POOL.submit(_refresh, key, load, version, soft_ttl)
+
+
+def stale_while_revalidate(key, load, version, bumped_key, soft_ttl=STALE_SOFT_TTL):
+    """
+    Returns the value cached under key for this content version. load() reads it upstream and
+    returns None on failure.
+
+    Past the soft TTL the cached value is returned at once and one background refresh is started.
+    The same goes for a version that was only re-created after the previous one expired (readers
+    after an idle spell shouldn't wait on a cold upstream). If the content was bumped (under
+    bumped_key) since the cached value's version it is loaded again, unless upstream has just
+    failed. Whenever upstream can't provide it, the last good value is returned (None only if
+    nothing was ever cached). When the request is turned away by admission control, the last good
+    value is returned too, and UpstreamBusy is raised if there is none.
+    """
+    entry = current_entry(cache, key, version)
+    if entry is not None and entry['version'] == version:
+        if time.time() >= entry['fresh_until']:
+            _refresh_in_background(key, load, version, soft_ttl)
+        return entry['value']
+
+    if entry is not None and (
+        not changed_since(bumped_key, entry['version']) or cache.get(UPSTREAM_DOWN_KEY)
+    ):
+        _refresh_in_background(key, load, version, soft_ttl)
+        return entry['value']
+
+    try:
+        value = load()
+    except UpstreamBusy:
+        if entry is None:
+            raise
+        return entry['value']
+    if value is None:
+        cache.set(UPSTREAM_DOWN_KEY, 1, UPSTREAM_RETRY_AFTER)
+        return entry['value'] if entry is not None else None
+    _store_fresh(key, value, version, soft_ttl)
+    return value
+
+
+def cached_story_list(params, load):
+    """The story list for these filters, served stale-while-revalidate against the catalog version."""
+    key = f"content:catalog:list:{urlencode(sorted((params or {}).items()))}"
+    return stale_while_revalidate(key, load, catalog_version(), CATALOG_BUMPED_KEY)
+
+
+def cached_story_details(story_id, load):
+    """Story details, served stale-while-revalidate against the story's content version."""
+    return stale_while_revalidate(
+        _story_details_key(story_id), lambda: load() or None, story_version(story_id), _story_bumped_key(story_id)
+    )
+
+
+def cached_node(story_id, node_id, load_node, version=None):
+    """
+    Returns the node for its current content version (or `version` if given), calling load_node()
+    only on a miss (see stale_while_revalidate). Returns None if the node has never been loaded.
+    Nodes are cached (and returned) as read-only NodeRecords.
+    """
+    if version is None:
+        version = node_version(story_id, node_id)
+
+    def load():
+        node = load_node()
+        return compact_node(node) if node else None
+
+    # Node bumps always come with a story bump, so the story's bump record covers its nodes too.
+    return stale_while_revalidate(
+        _node_data_key(story_id, node_id), load, version, _story_bumped_key(story_id), soft_ttl=CONTENT_VERSION_TTL
+    )
+
+
+def is_node_cached(story_id, node_id):
+    version = node_version(story_id, node_id)
+    entry = current_entry(cache, _node_data_key(story_id, node_id), version)
+    return entry is not None and entry['version'] == version
+
+
+def bump_story_version(story_id, node_ids=(), all_nodes=False):
+    """
+    Marks a story (and optionally some of its nodes, or with all_nodes every one of them) as
+    changed. Returns the new story version.
+    """
+    version = _new_version()
+    updates = {_story_version_key(story_id): version}
+    if all_nodes:
+        updates[_story_nodes_version_key(story_id)] = version
+    for node_id in node_ids:
+        if node_id is not None:
+            updates[_node_version_key(story_id, node_id)] = version
+    cache.set_many(updates, CONTENT_VERSION_TTL)
+    cache.set(_story_bumped_key(story_id), version, STALE_HARD_TTL)
+    return version
+
+
+class StoryIndex:
+    """Lookup tables over one version of a story: page id -> page and choice id -> (page, choice)."""
+
+    __slots__ = ('story', 'pages', 'choices')
+
+    def __init__(self, story):
+        self.story = story
+        self.pages = {}
+        self.choices = {}
+        for page in story.get('pages', []):
+            self.pages.setdefault(str(page.get('id')), page)
+            for choice in page.get('choices', []):
+                self.choices.setdefault(str(choice.get('id')), (page, choice))
+
+    def field(self, name):
+        return self.story.get(name)
+
+    def page(self, page_id):
+        return self.pages.get(str(page_id))
+
+    def choice(self, choice_id):
+        return self.choices.get(str(choice_id), (None, None))
+
+    def page_choice(self, page_id, choice_id):
+        page, choice = self.choice(choice_id)
+        if page is None or str(page.get('id')) != str(page_id):
+            return None
+        return choice
+
+    # In-place edits mirroring the upstream write responses. Each returns False when the
+    # snapshot can't be patched reliably and has to be downloaded again.
+
+    def apply_story_fields(self, story_fields):
+        self.story.update({key: value for key, value in story_fields.items() if key not in ('id', 'pages')})
+        return True
+
+    def apply_page(self, page_id, page_fields):
+        page = self.page(page_id)
+        if page is None:
+            page = {'id': page_id, 'choices': []}
+            self.story.setdefault('pages', []).append(page)
+            self.pages[str(page_id)] = page
+        page.update(page_fields)
+        page.setdefault('choices', [])
+        if 'choices' in page_fields:
+            self.choices = {key: entry for key, entry in self.choices.items() if entry[0] is not page}
+            for choice in page['choices']:
+                self.choices.setdefault(str(choice.get('id')), (page, choice))
+        return True
+
+    def remove_page(self, page_id):
+        page = self.pages.pop(str(page_id), None)
+        if page is None:
+            return False
+        self.story['pages'] = [other for other in self.story.get('pages', []) if other is not page]
+        self.choices = {key: entry for key, entry in self.choices.items() if entry[0] is not page}
+        return True
+
+    def apply_choice(self, page_id, choice):
+        page = self.page(page_id)
+        if page is None or choice.get('id') is None:
+            return False
+        existing = self.page_choice(page_id, choice['id'])
+        if existing is None:
+            existing = {}
+            page.setdefault('choices', []).append(existing)
+        existing.update(choice)
+        self.choices[str(choice['id'])] = (page, existing)
+        return True
+
+    def remove_choice(self, page_id, choice_id):
+        page, choice = self.choice(choice_id)
+        if choice is None or str(page.get('id')) != str(page_id):
+            return False
+        page['choices'] = [other for other in page.get('choices', []) if other is not choice]
+        del self.choices[str(choice_id)]
+        return True
+
+
+def cached_story_index(story_id, load_story):
+    """
+    Returns the StoryIndex for the current version of a story, calling load_story() only on a miss.
+    Returns None if the story could not be loaded.
+
+    With STORY_SNAPSHOT_DIR set, the story is kept in a memory-mapped snapshot file shared by the
+    workers of the host instead of a per-process cache entry.
+    """
+    version = story_version(story_id)
+    if snapshot_dir():
+        snapshot = open_snapshot(story_id, version)
+        if snapshot is None:
+            story = load_story()
+            if not story:
+                return None
+            # Another worker may already have swapped in a newer version; serve what was loaded.
+            snapshot = write_snapshot(story_id, version, story) or StoryIndex(story)
+        return snapshot
+
+    key = _story_index_key(story_id)
+    entry = current_entry(cache, key, version)
+    if entry is not None and entry['version'] == version:
+        return entry['index']
+
+    story = load_story()
+    if not story:
+        return None
+    index = StoryIndex(story)
+    # Stored under the version read before loading, so a concurrent write leaves this entry stale.
+    cache.set(key, {'version': version, 'index': index}, CONTENT_VERSION_TTL)
+    return index
+
+
+def peek_story_index(story_id):
+    """The most recently cached StoryIndex for a story, whatever its version, or None."""
+    if snapshot_dir():
+        return open_snapshot(story_id)
+    entry = cache.get(_story_index_key(story_id))
+    return entry['index'] if entry is not None else None
+
+
+def patch_cached_story_index(story_id, previous_version, new_version, edit):
+    """Applies edit(index) to the index cached for previous_version and re-keys it to new_version."""
+    if snapshot_dir():
+        snapshot = open_snapshot(story_id, previous_version)
+        if snapshot is not None:
+            index = StoryIndex(snapshot.story)
+            if edit(index):
+                write_snapshot(story_id, new_version, index.story)
+        return
+
+    key = _story_index_key(story_id)
+    entry = current_entry(cache, key, previous_version)
+    if entry is None or entry['version'] != previous_version:
+        return
+    if not edit(entry['index']):
+        cache.delete(key)
+        return
+    cache.set(key, {'version': new_version, 'index': entry['index']}, CONTENT_VERSION_TTL)
@@ -0,0 +1,688 @@
+from array import array
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_backends import current_entry
+
+GRAPH_CACHE_TIMEOUT = getattr(settings, "GRAPH_CACHE_TIMEOUT", 86400)
+# Larger stories are explored through the graph data endpoint instead of being embedded whole.
+GRAPH_INLINE_NODE_LIMIT = getattr(settings, "GRAPH_INLINE_NODE_LIMIT", 300)
+GRAPH_PAGE_NODE_LIMIT = getattr(settings, "GRAPH_PAGE_NODE_LIMIT", 400)
+GRAPH_MAX_HOPS = 3
+NODE_TITLE_LIMIT = 42
+EDGE_LABEL_LIMIT = 56
+TEXT_PREVIEW_LIMIT = 280
+ENDING_PATH_LIMIT = 50
+LAYOUT_X_SPACING = 150
+LAYOUT_Y_SPACING = 130
+# Bit flags used by the compact wire format.
+WIRE_START = 1
+WIRE_ENDING = 2
+WIRE_UNREACHABLE = 4
+WIRE_MISSING = 8
+
+
+def choice_target(choice):
+    return (
+        choice.get('next_page_id')
+        or choice.get('target_node')
+        or choice.get('target')
+    )
+
+
+def _truncate(value, limit):
+    return value if len(value) <= limit else f"{value[:limit - 3]}..."
+
+
+def _node_entry(page_id, page):
+    title = page.get('title') or f"Node {page_id}"
+    return {
+        'data': {
+            'id': page_id,
+            'label': f"{page_id}\n{_truncate(title, NODE_TITLE_LIMIT)}",
+            'full_title': title,
+            'text_preview': (page.get('text') or '')[:TEXT_PREVIEW_LIMIT],
+        },
+        'is_ending': bool(page.get('is_ending') or page.get('type') == 'ending'),
+    }
+
+
+def _edge_entry(choice, index):
+    target_raw = choice_target(choice)
+    if target_raw is None:
+        return None
+    return {
+        'key': str(choice.get('id', index)),
+        'choice_id': str(choice['id']) if choice.get('id') is not None else None,
+        'target': str(target_raw),
+        'label': _truncate((choice.get('text') or choice.get('label') or '').strip(), EDGE_LABEL_LIMIT),
+    }
+
+
+def _edge_entries(page):
+    entries = (_edge_entry(choice, index) for index, choice in enumerate(page.get('choices', []) or []))
+    return [entry for entry in entries if entry is not None]
+
+
+def build_graph_state(story):
+    """Normalizes a story into per-node and per-source-edge entries that can be patched in place."""
+    nodes = {}
+    edges = {}
+    for page in story.get('pages', []) or []:
+        page_id = page.get('id')
+        if page_id is None:
+            continue
+        page_id = str(page_id)
+        nodes[page_id] = _node_entry(page_id, page)
+        edges[page_id] = _edge_entries(page)
+
+    start_node_id = story.get('start_node_id')
+    return {
+        'title': story.get('title', ''),
+        'start_node_id': str(start_node_id) if start_node_id is not None else None,
+        'nodes': nodes,
+        'edges': edges,
+    }
+
+
+class StoryGraphIndex:
+    """
+    Compact, read-only view of a story graph. Node ids are interned to 0..n-1 and edges are stored
+    CSR-style: the successors of node i are targets[offsets[i]:offsets[i + 1]]. Broken edges
+    (targets that don't exist) are left out. All analytics run in O(V + E).
+    """
+    __slots__ = (
+        'node_ids', 'index', 'start', 'is_ending',
+        'offsets', 'targets', 'reverse_offsets', 'reverse_sources',
+    )
+
+    def __init__(self, node_ids, start_node_id, endings, adjacency):
+        self.node_ids = node_ids
+        self.index = {node_id: position for position, node_id in enumerate(node_ids)}
+        self.start = self.index.get(start_node_id, -1)
+        self.is_ending = bytearray(1 if node_id in endings else 0 for node_id in node_ids)
+
+        node_count = len(node_ids)
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        for node_id in node_ids:
+            for target_id in adjacency.get(node_id, ()):
+                target = self.index.get(target_id)
+                if target is not None:
+                    self.targets.append(target)
+            self.offsets.append(len(self.targets))
+
+        # Reverse CSR via counting sort, used for "can this node still reach an ending?".
+        self.reverse_offsets = array('i', [0]) * (node_count + 1)
+        for target in self.targets:
+            self.reverse_offsets[target + 1] += 1
+        for position in range(node_count):
+            self.reverse_offsets[position + 1] += self.reverse_offsets[position]
+        self.reverse_sources = array('i', [0]) * len(self.targets)
+        fill = array('i', self.reverse_offsets[:-1]) if node_count else array('i')
+        for source in range(node_count):
+            for edge in range(self.offsets[source], self.offsets[source + 1]):
+                target = self.targets[edge]
+                self.reverse_sources[fill[target]] = source
+                fill[target] += 1
+
+    @classmethod
+    def from_state(cls, state):
+        node_ids = list(state['nodes'])
+        start_node_id = state['start_node_id']
+        if start_node_id is None and node_ids:
+            start_node_id = node_ids[0]
+        endings = {node_id for node_id, node in state['nodes'].items() if node['is_ending']}
+        adjacency = {
+            node_id: [edge['target'] for edge in edges]
+            for node_id, edges in state['edges'].items()
+        }
+        return cls(node_ids, start_node_id, endings, adjacency)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def successors(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def predecessors(self, node):
+        return self.reverse_sources[self.reverse_offsets[node]:self.reverse_offsets[node + 1]]
+
+    def bfs_from_start(self):
+        """Returns (depths, parents) arrays; unreachable nodes have depth -1."""
+        node_count = len(self.node_ids)
+        depths = array('i', [-1]) * node_count
+        parents = array('i', [-1]) * node_count
+        if self.start < 0:
+            return depths, parents
+        depths[self.start] = 0
+        queue = deque([self.start])
+        while queue:
+            node = queue.popleft()
+            for successor in self.successors(node):
+                if depths[successor] == -1:
+                    depths[successor] = depths[node] + 1
+                    parents[successor] = node
+                    queue.append(successor)
+        return depths, parents
+
+    def can_reach_ending(self):
+        """Returns a mask of nodes from which at least one ending is reachable."""
+        mask = bytearray(len(self.node_ids))
+        queue = deque(node for node, ending in enumerate(self.is_ending) if ending)
+        for node in queue:
+            mask[node] = 1
+        while queue:
+            node = queue.popleft()
+            for predecessor in self.predecessors(node):
+                if not mask[predecessor]:
+                    mask[predecessor] = 1
+                    queue.append(predecessor)
+        return mask
+
+    def path_to(self, node, parents=None):
+        if parents is None:
+            _depths, parents = self.bfs_from_start()
+        if node != self.start and parents[node] == -1:
+            return []
+        path = [node]
+        while path[-1] != self.start:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def strongly_connected_components(self):
+        """Iterative Tarjan's algorithm. Returns a list of components (lists of node positions)."""
+        node_count = len(self.node_ids)
+        order = array('i', [-1]) * node_count
+        lowlink = array('i', [0]) * node_count
+        on_stack = bytearray(node_count)
+        stack = []
+        components = []
+        counter = 0
+        offsets, targets = self.offsets, self.targets
+
+        for root in range(node_count):
+            if order[root] != -1:
+                continue
+            order[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                node, edge = frame
+                if edge < offsets[node + 1]:
+                    frame[1] = edge + 1
+                    successor = targets[edge]
+                    if order[successor] == -1:
+                        order[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack[successor] = 1
+                        work.append([successor, offsets[successor]])
+                    elif on_stack[successor] and order[successor] < lowlink[node]:
+                        lowlink[node] = order[successor]
+                    continue
+
+                work.pop()
+                if work and lowlink[node] < lowlink[work[-1][0]]:
+                    lowlink[work[-1][0]] = lowlink[node]
+                if lowlink[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def layered_layout(self):
+        """
+        Assigns every node a layer and a slot within it. Reachable nodes are layered by BFS depth
+        from the start; unreachable ones get extra layers below, grown from their own roots. Each
+        layer is ordered by the barycenter of its parents in the layer above to limit crossings.
+        Returns a list of (x, y) positions indexed like node_ids.
+        """
+        node_count = len(self.node_ids)
+        layers, _parents = self.bfs_from_start()
+        next_layer = (max(layers) + 2) if node_count and max(layers) >= 0 else 0
+
+        unplaced = [node for node in range(node_count) if layers[node] == -1]
+        roots = [node for node in unplaced if all(layers[pred] != -1 for pred in self.predecessors(node))]
+        for root in roots + unplaced:
+            if layers[root] != -1:
+                continue
+            layers[root] = next_layer
+            queue = deque([root])
+            while queue:
+                node = queue.popleft()
+                for successor in self.successors(node):
+                    if layers[successor] == -1:
+                        layers[successor] = layers[node] + 1
+                        queue.append(successor)
+                        next_layer = max(next_layer, layers[successor] + 2)
+            next_layer = max(next_layer, layers[root] + 2)
+
+        by_layer = {}
+        for node in range(node_count):
+            by_layer.setdefault(layers[node], []).append(node)
+
+        slots = array('d', [0.0]) * node_count
+        positions = [(0.0, 0.0)] * node_count
+        for layer in sorted(by_layer):
+            members = by_layer[layer]
+
+            def barycenter(node):
+                parents = [slots[pred] for pred in self.predecessors(node) if layers[pred] == layer - 1]
+                return (sum(parents) / len(parents)) if parents else float(node)
+
+            members.sort(key=lambda node: (barycenter(node), node))
+            offset = (len(members) - 1) / 2
+            for slot, node in enumerate(members):
+                slots[node] = slot
+                positions[node] = ((slot - offset) * LAYOUT_X_SPACING, layer * LAYOUT_Y_SPACING)
+        return positions
+
+    def analytics(self):
+        node_ids = self.node_ids
+        depths, parents = self.bfs_from_start()
+        finishable = self.can_reach_ending()
+
+        components = self.strongly_connected_components()
+        cyclic_components = [
+            component for component in components
+            if len(component) > 1 or component[0] in self.successors(component[0])
+        ]
+
+        dead_ends = [
+            node for node in range(len(node_ids))
+            if not self.is_ending[node] and self.offsets[node] == self.offsets[node + 1]
+        ]
+        stuck = [
+            node for node in range(len(node_ids))
+            if depths[node] != -1 and not finishable[node]
+        ]
+
+        reachable_endings = sorted(
+            (node for node, ending in enumerate(self.is_ending) if ending and depths[node] != -1),
+            key=lambda node: depths[node],
+        )
+        ending_paths = [
+            {
+                'id': node_ids[node],
+                'length': depths[node],
+                'path': [node_ids[step] for step in self.path_to(node, parents)],
+            }
+            for node in reachable_endings[:ENDING_PATH_LIMIT]
+        ]
+
+        return {
+            'component_count': len(components),
+            'cycle_count': len(cyclic_components),
+            'cycle_node_count': sum(len(component) for component in cyclic_components),
+            'dead_end_node_ids': [node_ids[node] for node in dead_ends],
+            'reachable_dead_end_node_ids': [node_ids[node] for node in dead_ends if depths[node] != -1],
+            'stuck_node_ids': [node_ids[node] for node in stuck],
+            'max_depth': max(depths) if depths else -1,
+            'ending_count': sum(self.is_ending),
+            'reachable_ending_count': len(reachable_endings),
+            'ending_paths': ending_paths,
+        }
+
+
+def graph_payload(state, index=None, positions=None, analytics=None):
+    """
+    Builds the template payload (Cytoscape elements and counters) from a graph state. positions and
+    analytics can be passed in from a previous payload when the graph's structure is unchanged.
+    """
+    nodes = state['nodes']
+    node_ids = list(nodes)
+    start_node_id = state['start_node_id']
+    if start_node_id is None and node_ids:
+        start_node_id = node_ids[0]
+
+    missing_nodes = {}
+    graph_edges = []
+
+    for source_id in node_ids:
+        for edge in state['edges'].get(source_id, []):
+            target_id = edge['target']
+            is_broken = target_id not in nodes
+            render_target = target_id
+            if is_broken:
+                render_target = f"missing::{target_id}"
+                missing_nodes.setdefault(target_id, source_id)
+
+            graph_edges.append({
+                'data': {
+                    'id': f"edge::{source_id}::{render_target}::{edge['key']}",
+                    'source': source_id,
+                    'target': render_target,
+                    'label': edge['label'],
+                    'broken_target': target_id if is_broken else '',
+                },
+                'classes': 'broken' if is_broken else '',
+            })
+
+    if index is None:
+        index = StoryGraphIndex.from_state(state)
+    depths, _parents = index.bfs_from_start()
+    unreachable = [node_id for node_id, depth in zip(index.node_ids, depths) if depth == -1]
+    unreachable_set = set(unreachable)
+
+    if positions is None:
+        positions = index.layered_layout()
+
+    graph_nodes = []
+    for position, node_id in enumerate(node_ids):
+        node_classes = []
+        if node_id == start_node_id:
+            node_classes.append('start')
+        if nodes[node_id]['is_ending']:
+            node_classes.append('ending')
+        if node_id in unreachable_set:
+            node_classes.append('unreachable')
+
+        x, y = positions[position]
+        graph_nodes.append({
+            'data': dict(nodes[node_id]['data']),
+            'classes': ' '.join(node_classes),
+            'position': {'x': x, 'y': y},
+        })
+
+    # Missing targets hang just below the first node that points at them.
+    missing_positions = {}
+    for target_id, source_id in missing_nodes.items():
+        x, y = positions[index.index[source_id]]
+        stacked = missing_positions.setdefault((x, y), 0)
+        missing_positions[(x, y)] = stacked + 1
+        missing_nodes[target_id] = (x + stacked * LAYOUT_X_SPACING / 3, y + LAYOUT_Y_SPACING / 2)
+
+    for missing_target_id in sorted(missing_nodes):
+        x, y = missing_nodes[missing_target_id]
+        graph_nodes.append({
+            'data': {
+                'id': f"missing::{missing_target_id}",
+                'label': f"Missing: {missing_target_id}",
+                'full_title': 'Missing target node',
+                'text_preview': '',
+            },
+            'classes': 'missing',
+            'position': {'x': x, 'y': y},
+        })
+
+    broken_edge_count = sum(1 for edge in graph_edges if edge.get('classes') == 'broken')
+
+    return {
+        'graph_elements': graph_nodes + graph_edges,
+        'start_node_id': start_node_id or '',
+        'node_count': len(node_ids),
+        'edge_count': len(graph_edges),
+        'unreachable_count': len(unreachable),
+        'broken_edge_count': broken_edge_count,
+        'unreachable_node_ids': unreachable,
+        'analytics': index.analytics() if analytics is None else analytics,
+    }
+
+
+def _payload_positions(payload):
+    return [
+        (element['position']['x'], element['position']['y'])
+        for element in payload['graph_elements'][:payload['node_count']]
+    ]
+
+
+def neighborhood(index, node, hops, limit):
+    """Returns (node positions within `hops` steps of node in either direction, truncated flag)."""
+    seen = {node}
+    frontier = [node]
+    for _hop in range(hops):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in (*index.successors(current), *index.predecessors(current)):
+                if neighbor in seen:
+                    continue
+                if len(seen) >= limit:
+                    return sorted(seen), True
+                seen.add(neighbor)
+                next_frontier.append(neighbor)
+        frontier = next_frontier
+    return sorted(seen), False
+
+
+def issue_nodes(entry, limit):
+    """Returns (positions of unreachable nodes and nodes with broken choices, truncated flag)."""
+    index = entry['index']
+    unreachable = set(entry['payload']['unreachable_node_ids'])
+    nodes = []
+    for node_id in index.node_ids:
+        has_broken_choice = any(edge['target'] not in index.index for edge in entry['state']['edges'].get(node_id, ()))
+        if node_id in unreachable or has_broken_choice:
+            if len(nodes) >= limit:
+                return nodes, True
+            nodes.append(index.index[node_id])
+    return nodes, False
+
+
+def graph_wire(entry, nodes, truncated=False):
+    """
+    Serializes a subgraph compactly: parallel per-node arrays plus edges as index pairs into them.
+    Edges are only included when both ends are in the subgraph (or the target is missing).
+    """
+    state, index, payload = entry['state'], entry['index'], entry['payload']
+    elements = payload['graph_elements']
+    node_count = len(index.node_ids)
+    missing_elements = {}
+    for element in elements[node_count:]:
+        if 'source' in element['data']:
+            break
+        missing_elements[element['data']['id']] = element
+
+    wire = {
+        'ids': [], 'titles': [], 'previews': [], 'flags': [], 'x': [], 'y': [],
+        'edge_sources': [], 'edge_targets': [], 'edge_keys': [], 'edge_labels': [],
+        'truncated': truncated,
+    }
+    local = {}
+
+    def add_node(element, flags):
+        local[element['data']['id']] = len(wire['ids'])
+        wire['ids'].append(element['data']['id'])
+        wire['titles'].append(element['data']['full_title'])
+        wire['previews'].append(element['data']['text_preview'])
+        wire['flags'].append(flags)
+        wire['x'].append(element['position']['x'])
+        wire['y'].append(element['position']['y'])
+
+    for node in nodes:
+        element = elements[node]
+        classes = element['classes'].split()
+        add_node(element, (
+            (WIRE_START if 'start' in classes else 0)
+            | (WIRE_ENDING if 'ending' in classes else 0)
+            | (WIRE_UNREACHABLE if 'unreachable' in classes else 0)
+        ))
+
+    for node in nodes:
+        source_id = index.node_ids[node]
+        for edge in state['edges'].get(source_id, ()):
+            target_id = edge['target']
+            if target_id not in index.index:
+                target_id = f"missing::{target_id}"
+                if target_id not in local:
+                    add_node(missing_elements[target_id], WIRE_MISSING)
+            elif target_id not in local:
+                continue
+            wire['edge_sources'].append(local[source_id])
+            wire['edge_targets'].append(local[target_id])
+            wire['edge_keys'].append(edge['key'])
+            wire['edge_labels'].append(edge['label'])
+    return wire
+
+
+def story_graph_payload(story):
+    return graph_payload(build_graph_state(story))
+
+
+# Incremental edits. Each returns False when the edit can't be applied and the state must be rebuilt.
+
+def apply_story_fields(state, story_fields):
+    if 'title' in story_fields:
+        state['title'] = story_fields.get('title') or ''
+    if story_fields.get('start_node_id') is not None:
+        state['start_node_id'] = str(story_fields['start_node_id'])
+    return True
+
+
+def apply_page(state, page_id, page_fields):
+    page_id = str(page_id)
+    existing = state['nodes'].get(page_id)
+    merged = dict(existing['data']) if existing else {}
+    merged.update({
+        'title': merged.get('full_title'),
+        'text': merged.get('text_preview'),
+        'is_ending': existing['is_ending'] if existing else False,
+    })
+    merged.update(page_fields)
+    state['nodes'][page_id] = _node_entry(page_id, merged)
+    if 'choices' in page_fields:
+        state['edges'][page_id] = _edge_entries(page_fields)
+    else:
+        state['edges'].setdefault(page_id, [])
+    return True
+
+
+def remove_page(state, page_id):
+    page_id = str(page_id)
+    state['nodes'].pop(page_id, None)
+    state['edges'].pop(page_id, None)
+    return True
+
+
+def apply_choice(state, page_id, choice):
+    page_id = str(page_id)
+    if page_id not in state['nodes'] or choice.get('id') is None:
+        return False
+    choice_id = str(choice['id'])
+    entry = _edge_entry(choice, 0)
+    page_edges = [edge for edge in state['edges'].get(page_id, []) if edge['choice_id'] != choice_id]
+    if entry is not None:
+        page_edges.append(entry)
+    state['edges'][page_id] = page_edges
+    return True
+
+
+def remove_choice(state, page_id, choice_id):
+    page_id = str(page_id)
+    if page_id not in state['edges']:
+        return False
+    state['edges'][page_id] = [edge for edge in state['edges'][page_id] if edge['choice_id'] != str(choice_id)]
+    return True
+
+
+def _graph_structure(state):
+    """Everything the index, layout and analytics depend on: node order, endings, edges, start."""
+    return state['start_node_id'], [
+        (node_id, node['is_ending'], [(edge['key'], edge['target']) for edge in state['edges'].get(node_id, ())])
+        for node_id, node in state['nodes'].items()
+    ]
+
+
+def _graph_cache_key(story_id):
+    return f"graph:{story_id}"
+
+
+def cached_graph(story_id, version, load_story):
+    """
+    Returns the cached graph entry ({'state', 'index', 'payload'}) for a story content version,
+    rebuilding from load_story() only when that version isn't cached. When the story loaded for a
+    new version turns out to have the same structure as the cached graph (e.g. its version merely
+    expired), the layout and analytics are reused rather than recomputed. Returns None if the story
+    can't be loaded.
+    """
+    key = _graph_cache_key(story_id)
+    entry = current_entry(cache, key, version)
+    if entry and entry['version'] == version:
+        if entry['payload'] is None:
+            entry['index'] = StoryGraphIndex.from_state(entry['state'])
+            entry['payload'] = graph_payload(entry['state'], entry['index'])
+            cache.set(key, entry, GRAPH_CACHE_TIMEOUT)
+        return entry
+
+    story = load_story()
+    if not story:
+        return None
+    state = build_graph_state(story)
+    if entry and entry['payload'] is not None and _graph_structure(entry['state']) == _graph_structure(state):
+        index = entry['index']
+        payload = graph_payload(
+            state, index, positions=_payload_positions(entry['payload']), analytics=entry['payload']['analytics']
+        )
+    else:
+        index = StoryGraphIndex.from_state(state)
+        payload = graph_payload(state, index)
+    entry = {'version': version, 'state': state, 'index': index, 'payload': payload}
+    cache.set(key, entry, GRAPH_CACHE_TIMEOUT)
+    return entry
+
+
+def publish_issues(entry):
+    """Returns (errors, warnings) found when validating a story graph for publishing."""
+    payload = entry['payload']
+    analytics = payload['analytics']
+    errors = []
+    warnings = []
+
+    if not payload['node_count']:
+        errors.append('The story has no pages.')
+    elif entry['index'].start < 0:
+        errors.append('The start node does not exist.')
+    elif not analytics['reachable_ending_count']:
+        errors.append('No ending can be reached from the start node.')
+    if analytics['reachable_dead_end_node_ids']:
+        errors.append(
+            f"Readers can get stuck on pages with no choices: {', '.join(analytics['reachable_dead_end_node_ids'][:10])}"
+        )
+    if payload['broken_edge_count']:
+        errors.append(f"{payload['broken_edge_count']} choice(s) point to pages that do not exist.")
+
+    if analytics['stuck_node_ids']:
+        warnings.append(
+            f"{len(analytics['stuck_node_ids'])} reachable page(s) can never lead to an ending (loops without exit)."
+        )
+    if payload['unreachable_count']:
+        warnings.append(f"{payload['unreachable_count']} page(s) cannot be reached from the start node.")
+    return errors, warnings
+
+
+def patch_cached_graph(story_id, previous_version, new_version, edit):
+    """
+    Applies edit(state) to the graph cached for previous_version and re-keys it to new_version.
+    Edits that leave the structure alone (titles, texts, choice labels) only refresh the elements;
+    the index, layout and analytics are kept. Structural edits keep the patched state and leave the
+    index and payload to be recomputed from it on the next view, without downloading the story.
+    """
+    key = _graph_cache_key(story_id)
+    entry = current_entry(cache, key, previous_version)
+    if not entry or entry['version'] != previous_version:
+        return
+    structure = _graph_structure(entry['state'])
+    if not edit(entry['state']):
+        cache.delete(key)
+        return
+    state, index, payload = entry['state'], entry['index'], entry['payload']
+    if payload is not None and _graph_structure(state) == structure:
+        payload = graph_payload(state, index, positions=_payload_positions(payload), analytics=payload['analytics'])
+    else:
+        index = payload = None
+    cache.set(
+        key,
+        {'version': new_version, 'state': state, 'index': index, 'payload': payload},
+        GRAPH_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,158 @@
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .content_cache import bump_catalog_version, bump_story_version, peek_story_index
+
+# Notifications signed further than this from the current time are rejected as replays.
+INVALIDATION_REPLAY_WINDOW = getattr(settings, "INVALIDATION_REPLAY_WINDOW", 300)
+INVALIDATION_MAX_CHANGES = 500
+# Last upstream version applied per entity, so re-sent or out-of-order changes are skipped.
+INVALIDATION_SEEN_TTL = 86400
+CHANGE_TYPES = ('story', 'node', 'choice')
+
+
+class InvalidNotification(Exception):
+    pass
+
+
+def sign_notification(body, timestamp, key=None):
+    """HMAC-SHA256 over "<timestamp>.<body>" keyed with FLASK_API_KEY, as a hex digest."""
+    key = getattr(settings, "FLASK_API_KEY", "") if key is None else key
+    message = str(timestamp).encode() + b'.' + body
+    return hmac.new(key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_notification(body, timestamp, signature, now=None):
+    """True if the signature matches and the timestamp is inside the replay window."""
+    if not timestamp or not signature or not getattr(settings, "FLASK_API_KEY", ""):
+        return False
+    try:
+        sent_at = int(timestamp)
+    except ValueError:
+        return False
+    now = time.time() if now is None else now
+    if abs(now - sent_at) > INVALIDATION_REPLAY_WINDOW:
+        return False
+    return hmac.compare_digest(sign_notification(body, sent_at), signature)
+
+
+def parse_notification(body):
+    """
+    Returns (delivery_id, changes) from a notification body:
+    {"id": "...", "changes": [{"type": "story"|"node"|"choice", "story_id": 1, "id": "...", "version": 3}, ...]}
+    """
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        raise InvalidNotification('Body is not JSON.')
+    if not isinstance(payload, dict) or not isinstance(payload.get('changes'), list):
+        raise InvalidNotification('Expected an object with a list of changes.')
+    delivery_id = str(payload.get('id') or '')[:128]
+    if not delivery_id:
+        raise InvalidNotification('Missing delivery id.')
+    changes = payload['changes']
+    if len(changes) > INVALIDATION_MAX_CHANGES:
+        raise InvalidNotification(f'At most {INVALIDATION_MAX_CHANGES} changes per notification.')
+    for change in changes:
+        if not isinstance(change, dict) or change.get('type') not in CHANGE_TYPES:
+            raise InvalidNotification('Each change needs a type of story, node or choice.')
+        try:
+            change['story_id'] = int(change.get('story_id'))
+        except (TypeError, ValueError):
+            raise InvalidNotification('Each change needs a numeric story_id.')
+        if change['type'] != 'story' and change.get('id') in (None, ''):
+            raise InvalidNotification('Node and choice changes need an id.')
+    return delivery_id, changes
+
+
+def _delivery_key(delivery_id):
+    return f"invalidation:delivery:{delivery_id}"
+
+
+def claim_delivery(delivery_id):
+    """False if this delivery was already processed (Flask retries deliveries it isn't sure about)."""
+    return cache.add(_delivery_key(delivery_id), 1, INVALIDATION_REPLAY_WINDOW * 2)
+
+
+def release_delivery(delivery_id):
+    """Lets a retry of a delivery that failed to apply be processed again."""
+    cache.delete(_delivery_key(delivery_id))
+
+
+def _version_order(version):
+    try:
+        return (0, float(version))
+    except (TypeError, ValueError):
+        return (1, str(version))
+
+
+def _seen_key(change):
+    return f"invalidation:seen:{change['type']}:{change['story_id']}:{change.get('id', '')}"
+
+
+def _is_new(change):
+    """False if the same or a newer upstream version of the entity was already applied."""
+    version = change.get('version')
+    if version is None:
+        return True
+    seen = cache.get(_seen_key(change))
+    return seen is None or _version_order(version) > _version_order(seen)
+
+
+def _mark_seen(changes):
+    versions = {}
+    for change in changes:
+        version = change.get('version')
+        key = _seen_key(change)
+        if version is not None and (key not in versions or _version_order(version) > _version_order(versions[key])):
+            versions[key] = version
+    cache.set_many(versions, INVALIDATION_SEEN_TTL)
+
+
+def _changed_node_ids(change):
+    """The node ids a change touches, or None if they can't be told (then every node is retired)."""
+    if change['type'] == 'node':
+        return [change['id'], change.get('custom_id')]
+    if change['type'] == 'choice':
+        if change.get('node_id') is not None:
+            return [change['node_id']]
+        # Flask doesn't always know the page; the last snapshot we read does.
+        index = peek_story_index(change['story_id'])
+        page, _choice = index.choice(change['id']) if index is not None else (None, None)
+        return [page.get('id'), page.get('custom_id')] if page is not None else None
+    return []
+
+
+def apply_changes(changes):
+    """
+    Bumps the content versions the changes touch (which retires the cached nodes, story snapshots,
+    graphs and bundles keyed by them). Returns (changed story ids, skipped change count).
+    Versions are only recorded as applied once every bump went through.
+    """
+    stories = {}
+    all_nodes = set()
+    catalog_changed = False
+    applied = []
+    for change in changes:
+        if not _is_new(change):
+            continue
+        applied.append(change)
+        node_ids = stories.setdefault(change['story_id'], set())
+        changed = _changed_node_ids(change)
+        if changed is None:
+            all_nodes.add(change['story_id'])
+        else:
+            node_ids.update(str(node_id) for node_id in changed if node_id not in (None, ''))
+        catalog_changed = catalog_changed or change['type'] == 'story'
+
+    for story_id, node_ids in stories.items():
+        bump_story_version(story_id, node_ids=sorted(node_ids), all_nodes=story_id in all_nodes)
+    if catalog_changed:
+        bump_catalog_version()
+    _mark_seen(applied)
+    return list(stories), len(changes) - len(applied)
@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .content_cache import UPSTREAM_DOWN_KEY, UPSTREAM_RETRY_AFTER
+from .services import get_headers
+
+logger = logging.getLogger(__name__)
+FLASK_URL = getattr(settings, "FLASK_BASE_URL", "https://interactive-story-api-dylv.onrender.com")
+REQUEST_TIMEOUT = getattr(settings, "FLASK_REQUEST_TIMEOUT", 10)
+# Render puts the free Flask instance to sleep after 15 idle minutes; pinging more often keeps it up.
+KEEP_WARM_INTERVAL = getattr(settings, "KEEP_WARM_INTERVAL", 600)
+KEEP_WARM_JITTER = getattr(settings, "KEEP_WARM_JITTER", 60)
+STATUS_KEY = "upstream:status"
+# Recent latencies live in a ring of keys filled through an atomic counter, so concurrent pings
+# from several workers don't overwrite each other's samples.
+LATENCY_COUNTER_KEY = "upstream:latency:next"
+KEEP_WARM_LOCK_KEY = "upstream:keepwarm:lock"
+PROBE_LOCK_KEY = "upstream:probe:lock"
+# Status polls probe a cold upstream at most this often, however many pages are polling.
+PROBE_INTERVAL = 5
+RECENT_LATENCIES = 20
+STATUS_TTL = 86400
+
+_PROBE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upstream-probe')
+_scheduler_started = threading.Lock()
+
+
+def ping_upstream():
+    """
+    Requests the story list once, the way the story list page does, and records the outcome.
+    Returns True if upstream answered.
+    """
+    started = time.monotonic()
+    try:
+        response = requests.get(f"{FLASK_URL}/api/stories", headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        ok = response.status_code == 200
+    except requests.RequestException:
+        ok = False
+    record_upstream_result(ok, time.monotonic() - started)
+    return ok
+
+
+def _latency_key(slot):
+    return f"upstream:latency:{slot}"
+
+
+def _record_latency(latency_ms):
+    cache.add(LATENCY_COUNTER_KEY, 0, STATUS_TTL)
+    try:
+        slot = cache.incr(LATENCY_COUNTER_KEY) % RECENT_LATENCIES
+    except ValueError:
+        # The counter expired in between; any slot will do.
+        slot = 0
+    cache.set(_latency_key(slot), latency_ms, STATUS_TTL)
+
+
+def record_upstream_result(ok, latency):
+    latency_ms = round(latency * 1000)
+    if ok:
+        _record_latency(latency_ms)
+        # A working upstream lets stale-while-revalidate reads go back to trying it first.
+        cache.delete(UPSTREAM_DOWN_KEY)
+    else:
+        cache.set(UPSTREAM_DOWN_KEY, 1, UPSTREAM_RETRY_AFTER)
+    cache.set(STATUS_KEY, {'ok': ok, 'checked_at': time.time(), 'latency_ms': latency_ms}, STATUS_TTL)
+
+
+def upstream_status():
+    """
+    {'state': 'warm' | 'cold' | 'unknown', ...}. Upstream counts as warm while its last check
+    succeeded within two keep-warm intervals and no page read has failed since (UPSTREAM_DOWN_KEY,
+    set by failed reads as well as failed checks).
+    """
+    status = cache.get(STATUS_KEY)
+    if status is None:
+        return {'state': 'unknown'}
+    age = time.time() - status['checked_at']
+    warm = status['ok'] and age < 2 * (KEEP_WARM_INTERVAL + KEEP_WARM_JITTER) and not cache.get(UPSTREAM_DOWN_KEY)
+    recent = sorted(cache.get_many([_latency_key(slot) for slot in range(RECENT_LATENCIES)]).values())
+    return {
+        'state': 'warm' if warm else 'cold',
+        'checked_seconds_ago': round(age),
+        'latency_ms': status['latency_ms'],
+        'median_latency_ms': recent[len(recent) // 2] if recent else None,
+    }
+
+
+def probe_if_cold(status):
+    """Starts one background check when upstream isn't known to be warm. Returns the future, if any."""
+    if status['state'] == 'warm' or not cache.add(PROBE_LOCK_KEY, 1, PROBE_INTERVAL):
+        return None
+    return _PROBE_POOL.submit(ping_upstream)
+
+
+def _next_delay():
+    return max(1, KEEP_WARM_INTERVAL + random.uniform(-KEEP_WARM_JITTER, KEEP_WARM_JITTER))
+
+
+def _keep_warm_loop(stop):
+    delay = 0
+    while not stop.wait(delay):
+        # Every worker runs the loop; whichever takes the lock first pings for this interval.
+        if cache.add(KEEP_WARM_LOCK_KEY, os.getpid(), max(1, KEEP_WARM_INTERVAL - KEEP_WARM_JITTER)):
+            try:
+                ping_upstream()
+            except Exception:
+                logger.exception("Keep-warm ping failed")
+        if KEEP_WARM_INTERVAL <= 0:
+            return
+        delay = _next_delay()
+
+
+def start_keep_warm():
+    """Starts the keep-warm thread for this process (once). Returns its stop event, or None."""
+    if not _scheduler_started.acquire(blocking=False):
+        return None
+    stop = threading.Event()
+    threading.Thread(target=_keep_warm_loop, args=(stop,), daemon=True, name='keep-warm').start()
+    return stop
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gameplay.mirror import sync_all, sync_story
+
+
+class Command(BaseCommand):
+    help = "Loads Flask stories into the local content mirror, re-syncing only stories that changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--story', type=int, action='append', dest='story_ids',
+                            help="Only re-sync this story id (can be repeated).")
+        parser.add_argument('--force', action='store_true',
+                            help="Re-fetch every story even if its upstream version is unchanged.")
+
+    def handle(self, *args, **options):
+        if options['story_ids']:
+            results = {}
+            for story_id in options['story_ids']:
+                outcome = sync_story(story_id)
+                results[outcome] = results.get(outcome, 0) + 1
+        else:
+            results = sync_all(force=options['force'])
+            if results is None:
+                raise CommandError("The Flask API did not return the story list.")
+
+        summary = ', '.join(f"{outcome}: {count}" for outcome, count in sorted(results.items())) or 'nothing to sync'
+        self.stdout.write(self.style.SUCCESS(f"Story mirror synced ({summary})."))
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    StoryRatingComment = apps.get_model('gameplay', 'StoryRatingComment')
+    StoryRatingSummary = apps.get_model('gameplay', 'StoryRatingSummary')
+    totals = StoryRatingComment.objects.values('story_source', 'story_id').annotate(
+        rating_count=Count('id'),
+        rating_total=Sum('rating'),
+    )
+    StoryRatingSummary.objects.bulk_create([
+        StoryRatingSummary(
+            story_source=row['story_source'],
+            story_id=row['story_id'],
+            rating_count=row['rating_count'],
+            rating_total=row['rating_total'] or 0,
+        )
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameplay', '0006_alter_storyratingcomment_unique_together_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryRatingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('story_source', models.CharField(default='', max_length=255)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='storyratingcomment',
+            index=models.Index(fields=['story_source', 'story_id', '-created_at', '-id'], name='rating_comment_keyset_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='storyratingsummary',
+            unique_together={('story_source', 'story_id')},
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
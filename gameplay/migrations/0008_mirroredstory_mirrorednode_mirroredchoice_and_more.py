@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gameplay', '0007_storyratingsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredStory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_source', models.CharField(default='', max_length=255)),
+                ('story_id', models.IntegerField()),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('start_node_id', models.CharField(blank=True, max_length=50)),
+                ('data', models.JSONField(default=dict)),
+                ('upstream_version', models.CharField(blank=True, max_length=64)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('stale', models.BooleanField(default=False)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('story_source', 'story_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MirroredNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node_id', models.CharField(max_length=50)),
+                ('custom_id', models.CharField(blank=True, max_length=50)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('is_ending', models.BooleanField(default=False)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='gameplay.mirroredstory')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MirroredChoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choice_id', models.CharField(max_length=50)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('target_node_id', models.CharField(blank=True, max_length=50)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choices', to='gameplay.mirrorednode')),
+            ],
+            options={
+                'unique_together': {('node', 'choice_id')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mirrorednode',
+            index=models.Index(fields=['story', 'custom_id'], name='mirrored_node_custom_id_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='mirrorednode',
+            unique_together={('story', 'node_id')},
+        ),
+    ]
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import services
+from .graph import choice_target
+from .models import MirroredChoice, MirroredNode, MirroredStory
+
+logger = logging.getLogger(__name__)
+
+
+def mirror_enabled():
+    return getattr(settings, "STORY_MIRROR_ENABLED", False)
+
+
+def mirror_source():
+    return (getattr(settings, "FLASK_BASE_URL", "") or "").rstrip("/")
+
+
+def content_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _upstream_version(summary):
+    if not summary:
+        return ''
+    return str(summary.get('updated_at') or summary.get('version') or '')
+
+
+def _fresh_story(story_id):
+    return MirroredStory.objects.filter(story_source=mirror_source(), story_id=story_id, stale=False).first()
+
+
+def _page(node, choices):
+    return {**node.data, 'choices': [choice.data for choice in choices]}
+
+
+def _play_node(node, choices):
+    """The page in the shape the node endpoint uses for play (choice labels and target_node)."""
+    page = _page(node, choices)
+    page['choices'] = [
+        {**choice, 'label': choice.get('label') or choice.get('text'), 'target_node': choice_target(choice)}
+        for choice in page['choices']
+    ]
+    return page
+
+
+def mirrored_stories(params=None):
+    """Story summaries from the mirror, or None if the mirror has nothing to offer."""
+    queryset = MirroredStory.objects.filter(story_source=mirror_source())
+    if queryset.filter(stale=True).exists() or not queryset.exists():
+        return None
+    status = (params or {}).get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+    return [story.data for story in queryset.order_by('story_id')]
+
+
+def mirrored_story(story_id):
+    """Story details with embedded pages, or None if the story isn't mirrored (or is being re-synced)."""
+    story = _fresh_story(story_id)
+    if story is None:
+        return None
+    nodes = story.nodes.order_by('position').prefetch_related('choices')
+    pages = [_page(node, sorted(node.choices.all(), key=lambda choice: choice.position)) for node in nodes]
+    return {**story.data, 'pages': pages}
+
+
+def mirrored_nodes(story_id):
+    story = mirrored_story(story_id)
+    return story['pages'] if story is not None else None
+
+
+def mirrored_node(story_id, node_id):
+    story = _fresh_story(story_id)
+    if story is None:
+        return None
+    node = (
+        story.nodes.filter(node_id=str(node_id)).first()
+        or story.nodes.filter(custom_id=str(node_id)).first()
+    )
+    if node is None:
+        return None
+    return _play_node(node, node.choices.order_by('position'))
+
+
+def mirrored_start(story_id):
+    story = _fresh_story(story_id)
+    if story is None:
+        return None
+    nodes = story.nodes.order_by('position')
+    node = nodes.filter(node_id=story.start_node_id).first() if story.start_node_id else None
+    node = node or nodes.first()
+    if node is None:
+        return None
+    return _play_node(node, node.choices.order_by('position'))
+
+
+def _store_story(story_id, details, pages, upstream_version):
+    """Writes one story, touching only the node and choice rows whose content hash changed."""
+    source = mirror_source()
+    story_data = {key: value for key, value in details.items() if key != 'pages'}
+    story_hash = content_hash({'story': story_data, 'pages': pages})
+    mirrored = MirroredStory.objects.filter(story_source=source, story_id=story_id).first()
+    if mirrored is not None and mirrored.content_hash == story_hash:
+        MirroredStory.objects.filter(pk=mirrored.pk).update(stale=False, upstream_version=upstream_version)
+        return 'unchanged'
+
+    created = mirrored is None
+    with transaction.atomic():
+        mirrored, _ = MirroredStory.objects.update_or_create(
+            story_source=source,
+            story_id=story_id,
+            defaults={
+                'title': story_data.get('title') or '',
+                'status': story_data.get('status') or '',
+                'start_node_id': str(story_data.get('start_node_id') or ''),
+                'data': story_data,
+                'upstream_version': upstream_version,
+                'content_hash': story_hash,
+                'stale': False,
+            },
+        )
+        existing_nodes = {node.node_id: node for node in mirrored.nodes.all()}
+        seen_nodes = set()
+        for position, page in enumerate(pages):
+            if page.get('id') is None:
+                continue
+            node_id = str(page['id'])
+            seen_nodes.add(node_id)
+            node_data = {key: value for key, value in page.items() if key != 'choices'}
+            choices = page.get('choices') or []
+            node_hash = content_hash({'node': node_data, 'choices': choices, 'position': position})
+            node = existing_nodes.get(node_id)
+            if node is not None and node.content_hash == node_hash:
+                continue
+            if node is None:
+                node = MirroredNode(story=mirrored, node_id=node_id)
+            node.custom_id = str(page.get('custom_id') or '')
+            node.position = position
+            node.is_ending = bool(page.get('is_ending') or page.get('type') == 'ending')
+            node.data = node_data
+            node.content_hash = node_hash
+            node.save()
+            _store_choices(node, choices)
+        mirrored.nodes.exclude(node_id__in=seen_nodes).delete()
+    return 'created' if created else 'updated'
+
+
+def _store_choices(node, choices):
+    existing = {choice.choice_id: choice for choice in node.choices.all()}
+    seen = set()
+    for position, choice in enumerate(choices):
+        if choice.get('id') is None:
+            continue
+        choice_id = str(choice['id'])
+        seen.add(choice_id)
+        choice_hash = content_hash({'choice': choice, 'position': position})
+        row = existing.get(choice_id)
+        if row is not None and row.content_hash == choice_hash:
+            continue
+        if row is None:
+            row = MirroredChoice(node=node, choice_id=choice_id)
+        row.position = position
+        row.target_node_id = str(choice_target(choice) or '')
+        row.data = choice
+        row.content_hash = choice_hash
+        row.save()
+    node.choices.exclude(choice_id__in=seen).delete()
+
+
+def sync_story(story_id, summary=None):
+    """
+    Re-syncs one story from Flask. Returns 'created', 'updated', 'unchanged' or 'failed'.
+    """
+    details = services.fetch_story_details(story_id)
+    if not details:
+        return 'failed'
+    pages = details.get('pages')
+    if not pages:
+        # A failed read (None) must not replace the mirrored nodes with an empty story.
+        pages = services.fetch_story_nodes(story_id)
+        if pages is None:
+            return 'failed'
+    return _store_story(story_id, details, pages, _upstream_version(summary))
+
+
+def sync_all(force=False):
+    """
+    Brings the whole mirror up to date. Stories whose upstream version marker hasn't changed are
+    skipped unless force is set. Returns {outcome: count}, or None if the story list is unavailable.
+    """
+    # None means the list couldn't be read; pruning against it would empty the mirror.
+    summaries = services.fetch_stories()
+    if summaries is None:
+        return None
+
+    source = mirror_source()
+    known = {
+        story.story_id: story
+        for story in MirroredStory.objects.filter(story_source=source).only('story_id', 'upstream_version', 'stale')
+    }
+    results = {}
+    listed = set()
+    for summary in summaries:
+        story_id = summary.get('id')
+        if story_id is None:
+            continue
+        listed.add(story_id)
+        mirrored = known.get(story_id)
+        version = _upstream_version(summary)
+        if not force and mirrored is not None and not mirrored.stale and version and mirrored.upstream_version == version:
+            outcome = 'unchanged'
+        else:
+            outcome = sync_story(story_id, summary)
+        results[outcome] = results.get(outcome, 0) + 1
+
+    _deleted, per_model = MirroredStory.objects.filter(story_source=source).exclude(story_id__in=listed).delete()
+    removed = per_model.get(MirroredStory._meta.label, 0)
+    if removed:
+        results['removed'] = results.get('removed', 0) + removed
+    return results
+
+
+def mark_stale(story_id):
+    MirroredStory.objects.filter(story_source=mirror_source(), story_id=story_id).update(stale=True)
+
+
+def forget_story(story_id):
+    MirroredStory.objects.filter(story_source=mirror_source(), story_id=story_id).delete()
+
+
+def resync_story_quietly(story_id):
+    """sync_story for background threads: logs failures and releases the thread's DB connection."""
+    try:
+        sync_story(story_id)
+    except Exception:
+        logger.exception("Mirror re-sync failed for story_id=%s", story_id)
+    finally:
+        connection.close()
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
 
@@ -47,11 +50,61 @@ class StoryRatingComment(models.Model):
 
     class Meta:
         unique_together = ('user', 'story_source', 'story_id')
+        indexes = [
+            # Keyset pagination of comments on ending pages walks this index newest-first.
+            models.Index(
+                fields=['story_source', 'story_id', '-created_at', '-id'],
+                name='rating_comment_keyset_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} rated Story {self.story_id} [{self.story_source}]: {self.rating}/5"
 
 
+class StoryRatingSummary(models.Model):
+    """Denormalized rating totals per story/source, kept in sync with StoryRatingComment."""
+    story_id = models.IntegerField()
+    story_source = models.CharField(max_length=255, default='')
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('story_source', 'story_id')
+
+    def __str__(self):
+        return f"Story {self.story_id} [{self.story_source}]: {self.avg_rating}/5 ({self.rating_count})"
+
+    @property
+    def avg_rating(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_total / self.rating_count, 1)
+
+    @classmethod
+    def refresh(cls, story_source, story_id):
+        totals = StoryRatingComment.objects.filter(
+            story_source=story_source,
+            story_id=story_id,
+        ).aggregate(rating_count=Count('id'), rating_total=Sum('rating'))
+        summary, _created = cls.objects.update_or_create(
+            story_source=story_source,
+            story_id=story_id,
+            defaults={
+                'rating_count': totals['rating_count'] or 0,
+                'rating_total': totals['rating_total'] or 0,
+            },
+        )
+        return summary
+
+
+@receiver(post_save, sender=StoryRatingComment)
+@receiver(post_delete, sender=StoryRatingComment)
+def _refresh_story_rating_summary(sender, instance, **kwargs):
+    StoryRatingSummary.refresh(instance.story_source, instance.story_id)
+
+
 class StoryReport(models.Model):
     class Reason(models.TextChoices):
         SPAM = 'spam', 'Spam'
@@ -91,3 +144,59 @@ class StoryReport(models.Model):
 
     def __str__(self):
         return f"Report by {self.user.username} on story {self.story_id} ({self.reason})"
+
+
+class MirroredStory(models.Model):
+    """Local copy of a Flask story (details without pages), refreshed by `manage.py sync_story_mirror`."""
+    story_source = models.CharField(max_length=255, default='')
+    story_id = models.IntegerField()
+    title = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, blank=True, db_index=True)
+    start_node_id = models.CharField(max_length=50, blank=True)
+    data = models.JSONField(default=dict)
+    # Upstream change marker from the story list (e.g. updated_at), used to skip unchanged stories.
+    upstream_version = models.CharField(max_length=64, blank=True)
+    content_hash = models.CharField(max_length=64)
+    # Set when Django writes to Flask; stale stories are read from Flask until they are re-synced.
+    stale = models.BooleanField(default=False)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('story_source', 'story_id')
+
+    def __str__(self):
+        return f"Mirror of Story {self.story_id} [{self.story_source}]"
+
+
+class MirroredNode(models.Model):
+    story = models.ForeignKey(MirroredStory, on_delete=models.CASCADE, related_name='nodes')
+    node_id = models.CharField(max_length=50)
+    custom_id = models.CharField(max_length=50, blank=True)
+    position = models.PositiveIntegerField(default=0)
+    is_ending = models.BooleanField(default=False)
+    data = models.JSONField(default=dict)
+    content_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('story', 'node_id')
+        indexes = [
+            models.Index(fields=['story', 'custom_id'], name='mirrored_node_custom_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Mirror of node {self.node_id} (Story {self.story.story_id})"
+
+
+class MirroredChoice(models.Model):
+    node = models.ForeignKey(MirroredNode, on_delete=models.CASCADE, related_name='choices')
+    choice_id = models.CharField(max_length=50)
+    position = models.PositiveIntegerField(default=0)
+    target_node_id = models.CharField(max_length=50, blank=True)
+    data = models.JSONField(default=dict)
+    content_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('node', 'choice_id')
+
+    def __str__(self):
+        return f"Mirror of choice {self.choice_id} -> {self.target_node_id}"
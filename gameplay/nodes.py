@@ -0,0 +1,92 @@
+import sys
+from collections.abc import Mapping
+
+# String values under these keys repeat across nodes (ids, speakers, node types), so one copy is shared.
+INTERNED_FIELDS = frozenset({
+    'id', 'custom_id', 'type', 'speaker', 'next_page_id', 'next_node_id', 'target_node', 'target_node_id',
+    'on_fail_target', 'story_id', 'status',
+})
+# Key tuples and their key -> position maps are shared by every record with the same keys; the
+# registry is bounded for odd payloads.
+MAX_SHAPES = 1024
+
+_shapes = {}
+
+
+def _shape(keys):
+    """Returns (keys, {key: position}) for a key tuple, the same objects for every record of that shape."""
+    shape = _shapes.get(keys)
+    if shape is None:
+        keys = tuple(sys.intern(key) if isinstance(key, str) else key for key in keys)
+        shape = (keys, {key: position for position, key in enumerate(keys)})
+        if len(_shapes) < MAX_SHAPES:
+            _shapes[keys] = shape
+    return shape
+
+
+class NodeRecord(Mapping):
+    """
+    Read-only mapping over a tuple of values, with the key tuple and key lookup shared by all records
+    of the same shape. Supports what templates and the views read (`record[key]`, `.get`, iteration); use
+    node_dict() for a mutable copy.
+    """
+
+    __slots__ = ('_keys', '_positions', '_values')
+
+    def __init__(self, shape, values):
+        self._keys, self._positions = shape
+        self._values = values
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._positions[key]]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __repr__(self):
+        return f"NodeRecord({dict(zip(self._keys, self._values))!r})"
+
+    def __reduce__(self):
+        return _restore, (self._keys, self._values)
+
+
+def _restore(keys, values):
+    return NodeRecord(_shape(keys), values)
+
+
+def _compact_value(key, value):
+    if isinstance(value, dict):
+        return compact_node(value)
+    if isinstance(value, list):
+        return tuple(_compact_value(None, item) for item in value)
+    if isinstance(value, str) and key in INTERNED_FIELDS:
+        return sys.intern(value)
+    return value
+
+
+def compact_node(node):
+    """Upstream node JSON as nested NodeRecords and tuples. Keys whose value is null are dropped."""
+    if isinstance(node, NodeRecord):
+        return node
+    items = [(key, value) for key, value in node.items() if value is not None]
+    shape = _shape(tuple(key for key, _ in items))
+    return NodeRecord(shape, tuple(_compact_value(key, value) for key, value in items))
+
+
+def node_dict(node):
+    """A plain, mutable copy of a node (dicts and lists), whichever form it is cached in."""
+    if isinstance(node, Mapping):
+        return {key: node_dict(value) for key, value in node.items()}
+    if isinstance(node, (list, tuple)):
+        return [node_dict(item) for item in node]
+    return node
+
@@ -0,0 +1,76 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .content_cache import cached_node, is_node_cached
+from .graph import choice_target
+
+logger = logging.getLogger(__name__)
+NODE_PREFETCH_WORKERS = getattr(settings, "NODE_PREFETCH_WORKERS", 4)
+NODE_PREFETCH_DEPTH = getattr(settings, "NODE_PREFETCH_DEPTH", 1)
+NODE_PREFETCH_MAX_PENDING = getattr(settings, "NODE_PREFETCH_MAX_PENDING", 64)
+# Stops several workers (or processes sharing the cache) from fetching the same node at once.
+PREFETCH_LOCK_TTL = 30
+
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=NODE_PREFETCH_WORKERS, thread_name_prefix='node-prefetch')
+_pending_slots = threading.BoundedSemaphore(NODE_PREFETCH_MAX_PENDING)
+
+
+def node_targets(node):
+    """Returns the distinct node ids a reader can reach from node in one step, fail targets included."""
+    targets = []
+    for choice in node.get('choices') or []:
+        for target in (choice_target(choice), choice.get('on_fail_target')):
+            if target and str(target) not in targets:
+                targets.append(str(target))
+    return targets
+
+
+def prefetch_targets(story_id, node, load_node, depth=None):
+    """
+    Warms the node cache with the targets of node's choices in the background, following them up
+    to `depth` steps. load_node(story_id, node_id) fetches a node upstream.
+    Returns the futures of the fetches that were scheduled.
+    """
+    if not getattr(settings, "NODE_PREFETCH_ENABLED", True):
+        return []
+    depth = NODE_PREFETCH_DEPTH if depth is None else depth
+    if depth < 1:
+        return []
+    futures = (_schedule(story_id, target, load_node, depth) for target in node_targets(node))
+    return [future for future in futures if future is not None]
+
+
+def _lock_key(story_id, node_id):
+    return f"prefetch:{story_id}:{node_id}"
+
+
+def _schedule(story_id, node_id, load_node, depth):
+    if is_node_cached(story_id, node_id):
+        return None
+    # Over budget: drop the prefetch, the reader's click will simply fetch the node itself.
+    if not _pending_slots.acquire(blocking=False):
+        return None
+    if not cache.add(_lock_key(story_id, node_id), 1, PREFETCH_LOCK_TTL):
+        _pending_slots.release()
+        return None
+    return _PREFETCH_POOL.submit(_prefetch, story_id, node_id, load_node, depth)
+
+
+def _prefetch(story_id, node_id, load_node, depth):
+    try:
+        node = cached_node(story_id, node_id, lambda: load_node(story_id, node_id))
+        if node and depth > 1:
+            for target in node_targets(node):
+                _schedule(story_id, target, load_node, depth - 1)
+    except Exception:
+        logger.exception("Prefetch failed for story_id=%s node_id=%s", story_id, node_id)
+    finally:
+        cache.delete(_lock_key(story_id, node_id))
+        _pending_slots.release()
+        # load_node may have read the mirror on this pool thread.
+        connection.close()
@@ -0,0 +1,92 @@
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers
+
+# Token buckets per view: each client gets `burst` requests at once, refilled at `rate` per second,
+# and all clients of one IP address share a larger `ip_burst`/`ip_rate` bucket, so fresh sessions
+# can't buy fresh bursts. A view missing from the map (or with rate 0) is not limited.
+RATE_LIMITS = getattr(settings, "RATE_LIMITS", {
+    'choose_choice': {'rate': 1.0, 'burst': 10, 'ip_rate': 5.0, 'ip_burst': 50},
+    'story_list': {'rate': 2.0, 'burst': 30, 'ip_rate': 10.0, 'ip_burst': 150},
+})
+# Behind a proxy (Render), REMOTE_ADDR is the proxy; the client is the address it appended last.
+RATE_LIMIT_BEHIND_PROXY = getattr(settings, "RATE_LIMIT_BEHIND_PROXY", False)
+
+
+def client_ip(request):
+    if RATE_LIMIT_BEHIND_PROXY:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.rsplit(',', 1)[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    """
+    The user or session plus the IP address. Reading request.user loads the session first, so a
+    made-up session cookie has no session_key here and can't buy a fresh bucket; clients without a
+    session share one bucket per IP.
+    """
+    if request.user.is_authenticated:
+        client = f"user:{request.user.pk}"
+    elif request.session.session_key:
+        client = f"session:{request.session.session_key}"
+    else:
+        client = "anon"
+    return f"{client}:{client_ip(request)}"
+
+
+def take_token(key, rate, burst):
+    """
+    Spends one token from the bucket stored under key. Returns 0 if there was one, otherwise the
+    seconds until there will be. Concurrent requests of one client may both read the same balance,
+    so a burst can be exceeded by a request or two; that's fine for throttling.
+    """
+    now = time.time()
+    tokens, updated = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return math.ceil((1 - tokens) / rate)
+    # The entry can expire once the bucket would be full again anyway.
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate) + 1)
+    return 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        "Too many requests. Please slow down.",
+        status=429,
+        content_type='text/plain',
+    )
+    response['Retry-After'] = str(retry_after)
+    add_never_cache_headers(response)
+    return response
+
+
+def rate_limited(name):
+    """
+    View decorator: answers 429 with Retry-After once the client, or its IP address as a whole, has
+    used up its `name` bucket.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            limit = RATE_LIMITS.get(name)
+            if limit and limit['rate'] > 0:
+                retry_after = take_token(
+                    f"ratelimit:{name}:{client_key(request)}", limit['rate'], limit['burst']
+                )
+                if not retry_after and limit.get('ip_rate', 0) > 0:
+                    retry_after = take_token(
+                        f"ratelimit:{name}:ip:{client_ip(request)}", limit['ip_rate'], limit['ip_burst']
+                    )
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
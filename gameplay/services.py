@@ -4,9 +4,10 @@ import time
 import requests
 from django.conf import settings
 
+from . import mirror, upstream
+
 logger = logging.getLogger(__name__)
 FLASK_URL = getattr(settings, "FLASK_BASE_URL", "https://interactive-story-api-dylv.onrender.com")
-REQUEST_TIMEOUT = getattr(settings, "FLASK_REQUEST_TIMEOUT", 10)
 
 def get_headers():
     """Returns headers with the API key."""
@@ -15,27 +16,40 @@ def get_headers():
     }
 
 def get_stories(params=None):
-    """Fetches list of stories with optional filters."""
+    """Lists stories with optional filters, from the local mirror when it is enabled and populated."""
+    if mirror.mirror_enabled():
+        stories = mirror.mirrored_stories(params)
+        if stories is not None:
+            return stories
+    return fetch_stories(params)
+
+def fetch_stories(params=None):
+    """Fetches list of stories with optional filters. Returns None if Flask is unreachable or answers with an error."""
     try:
-        response = requests.get(
+        response = upstream.get(
+            'stories',
             f"{FLASK_URL}/api/stories",
             params=params,
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         if response.status_code == 200:
             return response.json()
     except requests.RequestException:
         return None
-    return []
+    return None
 
 def get_story_start(story_id):
     """Fetches the start node of a story."""
+    if mirror.mirror_enabled():
+        node = mirror.mirrored_start(story_id)
+        if node is not None:
+            return node
     try:
-        response = requests.get(
+        response = upstream.get(
+            'story_start',
             f"{FLASK_URL}/api/stories/{story_id}/start",
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
+            hedge=True,
         )
         if response.status_code == 200:
             return response.json()
@@ -48,12 +62,17 @@ def get_node(story_id, node_id):
     Fetches a specific node using the story_id and custom_id (string).
     URL matches Flask: /stories/<id>/nodes/<custom_id>
     """
+    if mirror.mirror_enabled():
+        node = mirror.mirrored_node(story_id, node_id)
+        if node is not None:
+            return node
     try:
         # Note: node_id is now a string (e.g., 'node_01'), not an int
-        response = requests.get(
+        response = upstream.get(
+            'node',
             f"{FLASK_URL}/api/stories/{story_id}/nodes/{node_id}",
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
+            hedge=True,
         )
         if response.status_code == 200:
             return response.json()
@@ -64,11 +83,12 @@ def get_node(story_id, node_id):
 def create_story(data):
     """Creates a new story."""
     try:
-        response = requests.post(
+        response = upstream.request(
+            'create_story',
+            'POST',
             f"{FLASK_URL}/api/stories",
             json=data,
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         if response.status_code == 201:
             return response.json()
@@ -79,11 +99,12 @@ def create_story(data):
 def update_story(story_id, data):
     """Updates an existing story."""
     try:
-        response = requests.put(
+        response = upstream.request(
+            'update_story',
+            'PUT',
             f"{FLASK_URL}/api/stories/{story_id}",
             json=data,
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         if response.status_code == 200:
             return response.json()
@@ -94,10 +115,11 @@ def update_story(story_id, data):
 def delete_story(story_id):
     """Deletes a story."""
     try:
-        response = requests.delete(
+        response = upstream.request(
+            'delete_story',
+            'DELETE',
             f"{FLASK_URL}/api/stories/{story_id}",
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         return response.status_code == 204 or response.status_code == 200
     except requests.RequestException:
@@ -107,7 +129,7 @@ def create_page(story_id, data):
     """Creates a new page (node) for a story."""
     try:
         url = f"{FLASK_URL}/api/stories/{story_id}/nodes"
-        response = requests.post(url, json=data, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.request('create_page', 'POST', url, json=data, headers=get_headers())
         logger.debug("POST %s | status=%s", url, response.status_code)
         if response.status_code == 201:
             return response.json()
@@ -122,7 +144,7 @@ def create_choice(page_id, data):
     try:
         # Note: The prompt says /pages/<id>/choices, but we use /nodes/ for consistency
         url = f"{FLASK_URL}/api/nodes/{page_id}/choices"
-        response = requests.post(url, json=data, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.request('create_choice', 'POST', url, json=data, headers=get_headers())
         logger.debug("POST %s | status=%s", url, response.status_code)
         if response.status_code == 201:
             return response.json()
@@ -136,7 +158,7 @@ def update_page(page_id, data):
     """Updates an existing page."""
     try:
         url = f"{FLASK_URL}/api/nodes/{page_id}"
-        response = requests.put(url, json=data, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.request('update_page', 'PUT', url, json=data, headers=get_headers())
         logger.debug("PUT %s | status=%s", url, response.status_code)
         if response.status_code == 200:
             return response.json()
@@ -150,7 +172,7 @@ def delete_page(page_id):
     """Deletes a page."""
     try:
         url = f"{FLASK_URL}/api/nodes/{page_id}"
-        response = requests.delete(url, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.request('delete_page', 'DELETE', url, headers=get_headers())
         logger.debug("DELETE %s | status=%s", url, response.status_code)
         return response.status_code == 204 or response.status_code == 200
     except requests.RequestException as e:
@@ -161,7 +183,7 @@ def update_choice(choice_id, data):
     """Updates an existing choice."""
     try:
         url = f"{FLASK_URL}/api/choices/{choice_id}"
-        response = requests.put(url, json=data, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.request('update_choice', 'PUT', url, json=data, headers=get_headers())
         logger.debug("PUT %s | status=%s", url, response.status_code)
         if response.status_code == 200:
             return response.json()
@@ -174,22 +196,31 @@ def update_choice(choice_id, data):
 def delete_choice(choice_id):
     """Deletes a choice."""
     try:
-        response = requests.delete(
+        response = upstream.request(
+            'delete_choice',
+            'DELETE',
             f"{FLASK_URL}/api/choices/{choice_id}",
             headers=get_headers(),
-            timeout=REQUEST_TIMEOUT,
         )
         return response.status_code == 204 or response.status_code == 200
     except requests.RequestException:
         return False
 
 def get_story_details(story_id):
+    """Full details of a story, from the local mirror (with pages embedded) when it is enabled."""
+    if mirror.mirror_enabled():
+        story = mirror.mirrored_story(story_id)
+        if story is not None:
+            return story
+    return fetch_story_details(story_id)
+
+def fetch_story_details(story_id):
     """Fetches full details of a story."""
     try:
         url = f"{FLASK_URL}/api/stories/{story_id}"
         # Cache busting
         params = {"_t": int(time.time())}
-        response = requests.get(url, params=params, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.get('story_details', url, params=params, headers=get_headers())
         if response.status_code == 200:
             return response.json()
     except requests.RequestException:
@@ -197,13 +228,21 @@ def get_story_details(story_id):
     return None
 
 def get_story_nodes(story_id):
-    """Fetches all nodes for a specific story."""
+    """All nodes of a story, from the local mirror when it is enabled."""
+    if mirror.mirror_enabled():
+        nodes = mirror.mirrored_nodes(story_id)
+        if nodes is not None:
+            return nodes
+    return fetch_story_nodes(story_id)
+
+def fetch_story_nodes(story_id):
+    """Fetches all nodes for a specific story. Returns None if Flask is unreachable or answers with an error."""
     try:
         url = f"{FLASK_URL}/api/stories/{story_id}/nodes"
-        response = requests.get(url, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+        response = upstream.get('story_nodes', url, headers=get_headers())
         if response.status_code == 200:
             return response.json()
     except requests.RequestException:
         return None
-    return []
+    return None
 
@@ -0,0 +1,147 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from django.conf import settings
+
+# File layout: MAGIC, a little-endian u32 header length, the JSON header, then each page's JSON
+# back to back. The header holds the story fields, the page offsets and a choice id -> page id map.
+MAGIC = b'NAHBSNP1'
+_HEADER_LENGTH = struct.Struct('<I')
+
+_mapped = {}
+_mapped_lock = threading.Lock()
+
+
+def snapshot_dir():
+    """Directory shared by the workers of one host, or '' when the snapshot store is off."""
+    return getattr(settings, "STORY_SNAPSHOT_DIR", "")
+
+
+def _snapshot_path(story_id):
+    return os.path.join(snapshot_dir(), f"story-{story_id}.snap")
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+class StorySnapshot:
+    """
+    Read-only story pages backed by a memory-mapped snapshot file. Pages are decoded on demand by
+    offset, so the mapped bytes are shared by every worker through the OS page cache. Offers the
+    same lookups as StoryIndex.
+    """
+
+    __slots__ = ('version', 'fields', '_map', '_data_start', '_offsets', '_choice_pages')
+
+    def __init__(self, mapped):
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a story snapshot")
+        header_start = len(MAGIC) + _HEADER_LENGTH.size
+        (header_length,) = _HEADER_LENGTH.unpack_from(mapped, len(MAGIC))
+        header = json.loads(mapped[header_start:header_start + header_length])
+        self.version = header['version']
+        self.fields = header['story']
+        self._map = mapped
+        self._data_start = header_start + header_length
+        self._offsets = {page_id: (offset, length) for page_id, offset, length in header['pages']}
+        self._choice_pages = header['choices']
+
+    def _decode(self, location):
+        offset, length = location
+        start = self._data_start + offset
+        return json.loads(self._map[start:start + length])
+
+    @property
+    def story(self):
+        """The whole story with its pages (decodes every page; prefer page() and field())."""
+        pages = sorted(self._offsets.values())
+        return {**self.fields, 'pages': [self._decode(location) for location in pages]}
+
+    def field(self, name):
+        return self.fields.get(name)
+
+    def page(self, page_id):
+        location = self._offsets.get(str(page_id))
+        return self._decode(location) if location is not None else None
+
+    def choice(self, choice_id):
+        page = self.page(self._choice_pages.get(str(choice_id), ''))
+        for choice in (page or {}).get('choices', []):
+            if str(choice.get('id')) == str(choice_id):
+                return page, choice
+        return None, None
+
+    def page_choice(self, page_id, choice_id):
+        page, choice = self.choice(choice_id)
+        if page is None or str(page.get('id')) != str(page_id):
+            return None
+        return choice
+
+
+def write_snapshot(story_id, version, story):
+    """Writes the snapshot for one story version and swaps it in atomically. Returns the StorySnapshot."""
+    fields = {key: value for key, value in story.items() if key != 'pages'}
+    blobs = []
+    locations = []
+    seen = set()
+    choices = {}
+    offset = 0
+    for page in story.get('pages', []):
+        page_id = str(page.get('id'))
+        if page_id in seen:
+            continue
+        seen.add(page_id)
+        blob = _encode(page)
+        blobs.append(blob)
+        locations.append((page_id, offset, len(blob)))
+        offset += len(blob)
+        for choice in page.get('choices', []):
+            choices.setdefault(str(choice.get('id')), page_id)
+    header = _encode({'version': str(version), 'story': fields, 'pages': locations, 'choices': choices})
+
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=f".story-{story_id}-", suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(MAGIC)
+            temp_file.write(_HEADER_LENGTH.pack(len(header)))
+            temp_file.write(header)
+            for blob in blobs:
+                temp_file.write(blob)
+        # Readers holding the old file keep their mapping; new readers see the complete new file.
+        os.replace(temp_path, _snapshot_path(story_id))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return open_snapshot(story_id, version)
+
+
+def open_snapshot(story_id, version=None):
+    """The mapped snapshot for this story version (any version if None), or None if there isn't one on disk."""
+    path = _snapshot_path(story_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _mapped_lock:
+        entry = _mapped.get(path)
+    if entry is None or entry[0] != identity:
+        try:
+            with open(path, 'rb') as snapshot_file:
+                mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            snapshot = StorySnapshot(mapped)
+        except (OSError, ValueError):
+            return None
+        entry = (identity, snapshot)
+        with _mapped_lock:
+            _mapped[path] = entry
+    snapshot = entry[1]
+    return snapshot if version is None or snapshot.version == str(version) else None
@@ -0,0 +1,292 @@
+(function () {
+    // Progress is sent to the server every few page turns and when the page is hidden.
+    var PROGRESS_SYNC_EVERY = 5;
+
+    function el(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) {
+            node.className = className;
+        }
+        if (text !== undefined && text !== null) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function storageGet(key) {
+        try {
+            return localStorage.getItem(key);
+        } catch (err) {
+            return null;
+        }
+    }
+
+    function storageSet(key, value) {
+        try {
+            localStorage.setItem(key, value);
+        } catch (err) {}
+    }
+
+    function newPlaythroughId() {
+        return Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var root = document.getElementById('offline-player');
+        if (!root) {
+            return;
+        }
+        var content = document.getElementById('offline-content');
+        var messageStack = document.getElementById('offline-messages');
+        var csrfToken = root.querySelector('input[name="csrfmiddlewaretoken"]').value;
+        var storyId = root.dataset.storyId;
+        var playerName = root.dataset.playerName || 'user';
+        var bundleKey = 'nahb-bundle-' + storyId;
+        var pendingEndingsKey = 'nahb-pending-endings';
+        var bundle = null;
+        var currentNodeId = null;
+        var turnsSinceSync = 0;
+        var playthrough = newPlaythroughId();
+
+        function injectName(value) {
+            if (typeof value !== 'string') {
+                return value;
+            }
+            return bundle.player_name.placeholders.reduce(function (text, placeholder) {
+                return text.split(placeholder).join(playerName);
+            }, value);
+        }
+
+        function speakerName(speaker) {
+            if (typeof speaker === 'string' && bundle.player_name.speaker_aliases.indexOf(speaker.trim().toLowerCase()) !== -1) {
+                return playerName;
+            }
+            return injectName(speaker);
+        }
+
+        function post(url, fields) {
+            var data = new FormData();
+            data.append('csrfmiddlewaretoken', csrfToken);
+            Object.keys(fields).forEach(function (key) {
+                data.append(key, fields[key]);
+            });
+            return fetch(url, { method: 'POST', body: data, credentials: 'same-origin' });
+        }
+
+        function syncProgress(useBeacon) {
+            if (!currentNodeId || turnsSinceSync === 0) {
+                return;
+            }
+            turnsSinceSync = 0;
+            if (useBeacon && navigator.sendBeacon) {
+                var data = new FormData();
+                data.append('csrfmiddlewaretoken', csrfToken);
+                data.append('node_id', currentNodeId);
+                navigator.sendBeacon(root.dataset.progressUrl, data);
+            } else {
+                post(root.dataset.progressUrl, { node_id: currentNodeId }).catch(function () {});
+            }
+        }
+
+        // Endings that couldn't be reported (e.g. while offline) are retried on the next visit.
+        function readPendingEndings() {
+            try {
+                return JSON.parse(storageGet(pendingEndingsKey) || '[]');
+            } catch (err) {
+                return [];
+            }
+        }
+
+        function reportEnding(report) {
+            return post(report.url, { ending_node_id: report.node_id, playthrough: report.playthrough })
+                .then(function (response) {
+                    if (!response.ok && response.status >= 500) {
+                        throw new Error('retry');
+                    }
+                });
+        }
+
+        function flushPendingEndings() {
+            var pending = readPendingEndings();
+            storageSet(pendingEndingsKey, '[]');
+            pending.forEach(function (report) {
+                reportEnding(report).catch(function () {
+                    var stillPending = readPendingEndings();
+                    stillPending.push(report);
+                    storageSet(pendingEndingsKey, JSON.stringify(stillPending));
+                });
+            });
+        }
+
+        function showMessage(text, level) {
+            messageStack.innerHTML = '';
+            if (text) {
+                messageStack.appendChild(el('div', 'flash-message ' + (level || 'success'), text));
+            }
+        }
+
+        function renderLines(container, lines, className) {
+            lines.forEach(function (line) {
+                var box = el('div', className);
+                if (line.speaker) {
+                    box.appendChild(el('strong', null, speakerName(line.speaker) + ':'));
+                    box.appendChild(document.createTextNode(' '));
+                }
+                box.appendChild(document.createTextNode(injectName(line.text || '')));
+                container.appendChild(box);
+            });
+        }
+
+        function renderEnding(node) {
+            var box = el('div', 'ending-box');
+            box.appendChild(el('h1', null, injectName(node.ending_label) || 'THE END'));
+            var text = el('div', 'ending-text');
+            var lines = node.content && node.content.length ? node.content : [{ text: node.text }];
+            lines.forEach(function (line) {
+                text.appendChild(el('p', null, injectName(line.text || '')));
+            });
+            box.appendChild(text);
+            if (node.outcome) {
+                box.appendChild(el('div', 'ending-outcome', 'Result: ' + injectName(node.outcome)));
+            }
+            var menu = el('a', 'btn', 'Back to Menu');
+            menu.href = root.dataset.menuUrl;
+            box.appendChild(menu);
+            return box;
+        }
+
+        function renderChoices(node) {
+            var wrap = el('div', 'choices');
+            wrap.appendChild(el('h3', null, 'What do you want to do?'));
+            node.choices.forEach(function (choice) {
+                var button = el('button', 'choice-btn');
+                button.type = 'button';
+                button.appendChild(el('div', null, injectName(choice.label)));
+                if (choice.roll) {
+                    var sides = choice.roll.sides || 6;
+                    var required = choice.roll.required || Math.max(1, Math.floor((sides + 1) / 2));
+                    button.appendChild(el('span', 'choice-roll', 'Dice 1d' + sides + ' >= ' + required));
+                }
+                button.addEventListener('click', function () {
+                    choose(choice);
+                });
+                wrap.appendChild(button);
+            });
+            return wrap;
+        }
+
+        function render(nodeId) {
+            var node = bundle.nodes[nodeId];
+            if (!node) {
+                showMessage('This part of the story is missing.', 'error');
+                return;
+            }
+            currentNodeId = nodeId;
+            content.innerHTML = '';
+            content.appendChild(el('h2', 'story-heading', injectName(node.title)));
+            var meta = el('div', 'player-meta', 'Playing as: ');
+            meta.appendChild(el('strong', null, playerName));
+            content.appendChild(meta);
+
+            if (node.illustration_url) {
+                var frame = el('div', 'illustration-frame');
+                var image = el('img');
+                image.src = node.illustration_url;
+                image.alt = 'Scene illustration';
+                image.loading = 'lazy';
+                image.onerror = function () { frame.style.display = 'none'; };
+                frame.appendChild(image);
+                content.appendChild(frame);
+            }
+
+            if (node.is_ending) {
+                content.appendChild(renderEnding(node));
+                var report = { url: root.dataset.endingUrl, node_id: nodeId, playthrough: playthrough };
+                reportEnding(report).catch(function () {
+                    var pending = readPendingEndings();
+                    pending.push(report);
+                    storageSet(pendingEndingsKey, JSON.stringify(pending));
+                });
+                storageSet('nahb-progress-' + storyId, '');
+                turnsSinceSync = 0;
+                playthrough = newPlaythroughId();
+                return;
+            }
+
+            if (node.text && node.type !== 'dialogue' && !(node.content && node.content.length)) {
+                content.appendChild(el('div', 'story-text', injectName(node.text)));
+            }
+            renderLines(content, node.dialogue || [], 'dialogue-box');
+            renderLines(content, node.content || [], 'dialogue-box');
+            content.appendChild(el('hr', 'divider'));
+            content.appendChild(renderChoices(node));
+
+            storageSet('nahb-progress-' + storyId, nodeId);
+            turnsSinceSync += 1;
+            if (turnsSinceSync >= PROGRESS_SYNC_EVERY) {
+                syncProgress(false);
+            }
+        }
+
+        function choose(choice) {
+            var nextNodeId = choice.target;
+            if (choice.roll) {
+                var sides = Math.min(Math.max(parseInt(choice.roll.sides, 10) || 6, 2), 100);
+                var required = parseInt(choice.roll.required, 10) || Math.max(1, Math.floor((sides + 1) / 2));
+                required = Math.min(Math.max(required, 1), sides);
+                var rolled = 1 + Math.floor(Math.random() * sides);
+                if (rolled >= required) {
+                    showMessage('Dice roll ' + rolled + '/' + sides + ' succeeded (needed ' + required + '+).', 'success');
+                } else if (choice.roll.fail_target) {
+                    showMessage('Dice roll ' + rolled + '/' + sides + ' failed (needed ' + required + '+). You were redirected.', 'warning');
+                    nextNodeId = choice.roll.fail_target;
+                } else {
+                    showMessage('Dice roll ' + rolled + '/' + sides + ' failed (needed ' + required + '+). Choice is inaccessible.', 'warning');
+                    return;
+                }
+            } else {
+                showMessage('');
+            }
+            render(String(nextNodeId));
+            window.scrollTo(0, 0);
+        }
+
+        function start(loaded) {
+            bundle = loaded;
+            var resume = root.dataset.resumeNode || storageGet('nahb-progress-' + storyId);
+            render(resume && bundle.nodes[resume] ? resume : bundle.story.start_node_id);
+        }
+
+        document.addEventListener('visibilitychange', function () {
+            if (document.visibilityState === 'hidden') {
+                syncProgress(true);
+            }
+        });
+        window.addEventListener('pagehide', function () {
+            syncProgress(true);
+        });
+
+        fetch(root.dataset.bundleUrl, { credentials: 'same-origin' })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error('bundle unavailable');
+                }
+                return response.text();
+            })
+            .then(function (text) {
+                storageSet(bundleKey, text);
+                start(JSON.parse(text));
+                flushPendingEndings();
+            })
+            .catch(function () {
+                // Keep playing from the last downloaded copy when the server can't be reached.
+                var stored = storageGet(bundleKey);
+                if (stored) {
+                    start(JSON.parse(stored));
+                } else {
+                    content.innerHTML = '';
+                    content.appendChild(el('p', 'player-meta', 'This story could not be loaded for offline play.'));
+                }
+            });
+    });
+})();
@@ -0,0 +1,241 @@
+(function () {
+    var fragmentHeader = 'X-Play-Fragment';
+
+    function initOlderComments(root) {
+        var loadOlderBtn = root.querySelector('#load-older-comments');
+        if (!loadOlderBtn) {
+            return;
+        }
+        loadOlderBtn.addEventListener('click', function () {
+            var pages = root.querySelectorAll('#comment-list .comment-page');
+            var cursor = pages[pages.length - 1].getAttribute('data-next-cursor');
+            loadOlderBtn.disabled = true;
+            fetch(loadOlderBtn.dataset.url + '?before=' + encodeURIComponent(cursor))
+                .then(function (response) {
+                    return response.ok ? response.text() : Promise.reject(response.status);
+                })
+                .then(function (html) {
+                    root.querySelector('#comment-list').insertAdjacentHTML('beforeend', html);
+                    var loaded = root.querySelectorAll('#comment-list .comment-page');
+                    loadOlderBtn.hidden = !loaded[loaded.length - 1].getAttribute('data-next-cursor');
+                })
+                .finally(function () {
+                    loadOlderBtn.disabled = false;
+                });
+        });
+    }
+
+    function initStarRating(root) {
+        var stars = root.querySelectorAll('#star-selector .star');
+        var ratingInput = root.querySelector('input[name="rating"]');
+        if (!ratingInput) {
+            return;
+        }
+        var currentRating = parseInt(ratingInput.value, 10) || 0;
+
+        function updateStars(val, type) {
+            stars.forEach(function (star) {
+                var starVal = parseInt(star.getAttribute('data-value'), 10);
+                if (type === 'hover') {
+                    star.classList.toggle('hover', starVal <= val);
+                } else if (type === 'select') {
+                    star.classList.toggle('selected', starVal <= val);
+                }
+            });
+        }
+
+        if (currentRating > 0) {
+            updateStars(currentRating, 'select');
+        }
+
+        stars.forEach(function (star) {
+            var value = parseInt(star.getAttribute('data-value'), 10);
+            star.addEventListener('mouseover', function () { updateStars(value, 'hover'); });
+            star.addEventListener('mouseout', function () { updateStars(0, 'hover'); });
+            star.addEventListener('click', function () {
+                currentRating = value;
+                ratingInput.value = currentRating;
+                updateStars(currentRating, 'select');
+            });
+        });
+    }
+
+    function initContent(root) {
+        initOlderComments(root);
+        initStarRating(root);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var container = document.getElementById('play-content');
+        if (!container) {
+            return;
+        }
+        initContent(container);
+
+        if (!window.fetch || !window.FormData || !window.history || !window.history.pushState) {
+            return;
+        }
+
+        // Fragments of the current node's destinations, fetched ahead of the click: play URL -> Promise of
+        // {playUrl, html}, or of null when there is nothing to swap in (endings answer prefetches with 204).
+        var prefetched = {};
+
+        function absoluteUrl(url) {
+            return new URL(url, window.location.href).href;
+        }
+
+        function fetchFragment(url, options) {
+            options.headers = options.headers || {};
+            options.headers[fragmentHeader] = '1';
+            options.credentials = 'same-origin';
+            return fetch(url, options);
+        }
+
+        function prefetchFragment(url) {
+            prefetched[url] = fetchFragment(url, { method: 'GET', headers: { 'Purpose': 'prefetch' } })
+                .then(function (response) {
+                    var playUrl = response.headers.get('X-Play-Url');
+                    if (response.status !== 200 || !playUrl) {
+                        return null;
+                    }
+                    return response.text().then(function (html) {
+                        return { playUrl: playUrl, html: html };
+                    });
+                })
+                .catch(function () {
+                    return null;
+                });
+        }
+
+        function updatePrefetches() {
+            // The <link rel="prefetch"> hints in <head> fetch full pages for the node first loaded; once
+            // pages are swapped in, they would point at the wrong destinations, so fragments replace them.
+            document.querySelectorAll('head link[rel="prefetch"]').forEach(function (link) {
+                link.parentNode.removeChild(link);
+            });
+            var wanted = {};
+            container.querySelectorAll('[data-next-url]').forEach(function (button) {
+                wanted[absoluteUrl(button.dataset.nextUrl)] = true;
+            });
+            Object.keys(prefetched).forEach(function (url) {
+                if (!wanted[url]) {
+                    delete prefetched[url];
+                }
+            });
+            Object.keys(wanted).forEach(function (url) {
+                if (!prefetched[url]) {
+                    prefetchFragment(url);
+                }
+            });
+        }
+
+        function showError(message) {
+            var stack = container.querySelector('.message-stack');
+            if (!stack) {
+                stack = document.createElement('div');
+                stack.className = 'message-stack';
+                container.insertBefore(stack, container.firstChild);
+            }
+            var item = document.createElement('div');
+            item.className = 'flash-message error';
+            item.textContent = message;
+            stack.appendChild(item);
+            window.scrollTo(0, 0);
+        }
+
+        function swapIn(html, playUrl, push) {
+            container.innerHTML = html;
+            initContent(container);
+            updatePrefetches();
+            if (push) {
+                window.history.pushState({ playUrl: playUrl }, '', playUrl);
+            }
+            window.scrollTo(0, 0);
+        }
+
+        // Page turns fetch only the story content and swap it in; the URL still tracks the current node.
+        function loadFragment(url, options, push) {
+            return fetchFragment(url, options).then(function (response) {
+                if (!response.ok) {
+                    // Rate limited (429) or the story server is busy (503): stay on the page and say so.
+                    var plain = (response.headers.get('Content-Type') || '').indexOf('text/plain') === 0;
+                    return response.text().then(function (text) {
+                        showError(plain && text ? text : 'Something went wrong. Please try again.');
+                    });
+                }
+                var playUrl = response.headers.get('X-Play-Url');
+                if (!playUrl) {
+                    // Not a play page (e.g. the story is gone): let the browser show it normally.
+                    window.location.href = response.url || url;
+                    return;
+                }
+                if (response.status === 204) {
+                    // The choice was recorded; its destination is the fragment prefetched for it.
+                    var fragment = prefetched[absoluteUrl(playUrl)] || Promise.resolve(null);
+                    return fragment.then(function (prefetch) {
+                        if (!prefetch) {
+                            return loadFragment(playUrl, { method: 'GET' }, push);
+                        }
+                        swapIn(prefetch.html, prefetch.playUrl, push);
+                    });
+                }
+                return response.text().then(function (html) {
+                    swapIn(html, playUrl, push);
+                });
+            });
+        }
+
+        updatePrefetches();
+        window.history.replaceState({ playUrl: window.location.href }, '', window.location.href);
+
+        container.addEventListener('submit', function (event) {
+            var form = event.target;
+            if (!form.classList.contains('choice-form')) {
+                return;
+            }
+            event.preventDefault();
+            var submitter = event.submitter;
+            var data = new FormData(form);
+            if (submitter && submitter.name) {
+                data.append(submitter.name, submitter.value);
+            }
+            var options = { method: 'POST', body: data, headers: {} };
+            var nextUrl = submitter && submitter.dataset.nextUrl;
+            if (nextUrl && prefetched[absoluteUrl(nextUrl)]) {
+                // Only the choice needs recording; the destination is swapped in from the prefetch.
+                options.headers['X-Play-Prefetched'] = nextUrl;
+            }
+            loadFragment(form.action, options, true).catch(function () {
+                // Fall back to a regular form post, keeping the pressed button's value.
+                if (submitter && submitter.name) {
+                    var input = document.createElement('input');
+                    input.type = 'hidden';
+                    input.name = submitter.name;
+                    input.value = submitter.value;
+                    form.appendChild(input);
+                }
+                form.submit();
+            });
+        });
+
+        container.addEventListener('click', function (event) {
+            var link = event.target.closest('a.choice-btn');
+            if (!link || event.metaKey || event.ctrlKey || event.shiftKey) {
+                return;
+            }
+            event.preventDefault();
+            loadFragment(link.href, { method: 'GET' }, true).catch(function () {
+                window.location.href = link.href;
+            });
+        });
+
+        window.addEventListener('popstate', function (event) {
+            if (!event.state || !event.state.playUrl) {
+                return;
+            }
+            loadFragment(event.state.playUrl, { method: 'GET' }, false).catch(function () {
+                window.location.reload();
+            });
+        });
+    });
+})();
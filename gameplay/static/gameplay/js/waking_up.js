@@ -0,0 +1,36 @@
+(function () {
+    var POLL_EVERY_MS = 3000;
+    // Reload anyway after a while, in case the status endpoint itself can't be reached.
+    var GIVE_UP_AFTER_MS = 120000;
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var root = document.getElementById('waking-up');
+        if (!root || !window.fetch) {
+            window.setTimeout(function () { window.location.reload(); }, 10000);
+            return;
+        }
+        var statusLine = document.getElementById('waking-up-status');
+        var startedAt = Date.now();
+
+        function poll() {
+            fetch(root.dataset.statusUrl, { credentials: 'same-origin', cache: 'no-store' })
+                .then(function (response) {
+                    return response.ok ? response.json() : { state: 'unknown' };
+                })
+                .catch(function () {
+                    return { state: 'unknown' };
+                })
+                .then(function (status) {
+                    if (status.state === 'warm' || Date.now() - startedAt > GIVE_UP_AFTER_MS) {
+                        window.location.reload();
+                        return;
+                    }
+                    var waited = Math.round((Date.now() - startedAt) / 1000);
+                    statusLine.textContent = 'Still waking up (' + waited + 's)... this page will continue on its own.';
+                    window.setTimeout(poll, POLL_EVERY_MS);
+                });
+        }
+
+        poll();
+    });
+})();
@@ -1,11 +1,39 @@
-from unittest.mock import patch
+import gzip
+import json
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import wait
+from copy import deepcopy
+from unittest.mock import Mock, patch
 
+import requests
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache, caches
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from .models import StoryOwnership, StoryRatingComment, StoryReport
+from . import admission, content_cache, keepwarm, mirror, ratelimit, services, upstream
+from .admission import UpstreamBusy
+from .cache_backends import TieredCache, parse_cache_url
+from .content_cache import (
+    bump_catalog_version, bump_story_version, cached_story_details, cached_story_index, catalog_version, node_version,
+    patch_cached_story_index, stale_while_revalidate, story_version,
+)
+from .graph import StoryGraphIndex, build_graph_state
+from .invalidation import sign_notification
+from .nodes import compact_node, node_dict
+from .prefetch import node_targets, prefetch_targets
+from .snapshots import StorySnapshot
+from .upstream import LatencyTracker, RetryBudget
+from .models import MirroredNode, Play, PlaySession, StoryOwnership, StoryRatingComment, StoryRatingSummary, StoryReport
+from .views import (
+    COMMENTS_PAGE_SIZE, _current_story_source, _find_choice_in_node, _inject_player_name, get_story_with_pages,
+)
 
 
 class StoryReportTests(TestCase):
@@ -128,6 +156,7 @@ class StoryReportModerationTests(TestCase):
 
 class StoryGraphTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.story_id = 501
         self.owner = User.objects.create_user(username='owner_user', password='pw123456')
         self.staff = User.objects.create_user(username='staff_user', password='pw123456', is_staff=True)
@@ -197,8 +226,95 @@ class StoryGraphTests(TestCase):
         elements = response.context['graph_elements']
         self.assertTrue(any(item.get('classes') == 'missing' for item in elements))
         self.assertTrue(any(item.get('classes') == 'broken' for item in elements))
+        self.assertTrue(all('position' in item for item in elements if 'source' not in item['data']))
 
+    @patch('gameplay.views.get_story_details')
+    def test_graph_payload_is_cached_and_patched_by_page_edits(self, mock_get_story_details):
+        mock_get_story_details.return_value = self._sample_story()
+        self.client.login(username='owner_user', password='pw123456')
+        self.client.get(self.graph_url)
+        self.client.get(self.graph_url)
+        self.assertEqual(mock_get_story_details.call_count, 1)
+
+        edit_url = reverse('edit_page', kwargs={'story_id': self.story_id, 'page_id': 'orphan'})
+        with patch('gameplay.views.update_page', return_value={'id': 'orphan'}):
+            self.client.post(edit_url, {'text': 'Now an ending', 'is_ending': 'on'})
+        calls_after_edit = mock_get_story_details.call_count
+
+        response = self.client.get(self.graph_url)
+        self.assertEqual(mock_get_story_details.call_count, calls_after_edit)
+        orphan = next(item for item in response.context['graph_elements'] if item['data']['id'] == 'orphan')
+        self.assertIn('ending', orphan['classes'])
+        self.assertEqual(orphan['data']['text_preview'], 'Now an ending')
+
+    @patch('gameplay.views.get_story_details')
+    def test_graph_keeps_layout_across_text_edits_and_expired_versions(self, mock_get_story_details):
+        mock_get_story_details.return_value = self._sample_story()
+        self.client.login(username='owner_user', password='pw123456')
+        self.client.get(self.graph_url)
+
+        edit_url = reverse('edit_page', kwargs={'story_id': self.story_id, 'page_id': 'orphan'})
+        with patch('gameplay.views.update_page', return_value={'id': 'orphan'}):
+            self.client.post(edit_url, {'text': 'Still unreachable'})
+        entry = cache.get(f"graph:{self.story_id}")
+        self.assertIsNotNone(entry['index'])
+        self.assertIsNotNone(entry['payload'])
+        orphan = next(item for item in entry['payload']['graph_elements'] if item['data']['id'] == 'orphan')
+        self.assertEqual(orphan['data']['text_preview'], 'Still unreachable')
+
+        # Once the version expires the story is read again, so edits made by other clients show up;
+        # the layout is only recomputed when the structure changed.
+        changed = self._sample_story()
+        changed['pages'][1]['text'] = 'Edited elsewhere'
+        mock_get_story_details.return_value = changed
+        calls_before = mock_get_story_details.call_count
+        cache.delete(content_cache._story_version_key(self.story_id))
+        with patch.object(StoryGraphIndex, 'layered_layout', wraps=StoryGraphIndex.layered_layout) as layout:
+            response = self.client.get(self.graph_url)
+        self.assertEqual(mock_get_story_details.call_count, calls_before + 1)
+        layout.assert_not_called()
+        mid = next(item for item in response.context['graph_elements'] if item['data']['id'] == 'mid')
+        self.assertEqual(mid['data']['text_preview'], 'Edited elsewhere')
+
+        changed['pages'][2]['choices'] = [{'id': 3, 'text': 'Back', 'next_page_id': 'start'}]
+        cache.delete(content_cache._story_version_key(self.story_id))
+        response = self.client.get(self.graph_url)
+        self.assertEqual(response.context['edge_count'], 3)
+
+    @patch('gameplay.views.get_story_details')
+    def test_graph_data_returns_compact_slices(self, mock_get_story_details):
+        mock_get_story_details.return_value = self._sample_story()
+        self.client.login(username='owner_user', password='pw123456')
+        data_url = reverse('story_graph_data', kwargs={'story_id': self.story_id})
+
+        neighborhood = self.client.get(data_url, {'mode': 'neighborhood', 'node': 'start', 'hops': 1}).json()
+        self.assertEqual(neighborhood['ids'], ['start', 'mid', 'missing::ghost'])
+        self.assertEqual(neighborhood['flags'], [1, 2, 8])
+        self.assertEqual(neighborhood['edge_sources'], [0, 0])
+        self.assertEqual(neighborhood['edge_targets'], [1, 2])
+
+        issues = self.client.get(data_url, {'mode': 'issues'}).json()
+        self.assertEqual(issues['ids'], ['start', 'orphan', 'missing::ghost'])
+
+        path = self.client.get(data_url, {'mode': 'path', 'node': 'mid'}).json()
+        self.assertEqual(path['ids'][:2], ['start', 'mid'])
+        self.assertEqual(self.client.get(data_url, {'mode': 'path', 'node': 'orphan'}).status_code, 404)
+        self.assertEqual(self.client.get(data_url, {'mode': 'bogus'}).status_code, 400)
 
+    @patch('gameplay.views.GRAPH_INLINE_NODE_LIMIT', 2)
+    @patch('gameplay.views.get_story_details')
+    def test_large_graph_page_embeds_start_neighborhood_only(self, mock_get_story_details):
+        mock_get_story_details.return_value = self._sample_story()
+        self.client.login(username='owner_user', password='pw123456')
+        response = self.client.get(self.graph_url)
+
+        self.assertTrue(response.context['incremental'])
+        self.assertEqual(response.context['graph_elements'], [])
+        self.assertNotIn('orphan', response.context['graph_initial']['ids'])
+        self.assertEqual(response.context['node_count'], 3)
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
 class ChoiceRollTests(TestCase):
     def setUp(self):
         self.story_id = 777
@@ -263,6 +379,42 @@ class ChoiceRollTests(TestCase):
         expected = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': self.node_id})
         self.assertRedirects(response, expected, fetch_redirect_response=False)
 
+    def _rendered_token(self, choice):
+        node = {'id': self.node_id, 'text': 'Fork', 'choices': [choice]}
+        with patch('gameplay.views.get_node', return_value=node), \
+                patch('gameplay.views.get_story_details', return_value={'status': 'published'}):
+            response = self.client.get(reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': self.node_id}))
+        return response.context['node']['choices'][0]['token']
+
+    @patch('gameplay.views.random.randint', return_value=1)
+    @patch('gameplay.views.get_node')
+    def test_choice_token_resolves_without_upstream_fetch(self, mock_get_node, _mock_randint):
+        cache.clear()
+        token = self._rendered_token(
+            {'id': 5, 'target_node': 'treasure', 'requires_roll': True, 'roll_sides': 6, 'roll_required': 4,
+             'on_fail_target': 'pitfall'}
+        )
+        response = self.client.post(self.url, {'choice_token': token})
+        expected = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'pitfall'})
+        self.assertRedirects(response, expected, fetch_redirect_response=False)
+        mock_get_node.assert_not_called()
+
+        other_node_url = reverse('choose_choice', kwargs={'story_id': self.story_id, 'node_id': 'elsewhere'})
+        mock_get_node.return_value = None
+        self.client.post(other_node_url, {'choice_token': token})
+        mock_get_node.assert_called_once()
+
+    @patch('gameplay.views.get_node')
+    def test_stale_choice_token_refetches_node(self, mock_get_node):
+        cache.clear()
+        token = self._rendered_token({'id': 6, 'target_node': 'old_target'})
+        bump_story_version(self.story_id, node_ids=[self.node_id])
+        mock_get_node.return_value = {'id': self.node_id, 'choices': [{'id': 6, 'target_node': 'new_target'}]}
+
+        response = self.client.post(self.url, {'choice_token': token})
+        expected = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'new_target'})
+        self.assertRedirects(response, expected, fetch_redirect_response=False)
+
 
 class RatingSourceIsolationTests(TestCase):
     def test_same_story_id_can_exist_for_different_sources(self):
@@ -302,6 +454,7 @@ class RatingSourceIsolationTests(TestCase):
             )
 
 
+@override_settings(NODE_PREFETCH_ENABLED=False)
 class PlayerNameDisplayTests(TestCase):
     def setUp(self):
         self.story_id = 321
@@ -353,3 +506,1169 @@ class PlayerNameDisplayTests(TestCase):
         self.assertEqual(rendered_node['content'][2]['speaker'], 'minkie')
         self.assertEqual(rendered_node['content'][0]['text'], 'Hi minkie!')
         self.assertEqual(rendered_node['choices'][0]['label'], 'Help minkie')
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class EndingCommentsTests(TestCase):
+    def setUp(self):
+        self.story_id = 654
+        self.source = _current_story_source()
+        self.play_url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'end'})
+        self.comments_url = reverse('story_comments', kwargs={'story_id': self.story_id})
+        for index in range(COMMENTS_PAGE_SIZE + 3):
+            user = User.objects.create_user(username=f'commenter_{index}', password='pw123456')
+            StoryRatingComment.objects.create(
+                user=user,
+                story_id=self.story_id,
+                story_source=self.source,
+                rating=(index % 5) + 1,
+                comment=f'comment {index}',
+            )
+
+    def test_summary_tracks_comment_writes(self):
+        summary = StoryRatingSummary.objects.get(story_source=self.source, story_id=self.story_id)
+        self.assertEqual(summary.rating_count, COMMENTS_PAGE_SIZE + 3)
+
+        StoryRatingComment.objects.filter(story_id=self.story_id).first().delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.rating_count, COMMENTS_PAGE_SIZE + 2)
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 654, 'status': 'published'})
+    @patch('gameplay.views.get_node', return_value={'id': 'end', 'is_ending': True, 'choices': []})
+    def test_ending_page_shows_first_page_and_older_pages_load_by_cursor(self, _mock_node, _mock_story):
+        response = self.client.get(self.play_url)
+        self.assertEqual(response.status_code, 200)
+        first_page = response.context['ratings_comments']
+        self.assertEqual(len(first_page), COMMENTS_PAGE_SIZE)
+        self.assertEqual(response.context['rating_summary'].rating_count, COMMENTS_PAGE_SIZE + 3)
+        cursor = response.context['comments_next_cursor']
+        self.assertTrue(cursor)
+
+        response = self.client.get(self.comments_url, {'before': cursor})
+        self.assertEqual(response.status_code, 200)
+        older_page = response.context['ratings_comments']
+        self.assertEqual(len(older_page), 3)
+        self.assertEqual(response.context['comments_next_cursor'], '')
+        self.assertFalse({c.id for c in first_page} & {c.id for c in older_page})
+
+    def test_comments_fragment_rejects_bad_cursor(self):
+        response = self.client.get(self.comments_url, {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments_fragment_rejects_out_of_range_cursor(self):
+        response = self.client.get(self.comments_url, {'before': f"{10 ** 30}-1"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 888
+        self.owner = User.objects.create_user(username='fragment_owner', password='pw123456')
+        StoryOwnership.objects.create(user=self.owner, story_id=self.story_id)
+        self.play_url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'intro'})
+
+    def _node(self, text):
+        return {
+            'id': 'intro',
+            'title': 'Intro',
+            'text': text,
+            'choices': [{'id': 1, 'label': 'Continue', 'target_node': 'next'}],
+        }
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 888, 'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_node_body_is_served_from_cache_until_node_is_edited(self, mock_get_node, mock_story):
+        mock_get_node.return_value = self._node('First draft text')
+        self.assertContains(self.client.get(self.play_url), 'First draft text')
+
+        mock_get_node.return_value = self._node('Rewritten text')
+        self.assertContains(self.client.get(self.play_url), 'First draft text')
+
+        mock_story.return_value = {
+            'id': self.story_id,
+            'status': 'published',
+            'pages': [self._node('Rewritten text')],
+        }
+        self.client.login(username='fragment_owner', password='pw123456')
+        edit_url = reverse('edit_page', kwargs={'story_id': self.story_id, 'page_id': 'intro'})
+        with patch('gameplay.views.update_page', return_value={'id': 'intro'}):
+            self.client.post(edit_url, {'text': 'Rewritten text'})
+
+        response = self.client.get(self.play_url)
+        self.assertContains(response, 'Rewritten text')
+        self.assertNotContains(response, 'First draft text')
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 888, 'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_node_body_cache_is_keyed_by_player_name(self, mock_get_node, _mock_story):
+        mock_get_node.return_value = self._node('Hello {{player_name}}')
+        self.assertContains(self.client.get(self.play_url), 'Hello user')
+
+        session = self.client.session
+        session['story_player_names'] = {str(self.story_id): 'minkie'}
+        session.save()
+        self.assertContains(self.client.get(self.play_url), 'Hello minkie')
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 909
+        self.play_url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'intro'})
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 909, 'status': 'published'})
+    @patch('gameplay.views.get_node', return_value={
+        'id': 'intro',
+        'title': 'Intro',
+        'choices': [{'id': 1, 'label': 'Go', 'target_node': 'next'}],
+    })
+    def test_play_node_answers_revalidation_with_304_without_upstream_call(self, mock_get_node, _mock_story):
+        response = self.client.get(self.play_url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('private', response.headers['Cache-Control'])
+
+        mock_get_node.reset_mock()
+        response = self.client.get(self.play_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        mock_get_node.assert_not_called()
+
+        bump_story_version(self.story_id, node_ids=['intro'])
+        response = self.client.get(self.play_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 909, 'status': 'published'})
+    @patch('gameplay.views.get_node', return_value={'id': 'end', 'is_ending': True, 'choices': []})
+    def test_ending_pages_are_not_validated(self, _mock_node, _mock_story):
+        url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'end'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    @patch('gameplay.views.get_stories', return_value=[{'id': 909, 'title': 'Catalog', 'description': ''}])
+    def test_story_list_is_revalidated_until_catalog_changes(self, mock_get_stories):
+        response = self.client.get(reverse('story_list'))
+        etag = response.headers['ETag']
+
+        response = self.client.get(reverse('story_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(mock_get_stories.call_count, 1)
+
+        bump_catalog_version()
+        response = self.client.get(reverse('story_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @patch('gameplay.views.get_story_details', return_value={'id': 909, 'title': 'Catalog'})
+    @patch('gameplay.views.get_stories', return_value=[{'id': 909, 'title': 'Catalog', 'description': ''}])
+    def test_story_list_with_pending_message_is_not_answered_304(self, _mock_get_stories, _mock_details):
+        User.objects.create_user(username='revalidating_reporter', password='pw123456')
+        self.client.login(username='revalidating_reporter', password='pw123456')
+        etag = self.client.get(reverse('story_list')).headers['ETag']
+
+        self.client.post(reverse('report_story', kwargs={'story_id': 909}), {
+            'reason': StoryReport.Reason.SPAM,
+            'details': 'Spam.',
+        })
+        response = self.client.get(reverse('story_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Report submitted')
+
+
+class StoryGraphIndexTests(TestCase):
+    def _index(self, pages, start='a'):
+        return StoryGraphIndex.from_state(build_graph_state({'start_node_id': start, 'pages': pages}))
+
+    def _page(self, page_id, *targets, is_ending=False):
+        return {
+            'id': page_id,
+            'is_ending': is_ending,
+            'choices': [{'id': f'{page_id}{n}', 'next_page_id': t} for n, t in enumerate(targets)],
+        }
+
+    def test_analytics_find_cycles_dead_ends_and_ending_paths(self):
+        index = self._index([
+            self._page('a', 'b', 'c'),
+            self._page('b', 'd'),
+            self._page('c', 'e'),
+            self._page('d', is_ending=True),
+            self._page('e', 'f'),
+            self._page('f', 'e'),
+            self._page('g'),
+        ])
+        analytics = index.analytics()
+
+        self.assertEqual(analytics['cycle_count'], 1)
+        self.assertEqual(analytics['cycle_node_count'], 2)
+        self.assertEqual(analytics['dead_end_node_ids'], ['g'])
+        self.assertEqual(analytics['reachable_dead_end_node_ids'], [])
+        self.assertEqual(sorted(analytics['stuck_node_ids']), ['c', 'e', 'f'])
+        self.assertEqual(analytics['max_depth'], 3)
+        self.assertEqual(analytics['ending_paths'], [{'id': 'd', 'length': 2, 'path': ['a', 'b', 'd']}])
+
+    def test_layered_layout_places_nodes_by_depth(self):
+        index = self._index([
+            self._page('a', 'b', 'c'),
+            self._page('b', 'd'),
+            self._page('c', 'd'),
+            self._page('d', is_ending=True),
+            self._page('orphan'),
+        ])
+        positions = index.layered_layout()
+        ys = {node_id: positions[index.index[node_id]][1] for node_id in index.node_ids}
+        self.assertEqual(ys['b'], ys['c'])
+        self.assertLess(ys['a'], ys['b'])
+        self.assertLess(ys['b'], ys['d'])
+        self.assertGreater(ys['orphan'], ys['d'])
+        self.assertEqual(len(set(positions)), len(positions))
+
+    def test_csr_arrays_skip_broken_targets(self):
+        index = self._index([self._page('a', 'b', 'ghost'), self._page('b', 'a')])
+        self.assertEqual(list(index.successors(index.index['a'])), [index.index['b']])
+        self.assertEqual(list(index.predecessors(index.index['a'])), [index.index['b']])
+        self.assertEqual(len(index.strongly_connected_components()), 1)
+
+
+class PublishValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1201
+        self.owner = User.objects.create_user(username='publisher', password='pw123456')
+        StoryOwnership.objects.create(user=self.owner, story_id=self.story_id)
+        self.client.login(username='publisher', password='pw123456')
+        self.edit_url = reverse('edit_story', kwargs={'story_id': self.story_id})
+
+    def _story(self, pages):
+        return {'id': self.story_id, 'title': 'T', 'description': 'D', 'status': 'draft', 'pages': pages}
+
+    @patch('gameplay.views.update_story')
+    @patch('gameplay.views.get_story_details')
+    def test_publishing_is_blocked_when_no_ending_is_reachable(self, mock_details, mock_update):
+        mock_details.return_value = self._story([
+            {'id': 'a', 'choices': [{'id': 1, 'next_page_id': 'b'}]},
+            {'id': 'b', 'choices': [{'id': 2, 'next_page_id': 'a'}]},
+        ])
+        mock_update.return_value = {'id': self.story_id}
+        self.client.post(self.edit_url, {'title': 'T', 'description': 'D', 'status': 'published'})
+        self.assertEqual(mock_update.call_args[0][1]['status'], 'draft')
+
+    @patch('gameplay.views.update_story')
+    @patch('gameplay.views.get_story_details')
+    def test_publishing_valid_story_is_allowed(self, mock_details, mock_update):
+        mock_details.return_value = self._story([
+            {'id': 'a', 'choices': [{'id': 1, 'next_page_id': 'b'}]},
+            {'id': 'b', 'is_ending': True, 'choices': []},
+        ])
+        mock_update.return_value = {'id': self.story_id}
+        self.client.post(self.edit_url, {'title': 'T', 'description': 'D', 'status': 'published'})
+        self.assertEqual(mock_update.call_args[0][1]['status'], 'published')
+
+
+    @patch('gameplay.views.create_story', return_value={'id': 1202})
+    def test_new_stories_start_as_drafts(self, mock_create):
+        self.client.post(reverse('create_story'), {'title': 'T', 'description': 'D', 'status': 'published'})
+        self.assertEqual(mock_create.call_args[0][0]['status'], 'draft')
+        self.assertTrue(StoryOwnership.objects.filter(user=self.owner, story_id=1202).exists())
+
+class StoryIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1301
+        self.owner = User.objects.create_user(username='indexer', password='pw123456')
+        StoryOwnership.objects.create(user=self.owner, story_id=self.story_id)
+        self.client.login(username='indexer', password='pw123456')
+
+    def _story(self):
+        return {
+            'id': self.story_id,
+            'title': 'Indexed',
+            'pages': [
+                {'id': 'a', 'choices': [{'id': 1, 'text': 'Go', 'next_page_id': 'b'}]},
+                {'id': 'b', 'choices': [{'id': 2, 'text': 'Back', 'next_page_id': 'a'}]},
+            ],
+        }
+
+    @patch('gameplay.views.update_choice')
+    @patch('gameplay.views.get_story_details')
+    def test_authoring_views_download_story_once_per_version(self, mock_details, mock_update_choice):
+        mock_details.return_value = self._story()
+        mock_update_choice.return_value = {'id': 1}
+        edit_url = reverse('edit_choice', kwargs={'story_id': self.story_id, 'page_id': 'a', 'choice_id': 1})
+
+        self.assertEqual(self.client.get(edit_url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('edit_page', kwargs={'story_id': self.story_id, 'page_id': 'b'})).status_code, 200)
+        response = self.client.post(edit_url, {'text': 'Go on', 'next_page_id': 'b'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mock_details.call_count, 1)
+
+    @patch('gameplay.views.get_story_details')
+    def test_choice_must_belong_to_page_and_targets_must_exist(self, mock_details):
+        mock_details.return_value = self._story()
+        wrong_page_url = reverse('edit_choice', kwargs={'story_id': self.story_id, 'page_id': 'b', 'choice_id': 1})
+        self.assertEqual(self.client.get(wrong_page_url).status_code, 403)
+
+        add_url = reverse('add_choice', kwargs={'story_id': self.story_id, 'page_id': 'a'})
+        response = self.client.post(add_url, {'text': 'Nowhere', 'next_page_id': 'ghost'})
+        self.assertEqual(response.status_code, 403)
+
+    @patch('gameplay.views.create_choice')
+    @patch('gameplay.views.update_page')
+    @patch('gameplay.views.get_story_details')
+    def test_writes_are_applied_to_cached_story(self, mock_details, mock_update_page, mock_create_choice):
+        mock_details.return_value = self._story()
+        mock_update_page.return_value = {'id': 'b'}
+        mock_create_choice.return_value = {'id': 3}
+        edit_story_url = reverse('edit_story', kwargs={'story_id': self.story_id})
+        self.client.get(edit_story_url)
+
+        self.client.post(reverse('edit_page', kwargs={'story_id': self.story_id, 'page_id': 'b'}), {'text': 'Rewritten page'})
+        self.client.post(
+            reverse('add_choice', kwargs={'story_id': self.story_id, 'page_id': 'b'}),
+            {'text': 'Loop around', 'next_page_id': 'b'},
+        )
+        response = self.client.get(edit_story_url)
+
+        self.assertEqual(mock_details.call_count, 1)
+        self.assertContains(response, 'Rewritten page')
+        self.assertContains(response, 'Loop around')
+
+
+class SnapshotStoryIndexTests(StoryIndexTests):
+    """The same authoring flows with story snapshots kept in memory-mapped files."""
+
+    def setUp(self):
+        snapshot_root = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_root.cleanup)
+        settings_override = override_settings(STORY_SNAPSHOT_DIR=snapshot_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+    def test_snapshot_is_swapped_per_version(self):
+        loads = []
+
+        def load():
+            loads.append(1)
+            return self._story()
+
+        index = cached_story_index(self.story_id, load)
+        self.assertIsInstance(index, StorySnapshot)
+        self.assertEqual(index.page_choice('a', 1)['next_page_id'], 'b')
+        self.assertEqual(index.field('title'), 'Indexed')
+        self.assertIsNone(index.page_choice('b', 1))
+        cached_story_index(self.story_id, load)
+        self.assertEqual(len(loads), 1)
+
+        bump_story_version(self.story_id)
+        updated = cached_story_index(self.story_id, load)
+        self.assertEqual(len(loads), 2)
+        # The mapping handed out earlier stays readable after the file was replaced.
+        self.assertEqual(index.page('b')['id'], 'b')
+        self.assertEqual([page['id'] for page in updated.story['pages']], ['a', 'b'])
+
+
+class StoryShapeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('gameplay.views.get_story_nodes')
+    @patch('gameplay.views.get_story_details')
+    def test_embedded_pages_skip_nodes_request_once_known(self, mock_details, mock_nodes):
+        mock_details.return_value = {'id': 1, 'pages': [{'id': 'a', 'choices': []}]}
+        mock_nodes.return_value = [{'id': 'a', 'choices': []}]
+
+        self.assertEqual(get_story_with_pages(1)['pages'][0]['id'], 'a')
+        self.assertEqual(mock_nodes.call_count, 1)
+        get_story_with_pages(1)
+        self.assertEqual(mock_nodes.call_count, 1)
+
+    @patch('gameplay.views.get_story_nodes')
+    @patch('gameplay.views.get_story_details')
+    def test_separate_pages_are_fetched_alongside_details(self, mock_details, mock_nodes):
+        mock_details.side_effect = lambda story_id: {'id': story_id}
+        mock_nodes.return_value = [{'id': 'a', 'choices': []}]
+
+        get_story_with_pages(2)
+        story = get_story_with_pages(2)
+        self.assertEqual(story['pages'], [{'id': 'a', 'choices': []}])
+        self.assertEqual(mock_details.call_count, 2)
+        self.assertEqual(mock_nodes.call_count, 2)
+
+    @patch('gameplay.views.get_story_nodes')
+    @patch('gameplay.views.get_story_details')
+    def test_embedded_empty_pages_count_as_embedded(self, mock_details, mock_nodes):
+        mock_details.return_value = {'id': 3, 'pages': []}
+        mock_nodes.return_value = []
+
+        get_story_with_pages(3)
+        self.assertEqual(get_story_with_pages(3)['pages'], [])
+        self.assertEqual(mock_nodes.call_count, 1)
+
+    @patch('gameplay.views.get_story_nodes', return_value=None)
+    @patch('gameplay.views.get_story_details')
+    def test_failed_parallel_nodes_fetch_is_not_repeated(self, mock_details, mock_nodes):
+        mock_details.return_value = {'id': 4}
+        self.assertEqual(get_story_with_pages(4)['pages'], [])
+        self.assertEqual(mock_nodes.call_count, 1)
+
+
+class NodePrefetchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1401
+
+    @override_settings(NODE_PREFETCH_ENABLED=True)
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_targets_are_prefetched_into_node_cache(self, mock_get_node, _mock_details):
+        nodes = {
+            'start': {'id': 'start', 'text': 'Fork', 'choices': [
+                {'id': 1, 'target_node': 'left'},
+                {'id': 2, 'target_node': 'right', 'requires_roll': True, 'on_fail_target': 'pit'},
+            ]},
+            'left': {'id': 'left', 'text': 'Left', 'choices': []},
+            'right': {'id': 'right', 'text': 'Right', 'choices': []},
+            'pit': {'id': 'pit', 'text': 'Pit', 'choices': []},
+        }
+        mock_get_node.side_effect = lambda story_id, node_id: nodes[node_id]
+
+        scheduled = []
+        with patch('gameplay.views.prefetch_targets', lambda *args: scheduled.extend(prefetch_targets(*args))):
+            self.client.get(reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'start'}))
+        wait(scheduled)
+        self.assertEqual(len(scheduled), 3)
+        self.assertEqual(mock_get_node.call_count, 4)
+
+        response = self.client.get(reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'pit'}))
+        self.assertContains(response, 'Pit')
+        self.assertEqual(mock_get_node.call_count, 4)
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class PrefetchHintTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1501
+        self.nodes = {
+            'start': {'id': 'start', 'text': 'Fork', 'choices': [
+                {'id': 1, 'text': 'Walk', 'target_node': 'end'},
+                {'id': 2, 'text': 'Gamble', 'target_node': 'jackpot', 'requires_roll': True},
+            ]},
+            'end': {'id': 'end', 'text': 'The end', 'is_ending': True, 'choices': []},
+        }
+
+    def _url(self, node_id):
+        return reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': node_id})
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_page_hints_only_non_roll_targets(self, mock_get_node, _mock_details):
+        mock_get_node.side_effect = lambda story_id, node_id: self.nodes[node_id]
+        response = self.client.get(self._url('start'))
+        self.assertContains(response, f'<link rel="prefetch" href="{self._url("end")}">')
+        self.assertNotContains(response, self._url('jackpot'))
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_prefetch_requests_have_no_side_effects(self, mock_get_node, _mock_details):
+        mock_get_node.side_effect = lambda story_id, node_id: self.nodes[node_id]
+
+        response = self.client.get(self._url('start'), HTTP_SEC_PURPOSE='prefetch')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertFalse(PlaySession.objects.exists())
+
+        response = self.client.get(self._url('end'), HTTP_SEC_PURPOSE='prefetch')
+        self.assertEqual(response.status_code, 204)
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertFalse(Play.objects.exists())
+
+    @patch('gameplay.views.get_node')
+    def test_choosing_records_progress_at_destination(self, mock_get_node):
+        mock_get_node.return_value = {'id': 'start', 'choices': [{'id': 3, 'target_node': 'middle'}]}
+        self.client.post(
+            reverse('choose_choice', kwargs={'story_id': self.story_id, 'node_id': 'start'}), {'choice_id': '3'}
+        )
+        self.assertEqual(PlaySession.objects.get(story_id=self.story_id).current_node_id, 'middle')
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class FragmentPageTurnTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1601
+        self.nodes = {
+            'start': {'id': 'start', 'text': 'Fork', 'choices': [{'id': 1, 'text': 'Walk', 'target_node': 'path'}]},
+            'path': {'id': 'path', 'text': 'A quiet path', 'choices': []},
+        }
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_choosing_in_fragment_mode_renders_destination_without_redirect(self, mock_get_node, _mock_details):
+        mock_get_node.side_effect = lambda story_id, node_id: self.nodes[node_id]
+        response = self.client.post(
+            reverse('choose_choice', kwargs={'story_id': self.story_id, 'node_id': 'start'}),
+            {'choice_id': '1'},
+            HTTP_X_PLAY_FRAGMENT='1',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Play-Url'], reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'path'}))
+        self.assertContains(response, 'A quiet path')
+        self.assertNotContains(response, '<html')
+        self.assertEqual(PlaySession.objects.get(story_id=self.story_id).current_node_id, 'path')
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_choosing_a_prefetched_destination_only_records_progress(self, mock_get_node, _mock_details):
+        mock_get_node.side_effect = lambda story_id, node_id: self.nodes[node_id]
+        path_url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'path'})
+        start = self.client.get(reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'start'}))
+        self.assertContains(start, f'data-next-url="{path_url}"')
+
+        response = self.client.post(
+            reverse('choose_choice', kwargs={'story_id': self.story_id, 'node_id': 'start'}),
+            {'choice_id': '1'},
+            HTTP_X_PLAY_FRAGMENT='1',
+            HTTP_X_PLAY_PREFETCHED=path_url,
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['X-Play-Url'], path_url)
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(PlaySession.objects.get(story_id=self.story_id).current_node_id, 'path')
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_fragment_and_full_page_have_distinct_validators(self, mock_get_node, _mock_details):
+        mock_get_node.side_effect = lambda story_id, node_id: self.nodes[node_id]
+        url = reverse('play_node', kwargs={'story_id': self.story_id, 'node_id': 'start'})
+        page = self.client.get(url)
+        fragment = self.client.get(url, HTTP_X_PLAY_FRAGMENT='1', HTTP_IF_NONE_MATCH=page['ETag'])
+
+        self.assertContains(page, 'gameplay/js/play.js')
+        self.assertEqual(fragment.status_code, 200)
+        self.assertIn('X-Play-Fragment', fragment['Vary'])
+
+
+class StoryBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story_id = 1701
+        self.story = {
+            'id': self.story_id,
+            'title': 'Bundled',
+            'status': 'published',
+            'start_node_id': 'start',
+            'pages': [
+                {'id': 'start', 'title': 'Hi {player_name}', 'text': 'Go', 'choices': [
+                    {'id': 1, 'text': 'Roll', 'next_page_id': 'end', 'requires_roll': True,
+                     'roll_sides': 6, 'roll_required': 4, 'on_fail_target': 'start'},
+                ]},
+                {'id': 'end', 'title': 'End', 'text': 'Done', 'is_ending': True, 'ending_label': 'Win', 'choices': []},
+            ],
+        }
+
+    @patch('gameplay.views.get_story_nodes', return_value=None)
+    @patch('gameplay.views.get_story_details')
+    def test_bundle_is_compressed_versioned_and_cached(self, mock_details, _mock_nodes):
+        mock_details.return_value = self.story
+        url = reverse('story_bundle', kwargs={'story_id': self.story_id})
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        bundle = json.loads(gzip.decompress(response.content))
+        self.assertEqual(bundle['story']['start_node_id'], 'start')
+        self.assertEqual(bundle['nodes']['start']['choices'][0]['roll'],
+                         {'sides': 6, 'required': 4, 'fail_target': 'start'})
+        self.assertTrue(bundle['nodes']['end']['is_ending'])
+        self.assertIn('{player_name}', bundle['player_name']['placeholders'])
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn('Accept-Encoding', not_modified['Vary'])
+        self.assertEqual(json.loads(self.client.get(url).content)['version'], bundle['version'])
+        self.assertEqual(mock_details.call_count, 1)
+
+    @patch('gameplay.views.get_story_nodes', return_value=None)
+    @patch('gameplay.views.get_story_details')
+    def test_draft_stories_are_not_bundled(self, mock_details, _mock_nodes):
+        mock_details.return_value = {**self.story, 'status': 'draft'}
+        response = self.client.get(reverse('story_bundle', kwargs={'story_id': self.story_id}))
+        self.assertEqual(response.status_code, 404)
+
+    @patch('gameplay.views.get_story_nodes', return_value=None)
+    @patch('gameplay.views.get_story_details')
+    def test_reported_endings_and_progress_are_validated(self, mock_details, _mock_nodes):
+        mock_details.return_value = self.story
+        progress_url = reverse('story_bundle_progress', kwargs={'story_id': self.story_id})
+        ending_url = reverse('story_bundle_ending', kwargs={'story_id': self.story_id})
+
+        self.assertEqual(self.client.post(progress_url, {'node_id': 'start'}).status_code, 204)
+        self.assertEqual(PlaySession.objects.get(story_id=self.story_id).current_node_id, 'start')
+
+        self.assertEqual(self.client.post(ending_url, {'ending_node_id': 'start', 'playthrough': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.post(ending_url, {'ending_node_id': 'end'}).status_code, 400)
+        self.client.post(ending_url, {'ending_node_id': 'end', 'playthrough': 'abc'})
+        self.client.post(ending_url, {'ending_node_id': 'end', 'playthrough': 'abc'})
+        self.assertEqual(Play.objects.filter(story_id=self.story_id, ending_node_id='end').count(), 1)
+        self.assertFalse(PlaySession.objects.filter(story_id=self.story_id).exists())
+
+
+class StoryMirrorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.summary = {'id': 1801, 'title': 'Mirrored', 'status': 'published', 'updated_at': '2026-10-01T00:00:00'}
+        self.details = {
+            **self.summary,
+            'start_node_id': 'a',
+            'pages': [
+                {'id': 'a', 'custom_id': 'node_a', 'text': 'Start', 'choices': [{'id': 1, 'text': 'On', 'next_page_id': 'b'}]},
+                {'id': 'b', 'text': 'End', 'is_ending': True, 'choices': []},
+            ],
+        }
+
+    @patch('gameplay.services.fetch_story_details')
+    @patch('gameplay.services.fetch_stories')
+    def test_sync_is_incremental_and_reads_come_from_mirror(self, mock_stories, mock_details):
+        mock_stories.return_value = [self.summary]
+        mock_details.return_value = self.details
+
+        self.assertEqual(mirror.sync_all(), {'created': 1})
+        self.assertEqual(mirror.sync_all(), {'unchanged': 1})
+        self.assertEqual(mock_details.call_count, 1)
+
+        with override_settings(STORY_MIRROR_ENABLED=True), patch('gameplay.services.requests.get') as mock_http:
+            story = services.get_story_details(1801)
+            node = services.get_node(1801, 'node_a')
+            start = services.get_story_start(1801)
+            mock_http.assert_not_called()
+        self.assertEqual([page['id'] for page in story['pages']], ['a', 'b'])
+        self.assertEqual(node['choices'][0]['target_node'], 'b')
+        self.assertEqual(start['id'], 'a')
+
+    @patch('gameplay.services.fetch_story_details')
+    @patch('gameplay.services.fetch_stories')
+    def test_changed_story_only_rewrites_changed_rows(self, mock_stories, mock_details):
+        mock_stories.return_value = [self.summary]
+        mock_details.return_value = self.details
+        mirror.sync_all()
+        untouched = MirroredNode.objects.get(node_id='b')
+
+        changed = deepcopy(self.details)
+        changed['pages'][0]['text'] = 'New start'
+        mock_stories.return_value = [{**self.summary, 'updated_at': '2026-10-02T00:00:00'}]
+        mock_details.return_value = changed
+        self.assertEqual(mirror.sync_all(), {'updated': 1})
+
+        self.assertEqual(MirroredNode.objects.get(node_id='a').data['text'], 'New start')
+        self.assertEqual(MirroredNode.objects.get(node_id='b').content_hash, untouched.content_hash)
+
+        mirror.mark_stale(1801)
+        with override_settings(STORY_MIRROR_ENABLED=True):
+            self.assertIsNone(mirror.mirrored_story(1801))
+
+
+    @patch('gameplay.services.fetch_story_details')
+    def test_upstream_errors_leave_the_mirror_alone(self, mock_details):
+        mock_details.return_value = self.details
+        with patch('gameplay.services.fetch_stories', return_value=[self.summary]):
+            mirror.sync_all()
+
+        mock_details.return_value = {**self.summary, 'start_node_id': 'a'}
+        with patch('gameplay.services.upstream.get', return_value=Mock(status_code=502)):
+            self.assertIsNone(mirror.sync_all())
+            self.assertEqual(mirror.sync_story(1801, self.summary), 'failed')
+        self.assertEqual(sorted(MirroredNode.objects.values_list('node_id', flat=True)), ['a', 'b'])
+
+class ContentChangedWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('content_changed_webhook')
+
+    def _post(self, payload, timestamp=None, key=None):
+        body = json.dumps(payload).encode()
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        return self.client.post(
+            self.url,
+            data=body,
+            content_type='application/json',
+            HTTP_X_WEBHOOK_TIMESTAMP=str(timestamp),
+            HTTP_X_WEBHOOK_SIGNATURE=sign_notification(body, timestamp, key=key),
+        )
+
+    def test_signed_batch_bumps_versions_once(self):
+        story_before = story_version(5)
+        node_before = node_version(5, 'n1')
+        other_node_before = node_version(5, 'n2')
+        catalog_before = catalog_version()
+        payload = {'id': 'delivery-1', 'changes': [
+            {'type': 'node', 'story_id': 5, 'id': 'n1', 'version': 3},
+            {'type': 'choice', 'story_id': 5, 'id': 9, 'node_id': 'n2', 'version': 1},
+        ]}
+
+        response = self._post(payload)
+        self.assertEqual(response.json(), {'duplicate': False, 'applied': 2, 'skipped': 0})
+        self.assertNotEqual(story_version(5), story_before)
+        self.assertNotEqual(node_version(5, 'n1'), node_before)
+        self.assertNotEqual(node_version(5, 'n2'), other_node_before)
+        self.assertEqual(catalog_version(), catalog_before)
+
+        bumped = story_version(5)
+        self.assertTrue(self._post(payload).json()['duplicate'])
+        # A new delivery re-sending an already applied version is skipped too.
+        response = self._post({**payload, 'id': 'delivery-2'})
+        self.assertEqual(response.json()['skipped'], 2)
+        self.assertEqual(story_version(5), bumped)
+
+    def test_choice_on_unknown_page_retires_every_node_of_story(self):
+        node_before = node_version(7, 'n1')
+        other_story_node_before = node_version(8, 'n1')
+        self._post({'id': 'd', 'changes': [{'type': 'choice', 'story_id': 7, 'id': 31, 'version': 1}]})
+        self.assertNotEqual(node_version(7, 'n1'), node_before)
+        self.assertEqual(node_version(8, 'n1'), other_story_node_before)
+
+    def test_failed_delivery_can_be_retried(self):
+        payload = {'id': 'retried', 'changes': [{'type': 'node', 'story_id': 5, 'id': 'n1', 'version': 4}]}
+        with patch('gameplay.invalidation.bump_story_version', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._post(payload)
+        self.assertEqual(self._post(payload).json(), {'duplicate': False, 'applied': 1, 'skipped': 0})
+
+    def test_story_change_refreshes_catalog(self):
+        catalog_before = catalog_version()
+        self._post({'id': 'd', 'changes': [{'type': 'story', 'story_id': 6, 'version': 2}]})
+        self.assertNotEqual(catalog_version(), catalog_before)
+
+    def test_rejects_bad_signature_and_old_timestamp(self):
+        story_before = story_version(5)
+        payload = {'id': 'd', 'changes': [{'type': 'story', 'story_id': 5}]}
+        self.assertEqual(self._post(payload, key='wrong-key').status_code, 401)
+        self.assertEqual(self._post(payload, timestamp=int(time.time()) - 3600).status_code, 401)
+        self.assertEqual(self._post({'id': 'd', 'changes': [{'type': 'page', 'story_id': 5}]}).status_code, 400)
+        self.assertEqual(story_version(5), story_before)
+
+
+TIERED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-tests'},
+    'tiered': {
+        'BACKEND': 'gameplay.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_MAX_ENTRIES': 2, 'L1_TTL': 60, 'NEGATIVE_TTL': 60, 'L1_TTLS': {'*:version': 0}},
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.shared = caches['shared']
+        self.tiered = caches['tiered']
+        self.tiered.clear()
+
+    def test_reads_are_served_locally_per_namespace(self):
+        self.shared.set('node:1', {'text': 'old'})
+        self.shared.set('story:1:version', 1)
+        self.assertEqual(self.tiered.get('node:1'), {'text': 'old'})
+        self.assertEqual(self.tiered.get('story:1:version'), 1)
+
+        self.shared.set('node:1', {'text': 'new'})
+        self.shared.set('story:1:version', 2)
+        self.assertEqual(self.tiered.get('node:1'), {'text': 'old'})
+        self.assertEqual(self.tiered.get('story:1:version'), 2)
+
+        # Callers get their own copy of a locally held value.
+        self.tiered.get('node:1')['text'] = 'mutated'
+        self.assertEqual(self.tiered.get('node:1'), {'text': 'old'})
+
+    def test_misses_are_remembered_until_written_through(self):
+        self.assertIsNone(self.tiered.get('node:2'))
+        self.shared.set('node:2', 'elsewhere')
+        self.assertEqual(self.tiered.get_many(['node:2']), {})
+
+        self.assertFalse(self.tiered.add('node:2', 'mine'))
+        self.assertEqual(self.tiered.get('node:2'), 'elsewhere')
+        self.tiered.set('node:3', 'written')
+        self.assertEqual(self.shared.get('node:3'), 'written')
+
+    def test_local_tier_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.tiered.set(key, key)
+        self.shared.set('a', 'changed')
+        self.assertEqual(self.tiered.get('a'), 'changed')
+        self.assertEqual(self.tiered.get('c'), 'c')
+
+    def test_worker_sees_story_index_patched_by_another_worker(self):
+        worker_a = self.tiered
+        worker_b = TieredCache('shared', TIERED_CACHES['tiered'])
+        # Separate processes: each worker has its own local tier in front of the one shared cache.
+        worker_b._l1 = OrderedDict()
+        worker_b._lock = threading.Lock()
+        story = {'id': 1801, 'pages': [{'id': 'a', 'title': 'Old', 'choices': []}]}
+        load_story = Mock(return_value=story)
+
+        with patch.object(content_cache, 'cache', worker_a):
+            previous = story_version(1801)
+            cached_story_index(1801, load_story)
+        with patch.object(content_cache, 'cache', worker_b):
+            self.assertEqual(cached_story_index(1801, load_story).page('a')['title'], 'Old')
+
+        def retitle(index):
+            index.page('a')['title'] = 'New'
+            return True
+
+        with patch.object(content_cache, 'cache', worker_a):
+            new = bump_story_version(1801)
+            patch_cached_story_index(1801, previous, new, retitle)
+        with patch.object(content_cache, 'cache', worker_b):
+            self.assertEqual(cached_story_index(1801, load_story).page('a')['title'], 'New')
+        self.assertEqual(load_story.call_count, 1)
+
+    def test_upstream_down_flag_cleared_by_one_worker_is_seen_by_another(self):
+        params = {'OPTIONS': dict(TIERED_CACHES['tiered']['OPTIONS'], L1_TTLS=settings.CACHE_L1_TTLS)}
+        worker_a, worker_b = TieredCache('shared', params), TieredCache('shared', params)
+        worker_b._l1 = OrderedDict()
+        worker_b._lock = threading.Lock()
+
+        worker_a.set(content_cache.UPSTREAM_DOWN_KEY, 1, content_cache.UPSTREAM_RETRY_AFTER)
+        self.assertEqual(worker_b.get(content_cache.UPSTREAM_DOWN_KEY), 1)
+        worker_a.delete(content_cache.UPSTREAM_DOWN_KEY)
+        self.assertIsNone(worker_b.get(content_cache.UPSTREAM_DOWN_KEY))
+
+    def test_parse_cache_url(self):
+        self.assertEqual(parse_cache_url('redis://:secret@cache:6379/1'), {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://:secret@cache:6379/1',
+        })
+        self.assertEqual(parse_cache_url('db://story_cache?timeout=600'), {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'story_cache',
+            'TIMEOUT': 600,
+        })
+        self.assertEqual(parse_cache_url('file:///var/tmp/nahb')['LOCATION'], '/var/tmp/nahb')
+        with self.assertRaises(ValueError):
+            parse_cache_url('memcache://localhost')
+
+
+class NodeRecordTests(TestCase):
+    def _node(self):
+        return json.loads(json.dumps({
+            'id': 'cave', 'text': 'Dark', 'illustration_url': None,
+            'dialogue': [{'speaker': 'Guide', 'text': 'Hi'}],
+            'choices': [
+                {'id': 1, 'label': 'Left', 'next_page_id': 'left', 'roll_sides': None},
+                {'id': 2, 'label': 'Right', 'next_page_id': 'right', 'roll_sides': None},
+            ],
+        }))
+
+    def test_records_read_like_the_upstream_node(self):
+        node = compact_node(self._node())
+        self.assertEqual(node['text'], 'Dark')
+        self.assertNotIn('illustration_url', node)
+        self.assertIsNone(node.get('illustration_url'))
+        self.assertEqual(_find_choice_in_node(node, '2')['next_page_id'], 'right')
+        self.assertEqual(node_targets(node), ['left', 'right'])
+        self.assertIs(node['choices'][0]._keys, node['choices'][1]._keys)
+        self.assertIs(node['choices'][0]._positions, node['choices'][1]._positions)
+        self.assertIs(node['dialogue'][0]['speaker'], compact_node(self._node())['dialogue'][0]['speaker'])
+
+        restored = pickle.loads(pickle.dumps(node))
+        self.assertIs(restored['choices'][0]._keys, node['choices'][0]._keys)
+        self.assertEqual(node_dict(restored), {
+            'id': 'cave', 'text': 'Dark',
+            'dialogue': [{'speaker': 'Guide', 'text': 'Hi'}],
+            'choices': [
+                {'id': 1, 'label': 'Left', 'next_page_id': 'left'},
+                {'id': 2, 'label': 'Right', 'next_page_id': 'right'},
+            ],
+        })
+
+    def test_player_name_is_injected_into_a_copy(self):
+        node = compact_node({'id': 'n', 'text': 'Hello {player_name}', 'dialogue': [{'speaker': 'user', 'text': 'Me'}]})
+        rendered = _inject_player_name(node, 'Ada')
+        self.assertEqual(rendered['text'], 'Hello Ada')
+        self.assertEqual(rendered['dialogue'][0]['speaker'], 'Ada')
+        self.assertEqual(node['text'], 'Hello {player_name}')
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_value_is_served_while_one_refresh_runs(self):
+        values = iter(['first', 'second'])
+        load = Mock(side_effect=lambda: next(values))
+        self.assertEqual(stale_while_revalidate('content:test:swr', load, 1, 'content:test:bumped', soft_ttl=0), 'first')
+
+        futures = []
+        real_submit = content_cache._REFRESH_POOL.submit
+        with patch.object(content_cache._REFRESH_POOL, 'submit', side_effect=lambda *args: futures.append(real_submit(*args))):
+            self.assertEqual(stale_while_revalidate('content:test:swr', load, 1, 'content:test:bumped', soft_ttl=0), 'first')
+            self.assertEqual(stale_while_revalidate('content:test:swr', load, 1, 'content:test:bumped', soft_ttl=0), 'first')
+        wait(futures)
+
+        self.assertEqual(len(futures), 1)
+        self.assertEqual(cache.get('content:test:swr')['value'], 'second')
+        self.assertEqual(load.call_count, 2)
+
+    def test_expired_version_is_served_stale_but_bumped_version_is_loaded(self):
+        load = Mock(return_value={'title': 'First'})
+        self.assertEqual(cached_story_details(1903, load), {'title': 'First'})
+
+        load.return_value = {'title': 'Second'}
+        # The version key timing out (e.g. while the site sat idle) isn't a change.
+        cache.delete(content_cache._story_version_key(1903))
+        with patch.object(content_cache._REFRESH_POOL, 'submit') as submit:
+            self.assertEqual(cached_story_details(1903, load), {'title': 'First'})
+        self.assertTrue(submit.called)
+        self.assertEqual(load.call_count, 1)
+
+        bump_story_version(1903)
+        self.assertEqual(cached_story_details(1903, load), {'title': 'Second'})
+        self.assertEqual(load.call_count, 2)
+
+        # A bump whose version expired before anyone read it is still a change.
+        load.return_value = {'title': 'Third'}
+        bump_story_version(1903)
+        cache.delete(content_cache._story_version_key(1903))
+        self.assertEqual(cached_story_details(1903, load), {'title': 'Third'})
+        self.assertEqual(load.call_count, 3)
+
+    @patch('gameplay.views.get_stories')
+    def test_story_list_survives_upstream_outage(self, mock_get_stories):
+        mock_get_stories.return_value = [{'id': 1901, 'title': 'Still here', 'description': ''}]
+        self.assertContains(self.client.get(reverse('story_list')), 'Still here')
+
+        mock_get_stories.return_value = None
+        bump_catalog_version()
+        self.assertContains(self.client.get(reverse('story_list')), 'Still here')
+
+        cache.clear()
+        self.assertTemplateUsed(self.client.get(reverse('story_list')), 'gameplay/waking_up.html')
+
+    @patch('gameplay.views.get_story_details', return_value={'status': 'published'})
+    @patch('gameplay.views.get_node')
+    def test_play_page_is_served_from_last_good_node(self, mock_get_node, _mock_details):
+        mock_get_node.return_value = {'id': 'n', 'text': 'Remembered text', 'choices': []}
+        url = reverse('play_node', kwargs={'story_id': 1902, 'node_id': 'n'})
+        self.assertContains(self.client.get(url), 'Remembered text')
+
+        mock_get_node.return_value = None
+        bump_story_version(1902, node_ids=['n'])
+        self.assertContains(self.client.get(url), 'Remembered text')
+        # Upstream just failed, so the next changed version is served stale without waiting on it.
+        bump_story_version(1902, node_ids=['n'])
+        calls = mock_get_node.call_count
+        with patch.object(content_cache._REFRESH_POOL, 'submit') as submit:
+            self.assertContains(self.client.get(url), 'Remembered text')
+        self.assertEqual(mock_get_node.call_count, calls)
+        self.assertTrue(submit.called)
+
+
+class KeepWarmTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('gameplay.keepwarm.requests.get')
+    def test_pings_record_warm_and_cold_state(self, mock_get):
+        mock_get.return_value = Mock(status_code=200)
+        cache.set(content_cache.UPSTREAM_DOWN_KEY, 1)
+        self.assertTrue(keepwarm.ping_upstream())
+        self.assertEqual(keepwarm.upstream_status()['state'], 'warm')
+        self.assertIsNone(cache.get(content_cache.UPSTREAM_DOWN_KEY))
+
+        mock_get.side_effect = requests.ConnectionError
+        self.assertFalse(keepwarm.ping_upstream())
+        status = self.client.get(reverse('upstream_status')).json()
+        self.assertEqual(status['state'], 'cold')
+        self.assertIsNotNone(status['median_latency_ms'])
+        self.assertEqual(cache.get(content_cache.UPSTREAM_DOWN_KEY), 1)
+
+    @patch('gameplay.keepwarm.requests.get', return_value=Mock(status_code=200))
+    @patch('gameplay.views.get_stories', return_value=None)
+    def test_failed_page_read_reports_cold_despite_warm_ping(self, _mock_get_stories, mock_get):
+        keepwarm.ping_upstream()
+        self.assertIn('X-API-KEY', mock_get.call_args.kwargs['headers'])
+        self.assertEqual(keepwarm.upstream_status()['state'], 'warm')
+
+        self.assertTemplateUsed(self.client.get(reverse('story_list')), 'gameplay/waking_up.html')
+        with patch.object(keepwarm._PROBE_POOL, 'submit'):
+            self.assertEqual(self.client.get(reverse('upstream_status')).json()['state'], 'cold')
+
+    @patch('gameplay.keepwarm.ping_upstream')
+    def test_one_worker_pings_per_interval(self, mock_ping):
+        for _worker in range(3):
+            stop = Mock()
+            stop.wait.side_effect = [False, True]
+            keepwarm._keep_warm_loop(stop)
+        self.assertEqual(mock_ping.call_count, 1)
+
+    def test_status_polls_probe_a_cold_upstream_once(self):
+        with patch.object(keepwarm._PROBE_POOL, 'submit') as submit:
+            for _poll in range(3):
+                response = self.client.get(reverse('upstream_status'))
+                self.assertEqual(response.json(), {'state': 'unknown'})
+        self.assertEqual(submit.call_count, 1)
+        self.assertIn('no-store', response.headers['Cache-Control'])
+
+
+class UpstreamClientTests(TestCase):
+    def _tracker(self, *samples):
+        tracker = LatencyTracker()
+        for seconds in samples:
+            tracker.record(seconds)
+        return tracker
+
+    def test_timeouts_follow_latency_within_bounds(self):
+        self.assertEqual(self._tracker(0.1).timeout(), upstream.REQUEST_TIMEOUT)
+        self.assertEqual(self._tracker(*[0.1] * 50).timeout(), upstream.UPSTREAM_TIMEOUT_FLOOR)
+        self.assertAlmostEqual(self._tracker(*[0.1] * 49, 2.0).timeout(), 6.0)
+        self.assertEqual(self._tracker(*[30.0] * 50).timeout(), upstream.REQUEST_TIMEOUT)
+
+    def test_retry_budget_limits_retries(self):
+        budget = RetryBudget(ratio=0.5, burst=2)
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+    @patch('gameplay.upstream.requests.request')
+    def test_reads_are_retried_while_budget_allows(self, mock_request):
+        mock_request.side_effect = [requests.ConnectionError(), Mock(status_code=200)]
+        with patch.object(upstream, 'retry_budget', RetryBudget(ratio=0, burst=1)):
+            self.assertEqual(upstream.get('test_retry', 'http://flask/api/x').status_code, 200)
+            mock_request.side_effect = [requests.ConnectionError()]
+            with self.assertRaises(requests.ConnectionError):
+                upstream.get('test_retry', 'http://flask/api/x')
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('gameplay.upstream.requests.request')
+    def test_slow_reads_are_hedged(self, mock_request):
+        responses = iter([Mock(status_code=200, name='slow'), Mock(status_code=200, name='fast')])
+
+        def respond(*args, **kwargs):
+            response = next(responses)
+            if response._mock_name == 'slow':
+                time.sleep(0.5)
+            return response
+
+        mock_request.side_effect = respond
+        tracker = upstream.tracker('test_hedge')
+        for _ in range(upstream.MIN_SAMPLES):
+            tracker.record(0.05)
+        with patch.object(upstream, 'UPSTREAM_HEDGING_ENABLED', True), \
+                patch.object(upstream, 'retry_budget', RetryBudget(ratio=0, burst=1)):
+            response = upstream.get('test_hedge', 'http://flask/api/x', hedge=True)
+        self.assertEqual(response._mock_name, 'fast')
+        self.assertEqual(mock_request.call_count, 2)
+
+
+@patch.dict(admission.ADMISSION_LIMITS, {'play': 1})
+@patch.object(admission, 'ADMISSION_QUEUE_TIMEOUT', 0.05)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _take_all_play_slots(self):
+        cache.add(admission._slot_key('play', 0), 'another-request', 30)
+
+    @patch('gameplay.upstream.requests.request', return_value=Mock(status_code=200))
+    def test_calls_over_the_limit_get_a_quick_503(self, mock_request):
+        read = admission.admission_class('play')(lambda request: upstream.get('test_admission', 'http://flask/api/x'))
+        self.assertEqual(read(None).status_code, 200)
+        self.assertIsNone(cache.get(admission._slot_key('play', 0)))
+
+        self._take_all_play_slots()
+        response = read(None)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(admission.BUSY_RETRY_AFTER))
+        # Background work outside a classified view isn't held back.
+        self.assertEqual(upstream.get('test_admission', 'http://flask/api/x').status_code, 200)
+        self.assertEqual(mock_request.call_count, 2)
+
+    @patch('gameplay.views.get_stories')
+    def test_busy_story_list_falls_back_to_cached_copy(self, mock_get_stories):
+        mock_get_stories.return_value = [{'id': 1951, 'title': 'Cached list', 'description': ''}]
+        self.assertContains(self.client.get(reverse('story_list')), 'Cached list')
+
+        mock_get_stories.side_effect = UpstreamBusy('play')
+        bump_catalog_version()
+        self.assertContains(self.client.get(reverse('story_list')), 'Cached list')
+
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('story_list')).status_code, 503)
+
+    def test_database_only_views_are_not_limited(self):
+        self._take_all_play_slots()
+        self.assertEqual(self.client.get(reverse('signup')).status_code, 200)
+
+
+@override_settings(NODE_PREFETCH_ENABLED=False)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_over_time(self):
+        self.assertEqual(ratelimit.take_token('ratelimit:test', 1.0, 2), 0)
+        self.assertEqual(ratelimit.take_token('ratelimit:test', 1.0, 2), 0)
+        self.assertEqual(ratelimit.take_token('ratelimit:test', 1.0, 2), 1)
+        tokens, updated = cache.get('ratelimit:test')
+        cache.set('ratelimit:test', (tokens, updated - 1))
+        self.assertEqual(ratelimit.take_token('ratelimit:test', 1.0, 2), 0)
+
+    @patch.dict(ratelimit.RATE_LIMITS, {'choose_choice': {'rate': 0.01, 'burst': 2}})
+    @patch('gameplay.views.get_node', return_value=None)
+    def test_choice_reposts_get_429_per_client(self, _mock_get_node):
+        url = reverse('choose_choice', kwargs={'story_id': 1961, 'node_id': 'n'})
+        self.assertNotEqual(self.client.post(url).status_code, 429)
+        self.assertNotEqual(self.client.post(url).status_code, 429)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '100')
+
+        user = User.objects.create_user(username='rate_limited_reader', password='pw12345')
+        self.client.force_login(user)
+        self.assertNotEqual(self.client.post(url).status_code, 429)
+
+    @patch.dict(ratelimit.RATE_LIMITS, {'story_list': {'rate': 0.01, 'burst': 2}})
+    @patch.object(ratelimit, 'RATE_LIMIT_BEHIND_PROXY', True)
+    @patch('gameplay.views.get_stories', return_value=[])
+    def test_anonymous_clients_behind_one_proxy_have_their_own_buckets(self, _mock_get_stories):
+        url = reverse('story_list')
+        proxy = {'REMOTE_ADDR': '10.0.0.1'}
+        scripted = self.client_class()
+        for _ in range(2):
+            self.assertEqual(scripted.get(url, HTTP_X_FORWARDED_FOR='198.51.100.1', **proxy).status_code, 200)
+            scripted.cookies.clear()
+        self.assertEqual(scripted.get(url, HTTP_X_FORWARDED_FOR='198.51.100.1', **proxy).status_code, 429)
+
+        visitor = self.client_class()
+        self.assertEqual(visitor.get(url, HTTP_X_FORWARDED_FOR='203.0.113.9', **proxy).status_code, 200)
+
+    @patch.dict(ratelimit.RATE_LIMITS, {'choose_choice': {'rate': 0.01, 'burst': 2, 'ip_rate': 0.01, 'ip_burst': 3}})
+    @patch('gameplay.views.get_stories', return_value=[])
+    @patch('gameplay.views.get_node', return_value=None)
+    def test_rotating_sessions_still_hits_the_ip_limit(self, _mock_get_node, _mock_get_stories):
+        url = reverse('choose_choice', kwargs={'story_id': 1962, 'node_id': 'n'})
+        statuses = []
+        for _ in range(4):
+            # Each fresh client picks up a new session (and so a new client bucket) from the story list.
+            rotating = self.client_class()
+            rotating.get(reverse('story_list'))
+            statuses.append(rotating.post(url).status_code)
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3], 429)
+
+    def test_client_ip_comes_from_proxy_when_configured(self):
+        request = Mock(META={'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 203.0.113.7'})
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+        with patch.object(ratelimit, 'RATE_LIMIT_BEHIND_PROXY', True):
+            self.assertEqual(ratelimit.client_ip(request), '203.0.113.7')
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+import requests
+from django.conf import settings
+
+from .admission import UpstreamBusy, upstream_slot
+
+# Static timeout used until an endpoint has enough samples, and the ceiling afterwards.
+REQUEST_TIMEOUT = getattr(settings, "FLASK_REQUEST_TIMEOUT", 10)
+UPSTREAM_TIMEOUT_FLOOR = getattr(settings, "UPSTREAM_TIMEOUT_FLOOR", 1.0)
+UPSTREAM_TIMEOUT_MULTIPLIER = 3
+UPSTREAM_RETRY_RATIO = getattr(settings, "UPSTREAM_RETRY_RATIO", 0.1)
+UPSTREAM_RETRY_BURST = getattr(settings, "UPSTREAM_RETRY_BURST", 10)
+UPSTREAM_HEDGING_ENABLED = getattr(settings, "UPSTREAM_HEDGING_ENABLED", False)
+LATENCY_SAMPLES = 200
+MIN_SAMPLES = 20
+
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream-hedge')
+
+
+class LatencyTracker:
+    """Recent latencies of one endpoint in this process. Timed-out calls count as the timeout."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self):
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return REQUEST_TIMEOUT
+        return min(REQUEST_TIMEOUT, max(UPSTREAM_TIMEOUT_FLOOR, p99 * UPSTREAM_TIMEOUT_MULTIPLIER))
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every read: each first attempt adds `ratio` tokens (up to `burst`), each
+    retry or hedge spends one. Retries stay a small fraction of traffic, so a failing upstream
+    doesn't get a retry storm on top of its normal load.
+    """
+
+    def __init__(self, ratio=UPSTREAM_RETRY_RATIO, burst=UPSTREAM_RETRY_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+retry_budget = RetryBudget()
+
+
+def tracker(endpoint):
+    with _trackers_lock:
+        return _trackers.setdefault(endpoint, LatencyTracker())
+
+
+def _timed(endpoint, method, url, kwargs):
+    endpoint_tracker = tracker(endpoint)
+    timeout = endpoint_tracker.timeout()
+    with upstream_slot():
+        started = time.monotonic()
+        try:
+            response = requests.request(method, url, timeout=timeout, **kwargs)
+        except requests.Timeout:
+            endpoint_tracker.record(timeout)
+            raise
+    endpoint_tracker.record(time.monotonic() - started)
+    return response
+
+
+def _retryable(response):
+    return response.status_code >= 500
+
+
+def _hedged(endpoint, url, kwargs):
+    """Starts a second identical read if the first is still running after the endpoint's p95."""
+    delay = tracker(endpoint).percentile(0.95)
+    # Both reads run in the caller's context, so they count against its admission class.
+    primary = _HEDGE_POOL.submit(copy_context().run, _timed, endpoint, 'GET', url, kwargs)
+    if delay is None:
+        return primary.result()
+    done, _ = wait([primary], timeout=delay)
+    if done or not retry_budget.withdraw():
+        return primary.result()
+
+    pending = {primary, _HEDGE_POOL.submit(copy_context().run, _timed, endpoint, 'GET', url, kwargs)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except (requests.RequestException, UpstreamBusy) as exc:
+                error = exc
+    raise error
+
+
+def request(endpoint, method, url, **kwargs):
+    """
+    requests.request() with a timeout adapted to the endpoint's recent latency, inside an
+    admission slot (see admission.upstream_slot). Not retried; use for writes.
+    """
+    return _timed(endpoint, method, url, kwargs)
+
+
+def get(endpoint, url, hedge=False, **kwargs):
+    """
+    An idempotent read with an adaptive timeout, retried once on connection errors, timeouts and
+    5xx responses while the retry budget allows. With hedge (and UPSTREAM_HEDGING_ENABLED) a
+    slow read is raced against a second one.
+    """
+    retry_budget.deposit()
+    try:
+        if hedge and UPSTREAM_HEDGING_ENABLED:
+            response = _hedged(endpoint, url, kwargs)
+        else:
+            response = _timed(endpoint, 'GET', url, kwargs)
+    except requests.RequestException:
+        if not retry_budget.withdraw():
+            raise
+        return _timed(endpoint, 'GET', url, kwargs)
+    if _retryable(response) and retry_budget.withdraw():
+        return _timed(endpoint, 'GET', url, kwargs)
+    return response
@@ -1,25 +1,57 @@
+import gzip
+import hashlib
 import logging
 import random
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from copy import deepcopy
+from datetime import datetime, timedelta, timezone as dt_timezone
 from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.db import connection
 from django.utils import timezone
-from .models import Play, PlaySession, StoryOwnership, StoryRatingComment, StoryReport
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from .models import Play, PlaySession, StoryOwnership, StoryRatingComment, StoryRatingSummary, StoryReport
+from .content_cache import (
+    bump_catalog_version, bump_story_version, cached_node, cached_story_details, cached_story_index,
+    cached_story_list, catalog_version, node_version, patch_cached_story_index, remember_story_shape, story_embeds_pages, story_version, story_versions
+)
+from .graph import (
+    GRAPH_INLINE_NODE_LIMIT, GRAPH_MAX_HOPS, GRAPH_PAGE_NODE_LIMIT, apply_choice, apply_page,
+    apply_story_fields, cached_graph, choice_target, graph_wire, issue_nodes, neighborhood,
+    patch_cached_graph, publish_issues, remove_choice, remove_page
+)
+from .admission import admission_class
+from .bundles import build_story_bundle, cached_bundle, is_ending_page
+from .choice_tokens import read_choice_token, sign_choice
+from .invalidation import (
+    InvalidNotification, apply_changes, claim_delivery, parse_notification, release_delivery, verify_notification,
+)
+from .keepwarm import probe_if_cold, upstream_status
+from .mirror import forget_story, mark_stale, mirror_enabled, resync_story_quietly
+from .nodes import node_dict
+from .prefetch import prefetch_targets
+from .ratelimit import rate_limited
 from .forms import StoryRatingCommentForm, StoryReportForm, StoryReportModerationForm
 from .services import (
     get_stories, get_story_start, get_node, get_story_details,
     create_story, update_story, delete_story, create_page, create_choice,
     update_page, delete_page, update_choice, delete_choice, get_story_nodes
 )
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, Max, Q
 
 logger = logging.getLogger(__name__)
 VALID_STORY_STATUSES = {'draft', 'published', 'suspended'}
@@ -31,6 +63,14 @@ PLAYER_NAME_PLACEHOLDERS = (
     '<player_name>',
 )
 PLAYER_SPEAKER_ALIASES = {'user', 'jin', '진'}
+COMMENTS_PAGE_SIZE = 10
+# Remembers reported offline playthroughs so a retried ending report is only counted once.
+PLAYTHROUGH_DEDUP_TTL = 86400
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600)
+COMMENT_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# How long a browser may keep a page it prefetched from a choice hint before it must ask again.
+PREFETCH_MAX_AGE = 300
+_UPSTREAM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream')
 
 
 def _current_story_source():
@@ -89,7 +129,7 @@ def _speaker_is_player_alias(value):
 
 
 def _inject_player_name(node_data, player_name):
-    rendered = deepcopy(node_data)
+    rendered = node_dict(node_data)
 
     for text_key in ('title', 'text', 'ending_label', 'outcome'):
         rendered[text_key] = _replace_player_name_tokens(rendered.get(text_key), player_name)
@@ -130,6 +170,124 @@ def _inject_player_name(node_data, player_name):
     return rendered
 
 
+def _rating_summary_map(source):
+    summaries = StoryRatingSummary.objects.filter(story_source=source, rating_count__gt=0)
+    return {summary.story_id: summary for summary in summaries}
+
+
+def _comment_cursor(comment):
+    micros = (comment.created_at - COMMENT_CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{comment.id}"
+
+
+def _parse_comment_cursor(raw_cursor):
+    try:
+        micros, comment_id = (int(part) for part in raw_cursor.split('-', 1))
+        return COMMENT_CURSOR_EPOCH + timedelta(microseconds=micros), comment_id
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def _story_comments_page(source, story_id, before=None):
+    """Returns one newest-first page of comments and the cursor for the next (older) page."""
+    comments = StoryRatingComment.objects.filter(story_source=source, story_id=story_id)
+    if before:
+        created_at, comment_id = before
+        comments = comments.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=comment_id))
+
+    page = list(comments.select_related('user').order_by('-created_at', '-id')[:COMMENTS_PAGE_SIZE + 1])
+    next_cursor = ''
+    if len(page) > COMMENTS_PAGE_SIZE:
+        page = page[:COMMENTS_PAGE_SIZE]
+        next_cursor = _comment_cursor(page[-1])
+    return page, next_cursor
+
+
+def _http_validators(*parts, modified_at):
+    """Builds an (ETag, Last-Modified timestamp) pair from cheap version/DB state."""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return quote_etag(digest), int(modified_at)
+
+
+def _not_modified(request, validators):
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _finalize_cacheable(request, response, validators=None, max_age=None):
+    """Adds validators and the Cache-Control policy for pages that vary per reader."""
+    if validators is not None and response.status_code in (200, 304):
+        etag, last_modified = validators
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if max_age is not None:
+        patch_cache_control(response, private=True, max_age=max_age)
+    elif request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _is_prefetch_request(request):
+    """True for browser prefetches (link hints / speculation rules), which must not count as a visit."""
+    purpose = request.headers.get('Sec-Purpose') or request.headers.get('Purpose') or request.headers.get('X-Moz') or ''
+    return 'prefetch' in purpose.lower()
+
+
+def _next_url(story_id, choice):
+    """Play URL of a choice's destination if it is known before the click (dice rolls are decided server-side)."""
+    target = choice_target(choice)
+    if target and not choice.get('requires_roll'):
+        return reverse('play_node', kwargs={'story_id': story_id, 'node_id': str(target)})
+    return None
+
+
+def _prefetch_urls(story_id, choices):
+    urls = []
+    for choice in choices or []:
+        url = _next_url(story_id, choice)
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def _has_pending_messages(request):
+    return len(messages.get_messages(request)) > 0
+
+
+def _story_list_validators(request, session_key, search_query):
+    if _has_pending_messages(request):
+        # Flash messages (e.g. "Report submitted") are part of the page, so it must be re-rendered.
+        return None
+    catalog = catalog_version()
+    resume_state = PlaySession.objects.filter(session_key=session_key).aggregate(
+        count=Count('id'),
+        updated_at=Max('updated_at'),
+    )
+    rating_state = StoryRatingSummary.objects.filter(story_source=_current_story_source()).aggregate(
+        count=Count('id'),
+        updated_at=Max('updated_at'),
+    )
+    modified_at = max(
+        catalog / 1e9,
+        resume_state['updated_at'].timestamp() if resume_state['updated_at'] else 0,
+        rating_state['updated_at'].timestamp() if rating_state['updated_at'] else 0,
+    )
+    return _http_validators(
+        'story_list', catalog, search_query,
+        resume_state['count'], resume_state['updated_at'],
+        rating_state['count'], rating_state['updated_at'],
+        request.user.pk, request.user.is_staff,
+        modified_at=modified_at,
+    )
+
+
+@rate_limited('story_list')
+@admission_class('play')
 def story_list(request):
     """Public Reader View: Only shows published stories."""
     search_query = request.GET.get('search', '')
@@ -137,7 +295,17 @@ def story_list(request):
     # Strictly enforce published status for public list
     params = {'status': 'published'}
 
-    stories = get_stories(params=params)
+    if not request.session.session_key:
+        request.session.create()
+    session_key = request.session.session_key
+
+    validators = _story_list_validators(request, session_key, search_query)
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return _finalize_cacheable(request, not_modified, validators)
+
+    # Only a cold cache with upstream asleep leaves nothing to show.
+    stories = cached_story_list(params, lambda: get_stories(params=params))
 
     if stories is None:
         return render(request, 'gameplay/waking_up.html')
@@ -150,32 +318,37 @@ def story_list(request):
                or query in s.get('description', '').lower()
         ]
 
-    if not request.session.session_key:
-        request.session.create()
-    session_key = request.session.session_key
-
     active_sessions = PlaySession.objects.filter(session_key=session_key).values_list('story_id', 'current_node_id')
     resume_map = {story_id: node_id for story_id, node_id in active_sessions}
 
     # Add average ratings
-    source = _current_story_source()
-    rating_stats = StoryRatingComment.objects.filter(story_source=source).values('story_id').annotate(
-        avg_rating=Avg('rating'),
-        count=Count('id'),
-    )
-    rating_map = {item['story_id']: item for item in rating_stats}
+    rating_map = _rating_summary_map(_current_story_source())
+
+    versions = story_versions([story['id'] for story in stories])
 
     for story in stories:
         story['resume_node'] = resume_map.get(story['id'])
-        stats = rating_map.get(story['id'], {'avg_rating': 0, 'count': 0})
-        story['avg_rating'] = round(stats['avg_rating'], 1) if stats['avg_rating'] else 0
-        story['rating_count'] = stats['count']
+        story['content_version'] = versions[story['id']]
+        summary = rating_map.get(story['id'])
+        story['avg_rating'] = summary.avg_rating if summary else 0
+        story['rating_count'] = summary.rating_count if summary else 0
 
-    return render(request, 'gameplay/story_list.html', {
+    response = render(request, 'gameplay/story_list.html', {
         'stories': stories,
         'search_query': search_query,
-        'view_mode': 'reader'
+        'view_mode': 'reader',
+        'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT,
     })
+    return _finalize_cacheable(request, response, validators)
+
+
+def upstream_status_view(request):
+    """Small JSON status of the Flask API, polled by the waking-up page. Polls of a cold API trigger a check."""
+    status = upstream_status()
+    probe_if_cold(status)
+    response = JsonResponse(status)
+    patch_cache_control(response, no_store=True)
+    return response
 
 
 def signup(request):
@@ -192,6 +365,7 @@ def signup(request):
 
 
 @login_required
+@admission_class('authoring')
 def author_dashboard(request):
     """Author View: Shows all stories including drafts. Admins see everything, authors see their own."""
     search_query = request.GET.get('search', '')
@@ -201,7 +375,7 @@ def author_dashboard(request):
     if status_filter:
         params['status'] = status_filter
 
-    stories = get_stories(params=params)
+    stories = cached_story_list(params, lambda: get_stories(params=params))
 
     if stories is None:
         return render(request, 'gameplay/waking_up.html')
@@ -220,26 +394,26 @@ def author_dashboard(request):
         ]
 
     # Add average ratings
-    source = _current_story_source()
-    rating_stats = StoryRatingComment.objects.filter(story_source=source).values('story_id').annotate(
-        avg_rating=Avg('rating'),
-        count=Count('id'),
-    )
-    rating_map = {item['story_id']: item for item in rating_stats}
+    rating_map = _rating_summary_map(_current_story_source())
+
+    versions = story_versions([story['id'] for story in stories])
 
     for story in stories:
-        stats = rating_map.get(story['id'], {'avg_rating': 0, 'count': 0})
-        story['avg_rating'] = round(stats['avg_rating'], 1) if stats['avg_rating'] else 0
-        story['rating_count'] = stats['count']
+        story['content_version'] = versions[story['id']]
+        summary = rating_map.get(story['id'])
+        story['avg_rating'] = summary.avg_rating if summary else 0
+        story['rating_count'] = summary.rating_count if summary else 0
 
     return render(request, 'gameplay/story_list.html', {
         'stories': stories,
         'search_query': search_query,
         'status_filter': status_filter,
-        'view_mode': 'author'
+        'view_mode': 'author',
+        'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT,
     })
 
 
+@admission_class('play')
 def start_story(request, story_id):
     """Finds the start node and redirects to the play view."""
     if not request.session.session_key:
@@ -251,43 +425,111 @@ def start_story(request, story_id):
         _set_player_name_for_story(request, story_id, chosen_name)
         PlaySession.objects.filter(session_key=request.session.session_key, story_id=story_id).delete()
 
+        if request.POST.get('mode') == 'offline':
+            return redirect('offline_play', story_id=story_id)
+
         start_node = get_story_start(story_id)
         if start_node:
             return redirect('play_node', story_id=story_id, node_id=start_node['id'])
         return redirect('story_list')
 
-    story = get_story_details(story_id) or {}
+    story = cached_story_details(story_id, lambda: get_story_details(story_id)) or {}
     return render(request, 'gameplay/start_story.html', {
         'story_id': story_id,
         'story_title': story.get('title', f'Story #{story_id}'),
         'initial_player_name': _player_name_for_story(request, story_id),
+        'can_play_offline': story.get('status') == 'published',
     })
 
 
+def _play_node_validators(request, story_id, node_id, player_name, fragment):
+    if request.method != 'GET' or _has_pending_messages(request):
+        # Flash messages (e.g. dice results) are part of the page, so it must be re-rendered.
+        return None
+    current_story_version = story_version(story_id)
+    current_node_version = node_version(story_id, node_id)
+    return _http_validators(
+        'play_node', story_id, node_id, current_story_version, current_node_version,
+        player_name, request.user.pk, fragment,
+        modified_at=max(current_story_version, current_node_version) / 1e9,
+    )
+
+
+def _wants_fragment(request):
+    """True when play.js asks for just the story content to swap into the current page."""
+    return request.headers.get('X-Play-Fragment') == '1'
+
+
+def _finalize_play_response(request, response, validators, max_age, play_url, fragment):
+    response = _finalize_cacheable(request, response, validators, max_age=max_age)
+    patch_vary_headers(response, ('X-Play-Fragment',))
+    if fragment:
+        response.headers['X-Play-Url'] = play_url
+    return response
+
+
+@admission_class('play')
 def play_node(request, story_id, node_id):
-    node_data = get_node(story_id, node_id)
+    return _render_play_node(request, story_id, node_id, fragment=_wants_fragment(request))
 
-    if not node_data:
-        return redirect('story_list')
+
+def _render_play_node(request, story_id, node_id, fragment=False):
+    """Renders a node as the full play page, or only its story content when fragment is set."""
     player_name = _player_name_for_story(request, story_id)
-    node_data = _inject_player_name(node_data, player_name)
+    play_url = reverse('play_node', kwargs={'story_id': story_id, 'node_id': node_id})
 
     if not request.session.session_key:
         request.session.create()
     session_key = request.session.session_key
 
+    # Prefetched pages have no side effects; choose_choice records progress when the reader actually picks one.
+    is_prefetch = _is_prefetch_request(request)
+    prefetch_max_age = PREFETCH_MAX_AGE if is_prefetch else None
+
+    validators = _play_node_validators(request, story_id, node_id, player_name, fragment)
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        # Validators are only sent for non-ending nodes, so a revisit still counts as progress.
+        if not is_prefetch:
+            PlaySession.objects.update_or_create(
+                session_key=session_key,
+                story_id=story_id,
+                defaults={'current_node_id': node_id}
+            )
+        return _finalize_play_response(request, not_modified, validators, prefetch_max_age, play_url, fragment)
+
+    # Read before fetching so a concurrent edit can only make the rendered page look stale, never fresh.
+    current_node_version = node_version(story_id, node_id)
+    raw_node = cached_node(story_id, node_id, lambda: get_node(story_id, node_id), version=current_node_version)
+
+    if not raw_node:
+        return redirect('story_list')
+    node_data = _inject_player_name(raw_node, player_name)
+    for choice in node_data.get('choices') or []:
+        if choice.get('id'):
+            choice['token'] = sign_choice(story_id, node_id, current_node_version, choice)
+            choice['next_url'] = _next_url(story_id, choice)
+
     is_actually_ending = (
             node_data.get('type') == 'ending' or
             node_data.get('is_game_over') or
             node_data.get('is_ending')
     )
 
+    if is_actually_ending and is_prefetch:
+        # Reaching an ending records a play, so endings are only served to real navigations.
+        response = HttpResponse(status=204)
+        patch_cache_control(response, no_store=True)
+        return response
+
     # Fetch story details to check status for "Preview Mode" (no stats for drafts)
-    story_details = get_story_details(story_id)
+    story_details = cached_story_details(story_id, lambda: get_story_details(story_id))
     is_preview = story_details.get('status') == 'draft' if story_details else False
 
     source = _current_story_source()
     ratings_comments = []
+    comments_next_cursor = ''
+    rating_summary = None
     user_rating_form = None
     if is_actually_ending:
         if not is_preview:
@@ -308,11 +550,9 @@ def play_node(request, story_id, node_id):
         # Clear the PlaySession regardless
         PlaySession.objects.filter(session_key=session_key, story_id=story_id).delete()
 
-        # Get ratings and comments
-        ratings_comments = StoryRatingComment.objects.filter(
-            story_source=source,
-            story_id=story_id,
-        ).order_by('-created_at')
+        # Get the rating summary and the newest page of comments; older ones load via story_comments.
+        rating_summary = StoryRatingSummary.objects.filter(story_source=source, story_id=story_id).first()
+        ratings_comments, comments_next_cursor = _story_comments_page(source, story_id)
         if request.user.is_authenticated:
             existing_rating = StoryRatingComment.objects.filter(
                 user=request.user,
@@ -323,7 +563,7 @@ def play_node(request, story_id, node_id):
                 user_rating_form = StoryRatingCommentForm(instance=existing_rating)
             else:
                 user_rating_form = StoryRatingCommentForm()
-    else:
+    elif not is_prefetch:
         # Auto-save progression
         PlaySession.objects.update_or_create(
             session_key=session_key,
@@ -331,32 +571,174 @@ def play_node(request, story_id, node_id):
             defaults={'current_node_id': node_id}
         )
 
-    return render(request, 'gameplay/play_page.html', {
+    template = 'gameplay/play_content.html' if fragment else 'gameplay/play_page.html'
+    response = render(request, template, {
         'node': node_data,
+        'play_url': play_url,
+        'node_version': current_node_version,
+        'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT,
         'story_id': story_id,
         'player_name': player_name,
         'is_ending': is_actually_ending,
         'is_preview': is_preview,
         'ratings_comments': ratings_comments,
-        'user_rating_form': user_rating_form
+        'comments_next_cursor': comments_next_cursor,
+        'rating_summary': rating_summary,
+        'user_rating_form': user_rating_form,
+        'prefetch_urls': [] if is_actually_ending else _prefetch_urls(story_id, raw_node.get('choices')),
+    })
+    if not is_actually_ending and not is_prefetch:
+        # The next request is almost certainly one of this node's targets; warm them while the reader reads.
+        prefetch_targets(story_id, raw_node, get_node)
+    # Ending pages record plays and carry rating forms, so they are always re-rendered.
+    return _finalize_play_response(
+        request, response, None if is_actually_ending else validators, prefetch_max_age, play_url, fragment
+    )
+
+
+def _published_story_index(story_id):
+    story_index = get_story_index(story_id)
+    if not story_index or story_index.field('status') != 'published':
+        return None
+    return story_index
+
+
+@admission_class('play')
+def story_bundle(request, story_id):
+    """Serves a published story as one gzip-compressed, versioned JSON bundle for the offline player."""
+    current_version = story_version(story_id)
+    validators = _http_validators('story_bundle', story_id, current_version, modified_at=current_version / 1e9)
+    response = _not_modified(request, validators)
+
+    if response is None:
+        def build():
+            story_index = _published_story_index(story_id)
+            if story_index is None:
+                return None
+            story = story_index.story
+            start_node_id = story.get('start_node_id') or (get_story_start(story_id) or {}).get('id')
+            return build_story_bundle(story, current_version, start_node_id, {
+                'placeholders': list(PLAYER_NAME_PLACEHOLDERS),
+                'speaker_aliases': sorted(PLAYER_SPEAKER_ALIASES),
+            })
+
+        body = cached_bundle(story_id, current_version, build)
+        if body is None:
+            return JsonResponse({'error': 'This story is not available for offline play.'}, status=404)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(body, content_type='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type='application/json')
+
+    # The bundle is the same for every reader, so shared caches may keep it (always revalidated).
+    etag, last_modified = validators
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    # On the 304 too, so caches keep the gzip and plain bodies apart.
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def offline_play(request, story_id):
+    """Player page that runs a story bundle in the browser, resuming saved progress."""
+    if not request.session.session_key:
+        request.session.create()
+    resume = PlaySession.objects.filter(session_key=request.session.session_key, story_id=story_id).first()
+    return render(request, 'gameplay/offline_play.html', {
+        'story_id': story_id,
+        'player_name': _player_name_for_story(request, story_id),
+        'resume_node_id': resume.current_node_id if resume else '',
     })
 
 
+@admission_class('play')
+def story_bundle_ending(request, story_id):
+    """Records the ending an offline playthrough reached. Each playthrough id is counted once."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    story_index = _published_story_index(story_id)
+    page = story_index.page(request.POST.get('ending_node_id', '')) if story_index else None
+    if page is None or not is_ending_page(page):
+        return JsonResponse({'error': 'Unknown ending.'}, status=400)
+
+    playthrough = request.POST.get('playthrough', '')[:64]
+    if not playthrough:
+        return JsonResponse({'error': 'Missing playthrough id.'}, status=400)
+    if not cache.add(f"bundle:playthrough:{story_id}:{playthrough}", 1, PLAYTHROUGH_DEDUP_TTL):
+        return JsonResponse({'recorded': False})
+
+    Play.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        story_id=story_id,
+        ending_node_id=str(page.get('id')),
+    )
+    if request.session.session_key:
+        PlaySession.objects.filter(session_key=request.session.session_key, story_id=story_id).delete()
+    return JsonResponse({'recorded': True})
+
+
+@admission_class('play')
+def story_bundle_progress(request, story_id):
+    """Saves where an offline reader is, so Resume works from the story list."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    story_index = _published_story_index(story_id)
+    node_id = request.POST.get('node_id', '')
+    if not story_index or not story_index.page(node_id):
+        return JsonResponse({'error': 'Unknown node.'}, status=400)
+
+    if not request.session.session_key:
+        request.session.create()
+    PlaySession.objects.update_or_create(
+        session_key=request.session.session_key,
+        story_id=story_id,
+        defaults={'current_node_id': node_id}
+    )
+    return HttpResponse(status=204)
+
+
+def story_comments(request, story_id):
+    """Returns an older page of ending-screen comments as an HTML fragment."""
+    before = _parse_comment_cursor(request.GET.get('before'))
+    if before is None:
+        return HttpResponseBadRequest('Invalid comment cursor.')
+
+    comments, next_cursor = _story_comments_page(_current_story_source(), story_id, before)
+    return render(request, 'gameplay/comment_items.html', {
+        'ratings_comments': comments,
+        'comments_next_cursor': next_cursor,
+    })
+
+
+@rate_limited('choose_choice')
+@admission_class('play')
 def choose_choice(request, story_id, node_id):
     if request.method != 'POST':
         return redirect('play_node', story_id=story_id, node_id=node_id)
 
-    node_data = get_node(story_id, node_id)
-    if not node_data:
-        return redirect('story_list')
-
+    selected_choice = None
     choice_id = request.POST.get('choice_id')
-    selected_choice = _find_choice_in_node(node_data, choice_id)
+    token = read_choice_token(request.POST.get('choice_token', ''), story_id, node_id)
+    if token is not None:
+        token_version, token_choice = token
+        if token_version == node_version(story_id, node_id):
+            selected_choice = token_choice
+        else:
+            # The node changed since the page was rendered: resolve the choice against fresh content.
+            choice_id = token_choice['id']
+
+    if selected_choice is None:
+        node_data = get_node(story_id, node_id)
+        if not node_data:
+            return redirect('story_list')
+        selected_choice = _find_choice_in_node(node_data, choice_id)
     if not selected_choice:
         messages.error(request, 'Selected choice is no longer available.')
         return redirect('play_node', story_id=story_id, node_id=node_id)
 
-    primary_target = _choice_target(selected_choice)
+    primary_target = choice_target(selected_choice)
     if not primary_target:
         messages.error(request, 'This choice has no valid destination.')
         return redirect('play_node', story_id=story_id, node_id=node_id)
@@ -388,7 +770,27 @@ def choose_choice(request, story_id, node_id):
     else:
         next_node_id = primary_target
 
-    return redirect('play_node', story_id=story_id, node_id=str(next_node_id))
+    next_url = reverse('play_node', kwargs={'story_id': story_id, 'node_id': str(next_node_id)})
+    fragment = _wants_fragment(request)
+    if fragment and (request.headers.get('X-Play-Prefetched') != next_url or _has_pending_messages(request)):
+        # Render the destination directly: no redirect round trip, and progress is saved while rendering.
+        return _render_play_node(request, story_id, str(next_node_id), fragment=True)
+
+    # The destination may be served from the browser's prefetch cache without reaching play_node.
+    if not request.session.session_key:
+        request.session.create()
+    PlaySession.objects.update_or_create(
+        session_key=request.session.session_key,
+        story_id=story_id,
+        defaults={'current_node_id': str(next_node_id)}
+    )
+    if fragment:
+        # play.js already holds the destination's prefetched fragment and only needs to know it may show it.
+        response = HttpResponse(status=204)
+        response.headers['X-Play-Url'] = next_url
+        patch_cache_control(response, no_store=True)
+        return response
+    return redirect(next_url)
 
 
 @login_required
@@ -416,6 +818,7 @@ def submit_rating_comment(request, story_id):
 
 
 @login_required
+@admission_class('play')
 def submit_story_report(request, story_id):
     story = get_story_details(story_id) or {}
     story_title = story.get('title', '') if isinstance(story, dict) else ''
@@ -528,6 +931,7 @@ def report_moderation_update(request, report_id):
     return redirect('moderation_reports')
 
 
+@admission_class('stats')
 def global_stats(request):
     """Level 13: Display play statistics with named endings and percentages."""
 
@@ -590,25 +994,29 @@ def global_stats(request):
 
 
 @login_required
+@admission_class('authoring')
 def create_story_view(request):
     """View to create a new story."""
     if request.method == 'POST':
         title = request.POST.get('title')
         description = request.POST.get('description')
-        status = request.POST.get('status', 'draft')
-        if status not in VALID_STORY_STATUSES:
-            status = 'draft'
 
+        # A new story has no pages yet, so it can't pass the publish checks: it always starts as a
+        # draft and is published from the edit page, where _validate_publish runs.
         data = {
             'title': title,
             'description': description,
-            'status': status
+            'status': 'draft'
         }
 
         new_story = create_story(data)
         if new_story:
+            bump_catalog_version()
+            _refresh_mirror(new_story['id'])
             # Level 16: Save ownership
             StoryOwnership.objects.create(user=request.user, story_id=new_story['id'])
+            if request.POST.get('status') == 'published':
+                messages.info(request, 'New stories start as drafts. Add pages, then publish from here.')
             return redirect('edit_story', story_id=new_story['id'])
 
     return render(request, 'gameplay/story_form.html', {'action': 'Create'})
@@ -621,24 +1029,40 @@ def check_ownership(user, story_id):
     return StoryOwnership.objects.filter(user=user, story_id=story_id).exists()
 
 
+def _pooled(fn, *args):
+    """Runs fn on an _UPSTREAM_POOL thread and releases the DB connection the mirror may have opened there."""
+    try:
+        return fn(*args)
+    finally:
+        connection.close()
+
+
 def get_story_with_pages(story_id):
-    story = get_story_details(story_id)
+    if story_embeds_pages(story_id):
+        story = get_story_details(story_id)
+        nodes = None
+    else:
+        # Shape unknown or pages served separately: fetch both in parallel rather than back to back.
+        # copy_context() keeps both calls under the request's admission class.
+        details_future = _UPSTREAM_POOL.submit(copy_context().run, _pooled, get_story_details, story_id)
+        nodes_future = _UPSTREAM_POOL.submit(copy_context().run, _pooled, get_story_nodes, story_id)
+        story, nodes = details_future.result(), nodes_future.result() or []
     if not story:
         return None
-    story['pages'] = story.get('pages') or get_story_nodes(story_id) or []
+    embeds_pages = 'pages' in story
+    remember_story_shape(story_id, embeds_pages)
+    if embeds_pages:
+        story['pages'] = story['pages'] or []
+    else:
+        # A failed parallel nodes fetch isn't repeated; only a story whose details stopped
+        # embedding pages fetches them now.
+        story['pages'] = (nodes if nodes is not None else get_story_nodes(story_id)) or []
     return story
 
 
-def find_page(story, page_id):
-    return next((p for p in story.get('pages', []) if str(p.get('id')) == str(page_id)), None)
-
-
-def find_choice(story, choice_id):
-    for page in story.get('pages', []):
-        choice = next((c for c in page.get('choices', []) if str(c.get('id')) == str(choice_id)), None)
-        if choice:
-            return page, choice
-    return None, None
+def get_story_index(story_id):
+    """Page and choice lookups for the current story version, downloaded once per version."""
+    return cached_story_index(story_id, lambda: get_story_with_pages(story_id))
 
 
 def _as_int(value, default):
@@ -648,7 +1072,7 @@ def _as_int(value, default):
         return default
 
 
-def _extract_choice_roll_data(post_data, story):
+def _extract_choice_roll_data(post_data, story_index):
     requires_roll = post_data.get('requires_roll') == 'on'
     if not requires_roll:
         return {
@@ -664,7 +1088,7 @@ def _extract_choice_roll_data(post_data, story):
     roll_required = min(max(roll_required, 1), roll_sides)
 
     on_fail_target = post_data.get('on_fail_target') or None
-    if on_fail_target and not find_page(story, on_fail_target):
+    if on_fail_target and not story_index.page(on_fail_target):
         raise PermissionDenied
 
     return {
@@ -675,163 +1099,190 @@ def _extract_choice_roll_data(post_data, story):
     }
 
 
-def _find_choice_in_node(node_data, choice_id):
-    return next((c for c in node_data.get('choices', []) if str(c.get('id')) == str(choice_id)), None)
+# Story edits that both the cached StoryIndex (as methods) and the cached graph state understand.
+_GRAPH_EDITS = {
+    'apply_story_fields': apply_story_fields,
+    'apply_page': apply_page,
+    'remove_page': remove_page,
+    'apply_choice': apply_choice,
+    'remove_choice': remove_choice,
+}
 
 
-def _choice_target(choice):
-    return (
-        choice.get('next_page_id')
-        or choice.get('target_node')
-        or choice.get('target')
-    )
+def _refresh_mirror(story_id):
+    """Flask is the write master: stop serving the mirrored copy and re-sync it in the background."""
+    if mirror_enabled():
+        mark_stale(story_id)
+        _UPSTREAM_POOL.submit(resync_story_quietly, story_id)
 
 
-def _story_graph_payload(story):
-    pages = story.get('pages', []) or []
-    node_ids = []
-    page_map = {}
+@csrf_exempt
+def content_changed_webhook(request):
+    """
+    Batched change notifications from Flask for content edited by other API clients. Signed with
+    FLASK_API_KEY (X-Webhook-Timestamp / X-Webhook-Signature); each delivery id is applied once.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if not verify_notification(
+        request.body,
+        request.headers.get('X-Webhook-Timestamp', ''),
+        request.headers.get('X-Webhook-Signature', ''),
+    ):
+        return JsonResponse({'error': 'Invalid or expired signature.'}, status=401)
+    try:
+        delivery_id, changes = parse_notification(request.body)
+    except InvalidNotification as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
 
-    for page in pages:
-        page_id = page.get('id')
-        if page_id is None:
-            continue
-        page_id = str(page_id)
-        node_ids.append(page_id)
-        page_map[page_id] = page
-
-    start_node_id = story.get('start_node_id')
-    if start_node_id is not None:
-        start_node_id = str(start_node_id)
-    elif node_ids:
-        start_node_id = node_ids[0]
-
-    adjacency = {node_id: [] for node_id in node_ids}
-    missing_nodes = set()
-    graph_edges = []
-
-    for page in pages:
-        source_id = page.get('id')
-        if source_id is None:
-            continue
-        source_id = str(source_id)
-        for index, choice in enumerate(page.get('choices', []) or []):
-            target_raw = _choice_target(choice)
-            if target_raw is None:
-                continue
-            target_id = str(target_raw)
-            is_broken = target_id not in adjacency
-            render_target = target_id
-            if is_broken:
-                render_target = f"missing::{target_id}"
-                missing_nodes.add(target_id)
-            else:
-                adjacency[source_id].append(target_id)
-
-            choice_label = (choice.get('text') or choice.get('label') or '').strip()
-            if len(choice_label) > 56:
-                choice_label = f"{choice_label[:53]}..."
-
-            edge_id_source = choice.get('id', index)
-            graph_edges.append({
-                'data': {
-                    'id': f"edge::{source_id}::{render_target}::{edge_id_source}",
-                    'source': source_id,
-                    'target': render_target,
-                    'label': choice_label,
-                    'broken_target': target_id if is_broken else '',
-                },
-                'classes': 'broken' if is_broken else '',
-            })
+    if not claim_delivery(delivery_id):
+        return JsonResponse({'duplicate': True, 'applied': 0, 'skipped': len(changes)})
+    try:
+        story_ids, skipped = apply_changes(changes)
+    except Exception:
+        # Flask retries deliveries that fail; the claim must not make the retry look like a duplicate.
+        release_delivery(delivery_id)
+        raise
+    for story_id in story_ids:
+        _refresh_mirror(story_id)
+    logger.info("Applied %s upstream change(s) to %s story(ies), delivery=%s", len(changes) - skipped, len(story_ids), delivery_id)
+    return JsonResponse({'duplicate': False, 'applied': len(changes) - skipped, 'skipped': skipped})
+
+
+def _commit_story_write(story_id, node_ids=(), edit=None):
+    """
+    Bumps content versions after an upstream write. `edit` is (operation, *args) built from the
+    write's response; it is applied to the cached story snapshot and graph so neither is downloaded again.
+    """
+    _refresh_mirror(story_id)
+    previous_version = story_version(story_id)
+    new_version = bump_story_version(story_id, node_ids=node_ids)
+    if edit is not None:
+        operation, *args = edit
+        patch_cached_story_index(
+            story_id, previous_version, new_version, lambda index: getattr(index, operation)(*deepcopy(args))
+        )
+        patch_cached_graph(story_id, previous_version, new_version, lambda state: _GRAPH_EDITS[operation](state, *args))
+    return new_version
 
-    reachable = set()
-    if start_node_id in adjacency:
-        stack = [start_node_id]
-        while stack:
-            current = stack.pop()
-            if current in reachable:
-                continue
-            reachable.add(current)
-            stack.extend(adjacency.get(current, []))
-
-    unreachable = [node_id for node_id in node_ids if node_id not in reachable]
-
-    graph_nodes = []
-    for node_id in node_ids:
-        page = page_map[node_id]
-        title = page.get('title') or f"Node {node_id}"
-        short_title = title if len(title) <= 42 else f"{title[:39]}..."
-        node_label = f"{node_id}\n{short_title}"
-        node_classes = []
-        if node_id == start_node_id:
-            node_classes.append('start')
-        if page.get('is_ending') or page.get('type') == 'ending':
-            node_classes.append('ending')
-        if node_id in unreachable:
-            node_classes.append('unreachable')
-
-        graph_nodes.append({
-            'data': {
-                'id': node_id,
-                'label': node_label,
-                'full_title': title,
-                'text_preview': (page.get('text') or '')[:280],
-            },
-            'classes': ' '.join(node_classes),
-        })
-
-    for missing_target_id in sorted(missing_nodes):
-        graph_nodes.append({
-            'data': {
-                'id': f"missing::{missing_target_id}",
-                'label': f"Missing: {missing_target_id}",
-                'full_title': 'Missing target node',
-                'text_preview': '',
-            },
-            'classes': 'missing',
-        })
-
-    graph_elements = graph_nodes + graph_edges
-
-    broken_edge_count = sum(1 for edge in graph_edges if edge.get('classes') == 'broken')
 
-    return {
-        'graph_elements': graph_elements,
-        'start_node_id': start_node_id or '',
-        'node_count': len(node_ids),
-        'edge_count': len(graph_edges),
-        'unreachable_count': len(unreachable),
-        'broken_edge_count': broken_edge_count,
-        'unreachable_node_ids': unreachable,
-    }
+def _find_choice_in_node(node_data, choice_id):
+    return next((c for c in node_data.get('choices', []) if str(c.get('id')) == str(choice_id)), None)
 
 
 @login_required
+@admission_class('authoring')
 def story_graph_view(request, story_id):
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    current_version = story_version(story_id)
+    validators = _http_validators('story_graph', story_id, current_version, request.user.pk,
+                                  modified_at=current_version / 1e9)
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return _finalize_cacheable(request, not_modified, validators)
+
+    graph = cached_graph(story_id, current_version, lambda: get_story_with_pages(story_id))
+    if graph is None:
         return redirect('story_list')
 
-    graph_payload = _story_graph_payload(story)
-    return render(request, 'gameplay/story_graph.html', {
-        'story': story,
+    payload = graph['payload']
+    incremental = payload['node_count'] > GRAPH_INLINE_NODE_LIMIT
+    graph_initial = None
+    if incremental:
+        # Only the neighborhood of the start node is embedded; the rest is fetched on demand.
+        start = graph['index'].start
+        nodes, truncated = neighborhood(graph['index'], start, 2, GRAPH_PAGE_NODE_LIMIT) if start >= 0 else ([], False)
+        graph_initial = graph_wire(graph, nodes, truncated)
+
+    response = render(request, 'gameplay/story_graph.html', {
+        'story': {'id': story_id, 'title': graph['state']['title']},
         'story_id': story_id,
-        **graph_payload,
+        **payload,
+        'graph_elements': [] if incremental else payload['graph_elements'],
+        'graph_initial': graph_initial,
+        'incremental': incremental,
     })
+    return _finalize_cacheable(request, response, validators)
 
 
 @login_required
+@admission_class('authoring')
+def story_graph_data(request, story_id):
+    """
+    JSON slices of a story graph for incremental exploration:
+    mode=neighborhood (node, hops), mode=path (start to node) and mode=issues.
+    """
+    if not check_ownership(request.user, story_id):
+        raise PermissionDenied
+
+    current_version = story_version(story_id)
+    validators = _http_validators('story_graph_data', story_id, current_version, request.GET.urlencode(),
+                                  modified_at=current_version / 1e9)
+    not_modified = _not_modified(request, validators)
+    if not_modified is not None:
+        return _finalize_cacheable(request, not_modified, validators)
+
+    graph = cached_graph(story_id, current_version, lambda: get_story_with_pages(story_id))
+    if graph is None:
+        return JsonResponse({'error': 'Story not found.'}, status=404)
+
+    index = graph['index']
+    mode = request.GET.get('mode', 'neighborhood')
+    node = index.start
+    if request.GET.get('node'):
+        node = index.index.get(request.GET['node'], -1)
+        if node < 0:
+            return JsonResponse({'error': 'Unknown node.'}, status=404)
+
+    truncated = False
+    if mode == 'issues':
+        nodes, truncated = issue_nodes(graph, GRAPH_PAGE_NODE_LIMIT)
+    elif node < 0:
+        nodes = []
+    elif mode == 'neighborhood':
+        try:
+            hops = min(max(int(request.GET.get('hops', 1)), 0), GRAPH_MAX_HOPS)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid hops.'}, status=400)
+        nodes, truncated = neighborhood(index, node, hops, GRAPH_PAGE_NODE_LIMIT)
+    elif mode == 'path':
+        nodes = index.path_to(node)
+        if not nodes:
+            return JsonResponse({'error': 'Node is not reachable from the start.'}, status=404)
+    else:
+        return JsonResponse({'error': 'Unknown mode.'}, status=400)
+
+    response = JsonResponse({'version': str(current_version), **graph_wire(graph, nodes, truncated)})
+    return _finalize_cacheable(request, response, validators)
+
+
+def _validate_publish(request, story_id, story, fallback_status):
+    """Runs the graph checks required before publishing. Returns the status to save."""
+    graph = cached_graph(story_id, story_version(story_id), lambda: story)
+    errors, warnings = publish_issues(graph)
+    for warning in warnings:
+        messages.warning(request, warning)
+    if errors:
+        for error in errors:
+            messages.error(request, error)
+        messages.error(request, 'The story was not published. Fix the issues above and try again.')
+        return fallback_status
+    return 'published'
+
+
+@login_required
+@admission_class('authoring')
 def edit_story_view(request, story_id):
     """View to edit a story and its pages."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
+    story = story_index.story
 
     if request.method == 'POST':
         title = request.POST.get('title')
@@ -839,6 +1290,8 @@ def edit_story_view(request, story_id):
         status = request.POST.get('status', story.get('status', 'published'))
         if status not in VALID_STORY_STATUSES:
             status = story.get('status', 'published')
+        if status == 'published' and story.get('status') != 'published':
+            status = _validate_publish(request, story_id, story, fallback_status=story.get('status', 'draft'))
 
         data = {
             'id': story_id,
@@ -848,7 +1301,9 @@ def edit_story_view(request, story_id):
         }
 
         updated_story = update_story(story_id, data)
+        bump_catalog_version()
         if updated_story is None:
+            _commit_story_write(story_id)
             logger.warning("Story update failed for story_id=%s", story_id)
         elif str(updated_story.get('id')) != str(story_id):
             logger.error(
@@ -856,12 +1311,16 @@ def edit_story_view(request, story_id):
                 story_id,
                 updated_story.get('id'),
             )
+            _commit_story_write(story_id)
+        else:
+            _commit_story_write(story_id, edit=('apply_story_fields', {**data, **updated_story}))
         return redirect('edit_story', story_id=story_id)
 
     return render(request, 'gameplay/story_edit.html', {'story': story})
 
 
 @login_required
+@admission_class('authoring')
 def delete_story_view(request, story_id):
     """View to delete a story."""
     if not check_ownership(request.user, story_id):
@@ -869,12 +1328,17 @@ def delete_story_view(request, story_id):
 
     if request.method == 'POST':
         if delete_story(story_id):
+            if mirror_enabled():
+                forget_story(story_id)
+            bump_story_version(story_id)
+            bump_catalog_version()
             StoryOwnership.objects.filter(story_id=story_id).delete()
             return redirect('story_list')
     return render(request, 'gameplay/story_confirm_delete.html', {'story_id': story_id})
 
 
 @login_required
+@admission_class('authoring')
 def add_page_view(request, story_id):
     """View to add a page to a story."""
     if not check_ownership(request.user, story_id):
@@ -896,32 +1360,36 @@ def add_page_view(request, story_id):
             'illustration_url': illustration_url,
         }
 
-        create_page(story_id, data)
+        new_page = create_page(story_id, data)
+        if new_page and new_page.get('id') is not None:
+            _commit_story_write(story_id, edit=('apply_page', new_page['id'], {**data, **new_page}))
+        else:
+            _commit_story_write(story_id)
         return redirect('edit_story', story_id=story_id)
 
     return render(request, 'gameplay/page_form.html', {'story_id': story_id})
 
 
 @login_required
+@admission_class('authoring')
 def add_choice_view(request, story_id, page_id):
     """View to add a choice to a page."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
-    page = find_page(story, page_id)
+    page = story_index.page(page_id)
     if not page:
         raise PermissionDenied
 
     if request.method == 'POST':
         text = request.POST.get('text')
         next_page_id = request.POST.get('next_page_id')
-        next_page = find_page(story, next_page_id)
-        if not next_page:
+        if not story_index.page(next_page_id):
             raise PermissionDenied
-        roll_data = _extract_choice_roll_data(request.POST, story)
+        roll_data = _extract_choice_roll_data(request.POST, story_index)
 
         data = {
             'text': text,
@@ -929,10 +1397,15 @@ def add_choice_view(request, story_id, page_id):
             **roll_data,
         }
 
-        create_choice(page_id, data)
+        new_choice = create_choice(page_id, data)
+        _commit_story_write(
+            story_id,
+            node_ids=[page_id],
+            edit=('apply_choice', page_id, {**data, **new_choice}) if new_choice else None,
+        )
         return redirect('edit_story', story_id=story_id)
 
-    pages = story.get('pages', [])
+    pages = story_index.story.get('pages', [])
 
     return render(request, 'gameplay/choice_form.html', {
         'story_id': story_id,
@@ -942,16 +1415,17 @@ def add_choice_view(request, story_id, page_id):
 
 
 @login_required
+@admission_class('authoring')
 def edit_page_view(request, story_id, page_id):
     """View to edit an existing page."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
-    page = find_page(story, page_id)
-    
+    page = story_index.page(page_id)
+
     if not page:
         raise PermissionDenied
 
@@ -968,7 +1442,12 @@ def edit_page_view(request, story_id, page_id):
             'illustration_url': illustration_url,
         }
 
-        update_page(page_id, data)
+        updated_page = update_page(page_id, data)
+        _commit_story_write(
+            story_id,
+            node_ids=[page_id],
+            edit=('apply_page', page_id, {**data, **updated_page}) if updated_page is not None else None,
+        )
         return redirect('edit_story', story_id=story_id)
 
     return render(request, 'gameplay/page_form.html', {
@@ -979,36 +1458,41 @@ def edit_page_view(request, story_id, page_id):
 
 
 @login_required
+@admission_class('authoring')
 def delete_page_view(request, story_id, page_id):
     """View to delete a page."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
-    page = find_page(story, page_id)
-    if not page:
+    if not story_index.page(page_id):
         raise PermissionDenied
 
     if request.method == 'POST':
-        delete_page(page_id)
+        deleted = delete_page(page_id)
+        _commit_story_write(
+            story_id,
+            node_ids=[page_id],
+            edit=('remove_page', page_id) if deleted else None,
+        )
     return redirect('edit_story', story_id=story_id)
 
 
 @login_required
+@admission_class('authoring')
 def edit_choice_view(request, story_id, page_id, choice_id):
     """View to edit an existing choice."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
-    page = find_page(story, page_id)
-    if not page:
+    if not story_index.page(page_id):
         raise PermissionDenied
-    choice = next((c for c in page.get('choices', []) if str(c.get('id')) == str(choice_id)), None)
+    choice = story_index.page_choice(page_id, choice_id)
 
     if not choice:
         raise PermissionDenied
@@ -1016,10 +1500,9 @@ def edit_choice_view(request, story_id, page_id, choice_id):
     if request.method == 'POST':
         text = request.POST.get('text')
         next_page_id = request.POST.get('next_page_id')
-        next_page = find_page(story, next_page_id)
-        if not next_page:
+        if not story_index.page(next_page_id):
             raise PermissionDenied
-        roll_data = _extract_choice_roll_data(request.POST, story)
+        roll_data = _extract_choice_roll_data(request.POST, story_index)
 
         data = {
             'text': text,
@@ -1027,10 +1510,16 @@ def edit_choice_view(request, story_id, page_id, choice_id):
             **roll_data,
         }
 
-        update_choice(choice_id, data)
+        updated_choice = update_choice(choice_id, data)
+        _commit_story_write(
+            story_id,
+            node_ids=[page_id],
+            edit=('apply_choice', page_id, {**data, **updated_choice, 'id': choice_id})
+            if updated_choice is not None else None,
+        )
         return redirect('edit_story', story_id=story_id)
 
-    pages = story.get('pages', [])
+    pages = story_index.story.get('pages', [])
     return render(request, 'gameplay/choice_form.html', {
         'story_id': story_id,
         'page_id': page_id,
@@ -1041,18 +1530,24 @@ def edit_choice_view(request, story_id, page_id, choice_id):
 
 
 @login_required
+@admission_class('authoring')
 def delete_choice_view(request, story_id, choice_id):
     """View to delete a choice."""
     if not check_ownership(request.user, story_id):
         raise PermissionDenied
 
-    story = get_story_with_pages(story_id)
-    if not story:
+    story_index = get_story_index(story_id)
+    if not story_index:
         return redirect('story_list')
-    _page, choice = find_choice(story, choice_id)
+    page, choice = story_index.choice(choice_id)
     if not choice:
         raise PermissionDenied
 
     if request.method == 'POST':
-        delete_choice(choice_id)
+        deleted = delete_choice(choice_id)
+        _commit_story_write(
+            story_id,
+            node_ids=[page.get('id')],
+            edit=('remove_choice', page.get('id'), choice_id) if deleted else None,
+        )
     return redirect('edit_story', story_id=story_id)